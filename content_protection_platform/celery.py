@@ -8,6 +8,9 @@ app.conf.beat_schedule = {
     'cleanup-old-scan-data-daily': {'task':'scanning.tasks.cleanup_old_scan_data','schedule':24*60*60},
     'weekly-report': {'task':'scanning.tasks.generate_weekly_report','schedule':7*24*60*60},
     'health-check': {'task':'scanning.tasks.health_check','schedule':60},
+    'dispatch-due-scan-schedules': {'task':'scanning.tasks.dispatch_due_schedules','schedule':60},
+    'update-dashboard-rollups': {'task':'reporting.tasks.update_rollups_task','schedule':60},
+    'verify-evidence-chains-hourly': {'task':'legal.tasks.verify_evidence_chains','schedule':60*60},
 }
 @app.task(bind=True)
 def debug_task(self): print(f'Request: {self.request!r}')
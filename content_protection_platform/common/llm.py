@@ -1,6 +1,8 @@
-import requests, json
+import requests, json, time
 from typing import List, Dict, Any, Optional
 from django.conf import settings
+from .ratelimit import get_rate_limiter, credential_key
+from .metrics import LLM_CALL_SECONDS
 
 class OpenRouterClient:
     def __init__(
@@ -26,6 +28,8 @@ class OpenRouterClient:
         }
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY is missing.")
+        # one shared quota per API key (the key itself never goes into Redis)
+        self.rate_limiter = get_rate_limiter("openrouter", credential_key(self.api_key))
 
     def chat(self, messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: int = 800) -> str:
         """
@@ -39,8 +43,14 @@ class OpenRouterClient:
             "max_tokens": max_tokens,
         }
         url = f"{self.base_url}/chat/completions"
-        resp = requests.post(url, headers=self.headers, data=json.dumps(payload), timeout=self.timeout)
-        resp.raise_for_status()
+        self.rate_limiter.acquire()
+        started = time.perf_counter(); outcome = "error"
+        try:
+            resp = requests.post(url, headers=self.headers, data=json.dumps(payload), timeout=self.timeout)
+            resp.raise_for_status()
+            outcome = "ok"
+        finally:
+            LLM_CALL_SECONDS.labels(self.model, outcome).observe(time.perf_counter() - started)
         data = resp.json()
         # OpenRouter returns OpenAI-compatible structure
         return data["choices"][0]["message"]["content"]
@@ -0,0 +1,289 @@
+import logging, os, socket, threading, time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# In-process counters and histograms (a dict lookup and a lock per update, so they stay on in
+# production). Each process keeps its own values; Celery workers publish a snapshot to the
+# shared cache every METRICS['PUBLISH_SECONDS'] and /metrics merges them with its own.
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+_INDEX_KEY = 'metrics:procs'
+_PROC_KEY = 'metrics:proc:{}'
+
+
+class _CounterChild:
+    __slots__ = ('lock', 'value')
+
+    def __init__(self, buckets=None):
+        self.lock = threading.Lock(); self.value = 0.0
+
+    def inc(self, n: float = 1.0):
+        with self.lock:
+            self.value += n
+
+    def sample(self):
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ('lock', 'buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock(); self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1); self.sum = 0.0  # last slot is +Inf; counts are per bucket, not cumulative
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1; self.sum += value
+
+    def sample(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class _Metric:
+    kind = ''
+    child_class = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=None):
+        self.name = name; self.documentation = documentation; self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        self.lock = threading.Lock(); self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(key, self.child_class(self.buckets))
+        return child
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'help': self.documentation, 'labelnames': self.labelnames, 'buckets': self.buckets,
+                'samples': {k: c.sample() for k, c in list(self.children.items())}}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    child_class = _CounterChild
+
+    def inc(self, n: float = 1.0):
+        self.labels().inc(n)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    child_class = _HistogramChild
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name, documentation, labelnames, **kw):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kw)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already registered with a different type or labels")
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _get_or_create(Counter, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+class timer(ContextDecorator):
+    """
+    Observe elapsed seconds into a histogram:
+        with timer(STAGE_SECONDS, 'hash'): ...
+        @timer(PLATFORM_FETCH_SECONDS, 'youtube')
+    `.elapsed` holds the duration after the block exits.
+    """
+    def __init__(self, metric: Histogram, *labels):
+        self.child = metric.labels(*labels); self.started = 0.0; self.elapsed = 0.0
+
+    def _recreate_cm(self):
+        # decorator use: a fresh timer per call, so concurrent/recursive calls don't share `started`
+        t = object.__new__(timer); t.child = self.child; t.started = 0.0; t.elapsed = 0.0
+        return t
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.child.observe(self.elapsed)
+        return False
+
+
+# -------- the pipeline's metrics ------------------------------------------------
+STAGE_SECONDS = histogram('cp_stage_seconds', 'Time spent in a scan/detection pipeline stage.', ('stage',))
+STAGE_ITEMS = counter('cp_stage_items_total', 'Items processed by a pipeline stage.', ('stage',))
+PLATFORM_FETCH_SECONDS = histogram('cp_platform_fetch_seconds', 'Platform API page fetch latency.', ('platform',))
+FINGERPRINT_SECONDS = histogram('cp_fingerprint_seconds', 'Fingerprint generation time.', ('content_type',))
+DB_WRITE_SECONDS = histogram('cp_db_write_seconds', 'Time spent in batched database writes.', ('table',))
+DB_ROWS_WRITTEN = counter('cp_db_rows_written_total', 'Rows written by batched database writes.', ('table',))
+LLM_CALL_SECONDS = histogram('cp_llm_call_seconds', 'LLM HTTP call latency.', ('model', 'outcome'))
+DETECTION_JOB_SECONDS = histogram('cp_detection_job_seconds', 'Wall time of run_detection.', ('status',))
+MATCHES_FOUND = counter('cp_matches_total', 'Content matches created.', ('match_type', 'method'))
+CELERY_TASK_SECONDS = histogram('cp_celery_task_seconds', 'Celery task run time.', ('task', 'state'))
+CELERY_TASK_FAILURES = counter('cp_celery_task_failures_total', 'Celery task failures.', ('task',))
+CELERY_TASK_RETRIES = counter('cp_celery_task_retries_total', 'Celery task retries.', ('task',))
+RATE_LIMIT_WAIT_SECONDS = histogram('cp_rate_limit_wait_seconds', 'Time spent waiting for a rate limit slot.', ('scope',))
+RATE_LIMIT_ACQUIRED = counter('cp_rate_limit_acquired_total', 'Rate limit slots acquired.', ('scope',))
+RATE_LIMIT_REJECTED = counter('cp_rate_limit_rejected_total', 'Rate limit acquisitions that timed out.', ('scope',))
+
+
+# -------- snapshots, cross-process merge, exposition ----------------------------
+def _proc() -> str:
+    # not computed at import: prefork children inherit the parent's module state
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: m.snapshot() for name, m in list(_registry.items())}
+
+
+_last_publish = 0.0
+
+
+def publish(force: bool = False):
+    """Push this process's snapshot to the shared cache (throttled to METRICS['PUBLISH_SECONDS'])."""
+    global _last_publish
+    cfg = settings.METRICS
+    now = time.monotonic()
+    if not cfg['ENABLED'] or (not force and now - _last_publish < cfg['PUBLISH_SECONDS']):
+        return
+    _last_publish = now
+    from django.core.cache import cache
+    proc = _proc()
+    try:
+        cache.set(_PROC_KEY.format(proc), snapshot(), cfg['PROCESS_TTL'])
+        procs = cache.get(_INDEX_KEY) or []
+        if proc not in procs:
+            cache.set(_INDEX_KEY, (procs + [proc])[-cfg['MAX_PROCESSES']:], None)
+    except Exception as e:  # metrics must never break the task that triggered them
+        logger.warning(f"Could not publish metrics: {e}")
+
+
+def _merge(into: Dict[str, Dict[str, Any]], snap: Dict[str, Dict[str, Any]]):
+    for name, m in snap.items():
+        cur = into.get(name)
+        if cur is None:
+            into[name] = {**m, 'samples': dict(m['samples'])}
+            continue
+        if cur['kind'] != m['kind'] or cur['buckets'] != m['buckets']:
+            continue  # a process running different code; skip rather than mis-add
+        for key, v in m['samples'].items():
+            old = cur['samples'].get(key)
+            if old is None:
+                cur['samples'][key] = v
+            elif m['kind'] == 'counter':
+                cur['samples'][key] = old + v
+            else:
+                cur['samples'][key] = ([a + b for a, b in zip(old[0], v[0])], old[1] + v[1])
+
+
+def collect() -> Dict[str, Dict[str, Any]]:
+    """This process's live values merged with every other process's last published snapshot."""
+    from django.core.cache import cache
+    merged: Dict[str, Dict[str, Any]] = {}
+    _merge(merged, snapshot())
+    try:
+        proc = _proc()
+        others = [p for p in (cache.get(_INDEX_KEY) or []) if p != proc]
+        found = cache.get_many([_PROC_KEY.format(p) for p in others])
+    except Exception as e:
+        logger.warning(f"Could not read published metrics: {e}"); found = {}
+    for snap in found.values():
+        _merge(merged, snap)
+    return merged
+
+
+def _escape(v: str) -> str:
+    return v.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v))
+
+
+def render_text(metrics: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    metrics = collect() if metrics is None else metrics
+    lines: List[str] = []
+    for name in sorted(metrics):
+        m = metrics[name]
+        lines.append(f"# HELP {name} {m['help']}"); lines.append(f"# TYPE {name} {m['kind']}")
+        for key in sorted(m['samples']):
+            v = m['samples'][key]
+            if m['kind'] == 'counter':
+                lines.append(f"{name}{_labels(m['labelnames'], key)} {_fmt(v)}")
+                continue
+            counts, total = v; cumulative = 0
+            for le, n in zip(list(m['buckets']) + ['+Inf'], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(m['labelnames'], key, ('le', le if isinstance(le, str) else _fmt(le)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(m['labelnames'], key)} {_fmt(total)}")
+            lines.append(f"{name}_count{_labels(m['labelnames'], key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+# -------- Celery task hooks -------------------------------------------------------
+_task_started: Dict[str, float] = {}
+
+try:
+    from celery.signals import task_prerun, task_postrun, task_failure, task_retry, worker_shutdown, worker_process_shutdown
+
+    @task_prerun.connect(weak=False)
+    def _on_task_prerun(task_id=None, **kwargs):
+        _task_started[task_id] = time.perf_counter()
+
+    @task_postrun.connect(weak=False)
+    def _on_task_postrun(task_id=None, task=None, state=None, **kwargs):
+        started = _task_started.pop(task_id, None)
+        if started is not None and task is not None:
+            CELERY_TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+        publish()
+
+    @task_failure.connect(weak=False)
+    def _on_task_failure(sender=None, **kwargs):
+        CELERY_TASK_FAILURES.labels(getattr(sender, 'name', 'unknown')).inc()
+
+    @task_retry.connect(weak=False)
+    def _on_task_retry(sender=None, **kwargs):
+        CELERY_TASK_RETRIES.labels(getattr(sender, 'name', 'unknown')).inc()
+
+    @worker_process_shutdown.connect(weak=False)
+    @worker_shutdown.connect(weak=False)
+    def _publish_on_worker_shutdown(**kwargs):
+        publish(force=True)
+except ImportError:  # web-only deployments
+    pass
@@ -0,0 +1,136 @@
+import gzip, hashlib, json, os, tempfile, time
+from pathlib import Path
+from typing import Any, Container, Dict, Optional, Union
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+
+class PayloadStore:
+    """
+    Content-addressed cold storage for bulky raw payloads (webhook bodies etc.).
+    Each payload is canonical-JSON encoded, compressed and written once to
+    <ROOT>/<aa>/<bb>/<sha256>.json.<ext>, so identical payloads are stored once.
+    """
+    EXTENSIONS = {"zstd": ".json.zst", "gzip": ".json.gz"}
+
+    def __init__(self, root: Optional[Union[str, Path]] = None, codec: Optional[str] = None):
+        cfg = getattr(settings, "PAYLOAD_STORE", {})
+        self.root = Path(root or cfg.get("ROOT") or Path(settings.MEDIA_ROOT) / "payloads")
+        codec = codec or cfg.get("CODEC", "zstd")
+        if codec == "zstd" and zstandard is None:
+            codec = "gzip"
+        if codec not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported payload codec: {codec}")
+        self.codec = codec
+
+    def _path(self, digest: str, codec: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / f"{digest}{self.EXTENSIONS[codec]}"
+
+    def _compress(self, raw: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(raw)
+        return gzip.compress(raw, compresslevel=6, mtime=0)
+
+    @staticmethod
+    def _decompress(blob: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read .zst payloads")
+            return zstandard.ZstdDecompressor().decompress(blob)
+        return gzip.decompress(blob)
+
+    def put(self, payload: Any) -> Dict[str, Any]:
+        raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        # already stored (possibly under the other codec) -> nothing to write
+        for codec in (self.codec, *[c for c in self.EXTENSIONS if c != self.codec]):
+            existing = self._path(digest, codec)
+            if existing.exists():
+                os.utime(existing)  # a new reference: restart the sweep's grace period
+                return {"sha256": digest, "codec": codec, "bytes": len(raw), "stored_bytes": existing.stat().st_size}
+
+        blob = self._compress(raw)
+        path = self._path(digest, self.codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temp file in the same directory, then rename: readers never see partial files
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return {"sha256": digest, "codec": self.codec, "bytes": len(raw), "stored_bytes": len(blob)}
+
+    def get(self, ref: Union[str, Dict[str, Any]]) -> Any:
+        """ref is either the dict returned by put() or a bare sha256 digest."""
+        digest = ref["sha256"] if isinstance(ref, dict) else ref
+        codecs = list(self.EXTENSIONS)
+        if isinstance(ref, dict) and ref.get("codec") in codecs:
+            codecs.remove(ref["codec"]); codecs.insert(0, ref["codec"])
+        for codec in codecs:
+            path = self._path(digest, codec)
+            if path.exists():
+                return json.loads(self._decompress(path.read_bytes(), codec))
+        raise FileNotFoundError(f"payload {digest} not found under {self.root}")
+
+    def sweep(self, live: Container[str], grace_seconds: float = 0) -> Dict[str, int]:
+        """
+        Delete payloads whose digest is not in `live` and that were not written or re-put in the
+        last `grace_seconds` (a row referencing them may not be committed yet).
+        """
+        cutoff = time.time() - grace_seconds; report = {"kept": 0, "deleted": 0, "bytes_freed": 0}
+        for path in self.root.glob("*/*/*"):
+            if path.name.startswith(".tmp-") or path.name.split(".", 1)[0] in live:
+                report["kept"] += 1; continue
+            try:
+                st = path.stat()
+                if st.st_mtime > cutoff:
+                    report["kept"] += 1; continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            report["deleted"] += 1; report["bytes_freed"] += st.st_size
+        return report
+
+
+def summarize_payload(payload: Any) -> Dict[str, Any]:
+    """Small, list-friendly description of a raw payload kept on the hot row."""
+    summary: Dict[str, Any] = {"type": type(payload).__name__}
+    if isinstance(payload, dict):
+        summary["keys"] = sorted(payload.keys())[:20]
+    elif isinstance(payload, list):
+        summary["length"] = len(payload)
+    return summary
+
+
+def offload_raw_payload(metadata: Optional[Dict[str, Any]], store: Optional[PayloadStore] = None) -> Dict[str, Any]:
+    """
+    Move metadata["raw"] into the payload store and replace it with a reference:
+      {"raw": {...}, **rest} -> {"raw_ref": {"sha256", "codec", "bytes", ...}, "raw_summary": {...}, **rest}
+    Metadata without a "raw" key is returned unchanged.
+    """
+    metadata = dict(metadata or {})
+    if "raw" not in metadata:
+        return metadata
+    raw = metadata.pop("raw")
+    metadata["raw_ref"] = (store or PayloadStore()).put(raw)
+    metadata["raw_summary"] = summarize_payload(raw)
+    return metadata
+
+
+def load_raw_payload(metadata: Optional[Dict[str, Any]], store: Optional[PayloadStore] = None) -> Any:
+    """Inverse of offload_raw_payload(); also understands legacy rows that still hold "raw" inline."""
+    metadata = metadata or {}
+    if "raw" in metadata:
+        return metadata["raw"]
+    ref = metadata.get("raw_ref")
+    if not ref:
+        return None
+    return (store or PayloadStore()).get(ref)
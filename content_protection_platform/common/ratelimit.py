@@ -0,0 +1,174 @@
+import asyncio, hashlib, logging, threading, time
+from typing import Any, Dict, Optional
+from django.conf import settings
+from .metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_ACQUIRED, RATE_LIMIT_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# GCRA (generic cell rate algorithm) in one atomic script, timed by the Redis clock so
+# workers on different hosts agree. Stores only the "theoretical arrival time" per key.
+#   ARGV[1] = emission interval (us), ARGV[2] = burst tolerance (us)
+#   returns {allowed(1|0), retry_after_us}
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000000 + tonumber(t[2])
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local allow_at = tat - tolerance
+if now < allow_at then
+  return {0, allow_at - now}
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now + tolerance) / 1000) + 1)
+return {1, 0}
+"""
+
+
+class RateLimited(Exception):
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"rate limit exceeded for {key}; retry in {retry_after:.3f}s")
+        self.key = key; self.retry_after = retry_after
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock(); self.data: Dict[str, Dict[str, float]] = {}
+
+    def record(self, key: str, waited: float = 0.0, rejected: bool = False):
+        with self.lock:
+            s = self.data.setdefault(key, {'acquired': 0, 'rejected': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0})
+            if rejected:
+                s['rejected'] += 1
+            else:
+                s['acquired'] += 1; s['wait_seconds_total'] += waited
+                s['wait_seconds_max'] = max(s['wait_seconds_max'], waited)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {k: dict(v) for k, v in self.data.items()}
+
+
+_stats = _Stats()
+
+
+class _LocalGCRA:
+    """Per-process fallback with the same semantics (dev/tests, or when Redis is unreachable)."""
+    def __init__(self):
+        self.lock = threading.Lock(); self.tat: Dict[str, float] = {}
+
+    def check(self, key: str, interval: float, tolerance: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            tat = max(self.tat.get(key, now), now)
+            allow_at = tat - tolerance
+            if now < allow_at:
+                return allow_at - now
+            self.tat[key] = tat + interval
+            return 0.0
+
+
+_local = _LocalGCRA()
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def _get_redis():
+    global _redis_client
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                import redis
+                _redis_client = redis.Redis.from_url(settings.RATE_LIMITS['REDIS_URL'], socket_timeout=2)
+    return _redis_client
+
+
+class RateLimiter:
+    """
+    Token-bucket-equivalent limiter shared by every process using the same Redis:
+    `rate` requests per `period` seconds, allowing bursts of up to `burst` requests.
+    """
+    def __init__(self, key: str, rate: float, period: float = 1.0, burst: int = 1, client=None, backend: Optional[str] = None, scope: Optional[str] = None):
+        self.key = key; self.scope = scope or key  # metrics are labelled by scope, not per credential
+        self.interval = period / rate
+        self.tolerance = self.interval * max(0, burst - 1)
+        self.backend = backend or settings.RATE_LIMITS.get('BACKEND', 'redis')
+        self._client = client
+        self._script = None
+
+    def _redis_check(self) -> float:
+        client = self._client or _get_redis()
+        if self._script is None:
+            self._script = client.register_script(_GCRA_LUA)
+        allowed, retry_us = self._script(keys=[self.key], args=[int(self.interval * 1e6), int(self.tolerance * 1e6)])
+        return 0.0 if int(allowed) else int(retry_us) / 1e6
+
+    def try_acquire(self) -> float:
+        """Take a slot if one is free. Returns 0.0 on success, else seconds until the next slot."""
+        if self.backend == 'redis':
+            try:
+                return self._redis_check()
+            except Exception as e:  # fail open to a per-process limit rather than stopping all scans
+                logger.warning(f"Rate limiter Redis unavailable for {self.key}, using local limit: {e}")
+        return _local.check(self.key, self.interval, self.tolerance)
+
+    def _record(self, waited: float = 0.0, rejected: bool = False):
+        _stats.record(self.key, waited=waited, rejected=rejected)
+        if rejected:
+            RATE_LIMIT_REJECTED.labels(self.scope).inc()
+        else:
+            RATE_LIMIT_ACQUIRED.labels(self.scope).inc(); RATE_LIMIT_WAIT_SECONDS.labels(self.scope).observe(waited)
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Block until a slot is available; returns seconds waited. Raises RateLimited after `timeout`."""
+        started = time.monotonic()
+        while True:
+            retry_after = self.try_acquire()
+            waited = time.monotonic() - started
+            if retry_after <= 0:
+                self._record(waited=waited); return waited
+            if timeout is not None and waited + retry_after > timeout:
+                self._record(rejected=True); raise RateLimited(self.key, retry_after)
+            time.sleep(retry_after)
+
+    async def aacquire(self, timeout: Optional[float] = None) -> float:
+        """asyncio variant of acquire(); the check runs in a thread, so a slow Redis doesn't stall the loop."""
+        started = time.monotonic()
+        while True:
+            retry_after = await asyncio.to_thread(self.try_acquire)
+            waited = time.monotonic() - started
+            if retry_after <= 0:
+                self._record(waited=waited); return waited
+            if timeout is not None and waited + retry_after > timeout:
+                self._record(rejected=True); raise RateLimited(self.key, retry_after)
+            await asyncio.sleep(retry_after)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def credential_key(secret: Optional[str]) -> Optional[str]:
+    """Short, non-reversible limiter key for an API key/token (None stays None)."""
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:12] if secret else None
+
+
+def get_rate_limiter(scope: str, credential: Any = None) -> RateLimiter:
+    """
+    Limiter for a platform/API `scope` ("youtube", "telegram", "openrouter", ...), keyed per
+    credential actually sent (credential_key() of the API key, API id...) so separate quotas
+    are tracked separately and callers sharing one key share one bucket.
+    Limits come from settings.RATE_LIMITS["LIMITS"][scope] (or "default").
+    """
+    key = f"ratelimit:{scope}:{credential if credential is not None else 'default'}"
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limits = settings.RATE_LIMITS['LIMITS']
+        cfg = limits.get(scope) or limits['default']
+        limiter = _limiters.setdefault(key, RateLimiter(key, cfg['rate'], cfg.get('period', 1.0), cfg.get('burst', 1), scope=scope))
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Per-key acquired/rejected counts and wait times observed by this process."""
+    return _stats.snapshot()
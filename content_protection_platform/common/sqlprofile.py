@@ -0,0 +1,190 @@
+import logging, random, re, threading, time
+from collections import deque
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from .metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+# Opt-in SQL profiling (SQL_PROFILING['ENABLED']): every request/task served while enabled is
+# counted; a trace (top slow and most repeated statements) is kept when the unit was slow, ran
+# many queries, or was sampled. Traces go to a per-process ring buffer and, best effort, to a
+# shared ring in the cache so worker traces are visible from the web process.
+
+_RING_KEY = 'sqlprofile:ring'
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_VALUES = re.compile(r'(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+', re.I)
+
+SQL_QUERIES = histogram('cp_sql_queries', 'SQL statements per request or task.', ('kind', 'name'),
+                        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000))
+SQL_SECONDS = histogram('cp_sql_seconds', 'Database time per request or task.', ('kind', 'name'))
+TRACES_CAPTURED = counter('cp_sql_traces_captured_total', 'SQL profiles kept in the ring buffer.', ('kind', 'reason'))
+
+
+def normalize(sql: str) -> str:
+    """Statement shape: parameters are already %s placeholders; collapse IN (...) lists and multi-row VALUES."""
+    return _VALUES.sub(r'\1, ...', _IN_LIST.sub('(...)', sql))
+
+
+class QueryProfile:
+    """execute_wrapper that times every statement; cheap enough to run on every unit of work."""
+    __slots__ = ('count', 'db_seconds', 'statements', 'started')
+
+    def __init__(self):
+        self.count = 0; self.db_seconds = 0.0; self.statements: Dict[str, List[float]] = {}; self.started = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        t = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - t
+            self.count += 1; self.db_seconds += elapsed
+            self.statements.setdefault(sql, []).append(elapsed)
+
+    def attach(self) -> ExitStack:
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    def trace(self, kind: str, name: str, **extra) -> Dict[str, Any]:
+        cfg = settings.SQL_PROFILING; max_chars = cfg['SQL_MAX_CHARS']
+        by_shape: Dict[str, List[float]] = {}
+        for sql, times in self.statements.items():
+            by_shape.setdefault(normalize(sql), []).extend(times)
+        repeated = sorted(((s, t) for s, t in by_shape.items() if len(t) >= cfg['DUPLICATE_MIN']), key=lambda x: -len(x[1]))
+        slowest = sorted(((s, max(t)) for s, t in by_shape.items()), key=lambda x: -x[1])
+        return {
+            'kind': kind, 'name': name, 'at': timezone.now().isoformat(),
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'queries': self.count, 'db_ms': round(self.db_seconds * 1000, 2), 'distinct_statements': len(by_shape),
+            'duplicates': [{'sql': s[:max_chars], 'count': len(t), 'total_ms': round(sum(t) * 1000, 2)} for s, t in repeated[:cfg['TOP_N']]],
+            'slowest': [{'sql': s[:max_chars], 'ms': round(t * 1000, 2)} for s, t in slowest[:cfg['TOP_N']]],
+            **extra,
+        }
+
+
+def _reason(profile: QueryProfile) -> Optional[str]:
+    cfg = settings.SQL_PROFILING
+    if profile.db_seconds * 1000 >= cfg['SLOW_DB_MS']:
+        return 'slow'
+    if profile.count >= cfg['MANY_QUERIES']:
+        return 'queries'
+    if random.random() < cfg['SAMPLE_RATE']:
+        return 'sample'
+    return None
+
+
+class _Ring:
+    def __init__(self):
+        self.lock = threading.Lock(); self.items: deque = deque()
+
+    def add(self, trace: Dict[str, Any]):
+        size = settings.SQL_PROFILING['RING_SIZE']
+        with self.lock:
+            self.items.append(trace)
+            while len(self.items) > size:
+                self.items.popleft()
+        from django.core.cache import cache
+        try:  # read-modify-write: concurrent writers may drop a trace, which sampling tolerates
+            shared = cache.get(_RING_KEY) or []
+            cache.set(_RING_KEY, (shared + [trace])[-size:], None)
+        except Exception as e:
+            logger.debug(f"Could not publish SQL trace: {e}")
+
+    def list(self) -> List[Dict[str, Any]]:
+        from django.core.cache import cache
+        try:
+            shared = cache.get(_RING_KEY)
+        except Exception:
+            shared = None
+        with self.lock:
+            return list(shared if shared is not None else self.items)
+
+    def clear(self):
+        from django.core.cache import cache
+        with self.lock:
+            self.items.clear()
+        try:
+            cache.delete(_RING_KEY)
+        except Exception:
+            pass
+
+
+_ring = _Ring()
+
+
+def finish(profile: QueryProfile, kind: str, name: str, **extra) -> Optional[Dict[str, Any]]:
+    """Record metrics for a finished unit of work; keep and return its trace if it qualifies."""
+    SQL_QUERIES.labels(kind, name).observe(profile.count); SQL_SECONDS.labels(kind, name).observe(profile.db_seconds)
+    reason = _reason(profile)
+    if reason is None:
+        return None
+    trace = profile.trace(kind, name, reason=reason, **extra)
+    TRACES_CAPTURED.labels(kind, reason).inc()
+    _ring.add(trace)
+    if reason != 'sample':
+        logger.info(f"SQL profile {kind} {name}: {trace['queries']} queries, {trace['db_ms']} ms in DB ({reason})")
+    return trace
+
+
+def recent_traces(kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    traces = [t for t in _ring.list() if kind is None or t['kind'] == kind]
+    return traces[::-1][:limit]
+
+
+def clear_traces():
+    _ring.clear()
+
+
+class SQLProfilingMiddleware:
+    """
+    Per-request query count/DB time and sampled traces; staff also get them as a Server-Timing
+    header. Removed from the stack unless enabled.
+    """
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILING['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        with profile.attach():
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        # route names keep metric labels bounded; unmatched paths are lumped together
+        name = (match.view_name or match.route) if match else 'unmatched'
+        finish(profile, 'request', name, method=request.method, path=request.path, status=response.status_code)
+        # request.user is set by AuthenticationMiddleware, and by DRF for token/API-key auth
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:  # query counts reveal how much data other tenants hold
+            response['Server-Timing'] = f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.count} queries"'
+        return response
+
+
+# -------- Celery task hook ----------------------------------------------------------
+_task_profiles: Dict[str, Any] = {}
+
+try:
+    from celery.signals import task_prerun, task_postrun
+
+    @task_prerun.connect(weak=False)
+    def _profile_task_start(task_id=None, **kwargs):
+        if settings.SQL_PROFILING['ENABLED']:
+            profile = QueryProfile()
+            _task_profiles[task_id] = (profile, profile.attach())
+
+    @task_postrun.connect(weak=False)
+    def _profile_task_end(task_id=None, task=None, state=None, **kwargs):
+        entry = _task_profiles.pop(task_id, None)
+        if entry is not None:
+            profile, stack = entry
+            stack.close()
+            finish(profile, 'task', getattr(task, 'name', 'unknown'), task_id=task_id, state=state)
+except ImportError:  # web-only deployments
+    pass
@@ -0,0 +1,7 @@
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..1) of `values`, which need not be sorted; 0.0 when empty."""
+    vals = sorted(values)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))] if vals else 0.0
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     "scanning",
     "detection",
     "legal",
+    "reporting",
 
     # (optional) register the project package if you keep templates/views here
     "content_protection_platform",
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 # (CORS must come before CommonMiddleware)
 # --------------------------------------------------------------------------------------
 MIDDLEWARE = [
+    # first, so session/auth queries are counted too; a no-op unless SQL_PROFILING is enabled
+    "content_protection_platform.common.sqlprofile.SQLProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -119,6 +122,15 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Raw webhook/platform payloads are moved out of ScannedContent.metadata into
+# compressed, content-addressed files (see common/payload_store.py).
+PAYLOAD_STORE = {
+    "ROOT": MEDIA_ROOT / "payloads",
+    "CODEC": config("PAYLOAD_STORE_CODEC", default="zstd"),  # falls back to gzip if zstandard is missing
+    # cleanup_old_scan_data deletes payloads no row references once they are this old
+    "SWEEP_GRACE_SECONDS": config("PAYLOAD_STORE_SWEEP_GRACE_SECONDS", default=24 * 60 * 60, cast=int),
+}
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # --------------------------------------------------------------------------------------
@@ -127,6 +139,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
+        "users.authentication.APIKeyAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -136,6 +149,77 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 20,
 }
 
+# ActivityLog rows are buffered per process and bulk-inserted (users/activity.py)
+ACTIVITY_LOG = {
+    "BATCH_SIZE": config("ACTIVITY_LOG_BATCH_SIZE", default=200, cast=int),
+    "FLUSH_SECONDS": config("ACTIVITY_LOG_FLUSH_SECONDS", default=2.0, cast=float),
+    "MAX_PENDING": 50000,
+}
+
+# Opt-in SQL profiling (common/sqlprofile.py) for requests and Celery tasks. A trace is kept when
+# DB time >= SLOW_DB_MS, or >= MANY_QUERIES statements ran, or by SAMPLE_RATE; admins read the
+# most recent RING_SIZE traces at /api/admin/sql-profiles/. Staff responses carry a Server-Timing header.
+SQL_PROFILING = {
+    "ENABLED": config("SQL_PROFILING_ENABLED", default=False, cast=bool),
+    "SAMPLE_RATE": config("SQL_PROFILING_SAMPLE_RATE", default=0.01, cast=float),
+    "SLOW_DB_MS": config("SQL_PROFILING_SLOW_DB_MS", default=250.0, cast=float),
+    "MANY_QUERIES": config("SQL_PROFILING_MANY_QUERIES", default=50, cast=int),
+    "DUPLICATE_MIN": 3,
+    "TOP_N": 5,
+    "RING_SIZE": 200,
+    "SQL_MAX_CHARS": 500,
+}
+
+# Load-test harness (`manage.py load_test`, scanning/loadtest.py). Workers only serve the fake
+# "loadtest" platform when started with LOAD_TEST_FAKE_PLATFORM=1.
+LOAD_TEST = {
+    "FAKE_PLATFORM": config("LOAD_TEST_FAKE_PLATFORM", default=False, cast=bool),
+    "PAGE_SIZE": config("LOAD_TEST_PAGE_SIZE", default=50, cast=int),
+    "PAGES": config("LOAD_TEST_PAGES", default=4, cast=int),
+    "LATENCY_MS": config("LOAD_TEST_LATENCY_MS", default=0.0, cast=float),
+    "COPY_RATE": config("LOAD_TEST_COPY_RATE", default=0.1, cast=float),
+    "DUP_RATE": config("LOAD_TEST_DUP_RATE", default=0.2, cast=float),
+}
+
+# Prometheus metrics (common/metrics.py) served at /metrics. Workers publish their values to
+# the shared cache every PUBLISH_SECONDS. Scrapes send "Authorization: Bearer <METRICS_TOKEN>";
+# without a token the endpoint is only served when DEBUG is on.
+METRICS = {
+    "ENABLED": config("METRICS_ENABLED", default=True, cast=bool),
+    "TOKEN": config("METRICS_TOKEN", default=""),
+    "PUBLISH_SECONDS": config("METRICS_PUBLISH_SECONDS", default=15.0, cast=float),
+    "PROCESS_TTL": 600,
+    "MAX_PROCESSES": 512,
+}
+
+# Dashboard rollups (reporting/rollups.py), refreshed every minute by celery beat. Rows younger
+# than ROLLUP_LAG_SECONDS wait for the next run so late-committing transactions aren't skipped.
+REPORTING = {
+    "ROLLUP_BATCH_SIZE": config("REPORTING_ROLLUP_BATCH_SIZE", default=20000, cast=int),
+    "ROLLUP_LAG_SECONDS": config("REPORTING_ROLLUP_LAG_SECONDS", default=60, cast=int),
+}
+
+# Weekly per-user email report (reporting/weekly.py): users are split into CHUNK_SIZE chunks,
+# each handled by one task that sends its mail over a single SMTP connection. Deliveries are
+# recorded every EMAIL_BATCH_SIZE messages so a retried chunk skips users already mailed.
+WEEKLY_REPORT = {
+    "SUBJECT": "Your weekly ContentGuard report",
+    "CHUNK_SIZE": config("WEEKLY_REPORT_CHUNK_SIZE", default=250, cast=int),
+    "EMAIL_BATCH_SIZE": config("WEEKLY_REPORT_EMAIL_BATCH_SIZE", default=50, cast=int),
+    "TOP_AUTHORS": 5,
+    "SEND_EMPTY": config("WEEKLY_REPORT_SEND_EMPTY", default=False, cast=bool),
+}
+
+# API keys for integrations (users/authentication.py); only an HMAC digest is stored
+API_KEYS = {
+    "HMAC_KEY": config("API_KEY_HMAC_KEY", default=SECRET_KEY),
+    "MAX_AGE_DAYS": config("API_KEY_MAX_AGE_DAYS", default=0, cast=int),  # 0 = keys don't expire
+    "LOCAL_TTL": 30,  # seconds a resolved key stays in the per-process LRU (bounds revocation delay)
+    "NEGATIVE_TTL": 5,
+    "SHARED_TTL": 300,
+    "LOCAL_MAX_ENTRIES": 10000,
+}
+
 # --------------------------------------------------------------------------------------
 # CORS / CSRF (frontend at localhost:3000)
 # --------------------------------------------------------------------------------------
@@ -186,6 +270,66 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
+# Dedicated queues so a detection backlog can't starve interactive scans and slow
+# LLM/video work can't starve cheap text detection. Workers subscribe per queue with
+# their own pool/concurrency/prefetch (see docker-compose.yml):
+#   scan-io    platform API calls (I/O bound: threads, high concurrency, prefetch 1)
+#   detect-cpu fingerprinting/matching (CPU bound: prefork, concurrency = cores)
+#   llm-io     LLM judgements and video detection (slow I/O: threads, prefetch 1)
+#   legal      DMCA batches, evidence capture/verification
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_ROUTES = {
+    "scanning.tasks.execute_scan_job_task": {"queue": "scan-io"},
+    "scanning.tasks.dispatch_due_schedules": {"queue": "scan-io"},
+    "scanning.tasks.trigger_content_detection_task": {"queue": "detect-cpu"},
+    "scanning.tasks.detect_scanned_batch_task": {"queue": "detect-cpu"},
+    "scanning.tasks.execute_detection_job_task": {"queue": "detect-cpu"},
+    "detection.tasks.llm_judge_match_task": {"queue": "llm-io"},
+    "detection.tasks.reverse_scan_task": {"queue": "detect-cpu"},
+    "detection.tasks.reverse_scan_partition_task": {"queue": "detect-cpu"},
+    "detection.tasks.merge_reverse_scan_task": {"queue": "detect-cpu"},
+    "legal.tasks.*": {"queue": "legal"},
+}
+# detection jobs are routed by content type when they are queued
+DETECTION_QUEUES = {"text": "detect-cpu", "image": "detect-cpu", "video": "llm-io"}
+# Redis transport priorities: 0 is served first. Manual scans jump ahead of scheduled ones.
+SCAN_JOB_PRIORITIES = {"manual": 0, "triggered": 3, "scheduled": 6}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = config("CELERY_WORKER_PREFETCH_MULTIPLIER", default=1, cast=int)
+# modules whose task signal hooks must be connected in every worker
+CELERY_IMPORTS = ("content_protection_platform.common.metrics", "content_protection_platform.common.sqlprofile")
+
+# Shared cache (Redis in deployments). Without CACHE_URL each process gets its own LocMem cache:
+# AI model version bumps made by the web process never reach the workers, so detection then
+# rebuilds catalogs on every job instead of reusing snapshots (DETECTION_CATALOG["SNAPSHOTS"]).
+# Per-user catalog versions live on the user row and are shared regardless.
+CACHE_URL = config("CACHE_URL", default="")
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}
+        if CACHE_URL
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
+# Shared (Redis GCRA) rate limits per platform/API and credential, see common/ratelimit.py
+RATE_LIMITS = {
+    "REDIS_URL": config("RATE_LIMIT_REDIS_URL", default=CELERY_BROKER_URL),
+    "BACKEND": config("RATE_LIMIT_BACKEND", default="redis"),  # "local" = per-process only (dev/tests)
+    "LIMITS": {
+        "default": {"rate": 5, "period": 1, "burst": 5},
+        "youtube": {"rate": 10, "period": 1, "burst": 10},
+        "telegram": {"rate": 1, "period": 1, "burst": 5},
+        "openrouter": {"rate": 20, "period": 10, "burst": 5},
+    },
+}
+
 # --------------------------------------------------------------------------------------
 # Email
 # --------------------------------------------------------------------------------------
@@ -209,8 +353,101 @@ PLATFORM_APIS = {
 
 AI_MODEL_SETTINGS = {
     "SIMILARITY_THRESHOLD": config("SIMILARITY_THRESHOLD", default=0.8, cast=float),
+    # ask the OpenRouter LLM to judge partial text matches (once per duplicate cluster)
+    "LLM_JUDGE_ENABLED": config("LLM_JUDGE_ENABLED", default=False, cast=bool),
+}
+
+# per-worker ProtectedContent snapshots used by detection (see detection/catalog.py)
+DETECTION_CATALOG = {
+    "MAX_USERS": config("DETECTION_CATALOG_MAX_USERS", default=256, cast=int),
+    # reuse snapshots across jobs; only safe when the model version counter lives in a shared cache
+    "SNAPSHOTS": config("DETECTION_CATALOG_SNAPSHOTS", default=bool(CACHE_URL), cast=bool),
+}
+
+# compiled, memory-mapped fingerprint shards for very large catalogs (see detection/shards.py)
+FINGERPRINT_SHARDS = {
+    "ROOT": config("FINGERPRINT_SHARD_ROOT", default=str(BASE_DIR / "fingerprint_shards")),
+    "PLANS": ["enterprise"],  # users on these plans get a shard from `build_fingerprint_shards`
+}
+
+# semantic text matching: hashed n-gram embeddings + per-user IVF index (detection/embeddings.py, ann.py)
+EMBEDDINGS = {
+    "ENABLED": config("EMBEDDINGS_ENABLED", default=True, cast=bool),
+    "DIM": config("EMBEDDINGS_DIM", default=256, cast=int),
+    "SEMANTIC_THRESHOLD": config("EMBEDDINGS_SEMANTIC_THRESHOLD", default=0.6, cast=float),
+    "TOP_K": 10,
+    "NPROBE": config("EMBEDDINGS_NPROBE", default=8, cast=int),
+    "MIN_TRAIN": 1024,  # catalogs smaller than this are searched exactly
+}
+
+# matched-passage extraction for text matches (detection/winnowing.py): K-token shingles,
+# winnowing WINDOW; any shared run of K + WINDOW - 1 tokens is found
+SEGMENT_ALIGNMENT = {
+    "ENABLED": config("SEGMENT_ALIGNMENT_ENABLED", default=True, cast=bool),
+    "K": config("SEGMENT_ALIGNMENT_K", default=5, cast=int),
+    "WINDOW": config("SEGMENT_ALIGNMENT_WINDOW", default=4, cast=int),
+    "MIN_TOKENS": config("SEGMENT_ALIGNMENT_MIN_TOKENS", default=8, cast=int),
+    "MAX_SEGMENTS": 50,
+    "EXCERPT_CHARS": 300,  # passage text shown in the match detail view and DMCA notices
+}
+
+# excerpt detection: winnowed K-token fingerprints of text assets in an inverted index
+# (detection/containment.py); a scanned text is matched by containment, the share of its
+# fingerprints found in one asset, so a few copied paragraphs of a long document still score high.
+# Changing K or WINDOW, or turning it on, needs `manage.py rebuild_text_fingerprints`.
+WINNOWING = {
+    "ENABLED": config("WINNOWING_ENABLED", default=True, cast=bool),
+    "K": config("WINNOWING_K", default=5, cast=int),
+    "WINDOW": config("WINNOWING_WINDOW", default=8, cast=int),
+    "CONTAINMENT_THRESHOLD": config("WINNOWING_CONTAINMENT_THRESHOLD", default=0.5, cast=float),
+    "MIN_HITS": config("WINNOWING_MIN_HITS", default=3, cast=int),
+    "QUERY_BATCH": 500,  # hashes per IN (...) lookup
+}
+
+# reverse detection: a protected asset against the whole ScannedContent corpus (detection/reverse.py)
+REVERSE_SCAN = {
+    "ON_CREATE": config("REVERSE_SCAN_ON_CREATE", default=True, cast=bool),
+    # "celery" chord over detect-cpu workers, or a "process" pool inside the task; the pool can't
+    # start in a prefork worker (daemonic processes can't have children): use it only with
+    # workers run with --pool=threads or --pool=solo
+    "BACKEND": config("REVERSE_SCAN_BACKEND", default="celery"),
+    "SHARDS": config("REVERSE_SCAN_SHARDS", default=8, cast=int),
+    "TOP_K": config("REVERSE_SCAN_TOP_K", default=50, cast=int),
+    "CHUNK_SIZE": config("REVERSE_SCAN_CHUNK_SIZE", default=5000, cast=int),
+    # upper bounds for the per-request shards/top_k overrides of the reverse-scan endpoint
+    "MAX_SHARDS": config("REVERSE_SCAN_MAX_SHARDS", default=64, cast=int),
+    "MAX_TOP_K": config("REVERSE_SCAN_MAX_TOP_K", default=500, cast=int),
+}
+
+SCAN_SCHEDULER = {
+    "BATCH_SIZE": config("SCAN_SCHEDULER_BATCH_SIZE", default=500, cast=int),
+    # new schedules get a stable per-schedule offset inside this window so they don't share a start time
+    "PHASE_WINDOW_SECONDS": config("SCAN_SCHEDULER_PHASE_WINDOW", default=6 * 60 * 60, cast=int),
+    # each dispatched ScanJob is additionally delayed by a random 0..N seconds
+    "DISPATCH_JITTER_SECONDS": config("SCAN_SCHEDULER_DISPATCH_JITTER", default=300, cast=int),
+    # scheduled jobs committed but never published (scheduler died in between) are re-published after this
+    "REDISPATCH_AFTER_SECONDS": config("SCAN_SCHEDULER_REDISPATCH_AFTER", default=600, cast=int),
+}
+
+SCAN_EXECUTION = {
+    # 1 keeps the historical "first page per keyword" behaviour; raise to walk deeper result pages
+    "MAX_PAGES_PER_KEYWORD": config("SCAN_MAX_PAGES_PER_KEYWORD", default=1, cast=int),
+    "PERSIST_BATCH_SIZE": config("SCAN_PERSIST_BATCH_SIZE", default=500, cast=int),
+    # seconds after a scan ends before items whose batch never reached detection are dispatched
+    "DETECTION_SWEEP_DELAY": config("SCAN_DETECTION_SWEEP_DELAY", default=60, cast=int),
 }
 
 LEGAL_TEMPLATES_DIR = BASE_DIR / "templates" / "legal"
+# DMCA batches larger than CHUNK_SIZE claims are rendered as a chord of chunks across the legal workers
+DMCA_BATCH = {
+    "CHUNK_SIZE": config("DMCA_BATCH_CHUNK_SIZE", default=200, cast=int),
+}
 EVIDENCE_STORAGE_PATH = BASE_DIR / "evidence"
+EVIDENCE_MAX_SNAPSHOT_BYTES = config("EVIDENCE_MAX_SNAPSHOT_BYTES", default=50 * 1024 * 1024, cast=int)
+# snapshot URLs come from scanned content, so fetches only go to public addresses (checked after
+# DNS resolution and on every redirect); hosts listed here are exempt (internal mirrors, tests)
+EVIDENCE_FETCH_ALLOWED_HOSTS = config(
+    "EVIDENCE_FETCH_ALLOWED_HOSTS", default="", cast=lambda v: [s.strip().lower() for s in v.split(",") if s.strip()]
+)
+EVIDENCE_MAX_REDIRECTS = config("EVIDENCE_MAX_REDIRECTS", default=5, cast=int)
 CONFIGURE_MODELS_ON_STARTUP = config("CONFIGURE_MODELS_ON_STARTUP", default=False, cast=bool)
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from content_protection_platform.common import sqlprofile
+
+
+class MetricsEndpointTests(TestCase):
+    def scrape(self, **headers):
+        return self.client.get('/metrics', headers=headers)
+
+    @override_settings(DEBUG=False, METRICS={**settings.METRICS, 'ENABLED': True, 'TOKEN': ''})
+    def test_not_served_without_token_in_production(self):
+        self.assertEqual(self.scrape().status_code, 404)
+
+    @override_settings(DEBUG=True, METRICS={**settings.METRICS, 'ENABLED': True, 'TOKEN': ''})
+    def test_served_without_token_in_debug(self):
+        self.assertEqual(self.scrape().status_code, 200)
+
+    @override_settings(DEBUG=False, METRICS={**settings.METRICS, 'ENABLED': True, 'TOKEN': 's3cret'})
+    def test_token_required(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(Authorization='Bearer wrong').status_code, 401)
+        resp = self.scrape(Authorization='Bearer s3cret')
+        self.assertEqual(resp.status_code, 200); self.assertIn(b'cp_', resp.content)
+
+
+@override_settings(SQL_PROFILING={**settings.SQL_PROFILING, 'ENABLED': True, 'SAMPLE_RATE': 0.0, 'SLOW_DB_MS': 0.0})
+class SQLProfilingTests(TestCase):
+    def setUp(self):
+        sqlprofile.clear_traces(); self.addCleanup(sqlprofile.clear_traces)
+        User = get_user_model()
+        self.staff = User.objects.create_user(username='olga', email='olga@example.com', password='pw', is_staff=True)
+        self.member = User.objects.create_user(username='pete', email='pete@example.com', password='pw')
+
+    def get(self, user, path='/api/scan-jobs/'):
+        client = APIClient(); client.force_authenticate(user)
+        return client.get(path)
+
+    def test_server_timing_only_for_staff(self):
+        self.assertIn('db;dur=', self.get(self.staff)['Server-Timing'])
+        self.assertNotIn('Server-Timing', self.get(self.member))
+
+    def test_slow_requests_are_traced_by_route(self):
+        self.get(self.member)
+        trace = sqlprofile.recent_traces('request')[0]
+        self.assertEqual((trace['reason'], trace['path'], trace['status']), ('slow', '/api/scan-jobs/', 200))
+        self.assertGreater(trace['queries'], 0)
+        self.assertEqual(self.get(self.member, '/api/admin/sql-profiles/').status_code, 403)
+        self.assertEqual(self.get(self.staff, '/api/admin/sql-profiles/').status_code, 200)
+
+    def test_normalize_collapses_in_lists_and_values(self):
+        self.assertEqual(sqlprofile.normalize('SELECT 1 WHERE id IN (%s, %s, %s)'), 'SELECT 1 WHERE id IN (...)')
+        self.assertEqual(sqlprofile.normalize('INSERT INTO t VALUES (%s, %s), (%s, %s)'), 'INSERT INTO t VALUES (...), ...')
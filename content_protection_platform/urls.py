@@ -2,16 +2,17 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import home
+from .views import home, metrics, SQLProfileView
 from content_protection_platform.webhooks.views import (
     TelegramWebhookView,
     # NOTE: Prefer a single class to handle both GET (verify) and POST (messages):
     WhatsAppWebhookView,
 )
 from scanning.views import TelegramManualScanView
+from reporting.views import StatsView
 
 from users.views import UserViewSet, ClientConfigurationViewSet, ActivityLogViewSet
-from scanning.views import PlatformViewSet, ScanJobViewSet, ScanScheduleViewSet, ScannedContentViewSet
+from scanning.views import PlatformViewSet, ScanJobViewSet, ScanScheduleViewSet, ScannedContentViewSet, ContentClusterViewSet
 from detection.views import (
     ProtectedContentViewSet, DetectionJobViewSet, ContentMatchViewSet,
     AIModelViewSet, FeedbackDataViewSet
@@ -30,6 +31,7 @@ router.register(r"platforms", PlatformViewSet, basename="platform")
 router.register(r"scan-jobs", ScanJobViewSet, basename="scan-job")
 router.register(r"scan-schedules", ScanScheduleViewSet, basename="scan-schedule")
 router.register(r"scanned-content", ScannedContentViewSet, basename="scanned-content")
+router.register(r"content-clusters", ContentClusterViewSet, basename="content-cluster")
 
 router.register(r"protected-content", ProtectedContentViewSet, basename="protected-content")
 router.register(r"detection-jobs", DetectionJobViewSet, basename="detection-job")
@@ -46,6 +48,9 @@ router.register(r"legal-compliance", LegalComplianceViewSet, basename="legal-com
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", home, name="home"),
+    path("metrics", metrics, name="metrics"),
+    path("api/stats/", StatsView.as_view(), name="dashboard-stats"),
+    path("api/admin/sql-profiles/", SQLProfileView.as_view(), name="sql-profiles"),
     path("api/", include(router.urls)),
 
     # Telegram Bot webhook
@@ -1,4 +1,41 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .common.metrics import publish, render_text
+from .common.sqlprofile import clear_traces, recent_traces
 
 def home(request):
     return render(request, "home/index.html")
+
+def metrics(request):
+    """Prometheus scrape endpoint (this process plus every worker's last published snapshot)."""
+    cfg = settings.METRICS
+    # never public in production: no token configured means no endpoint unless DEBUG is on
+    if not cfg["ENABLED"] or not (cfg["TOKEN"] or settings.DEBUG):
+        return HttpResponse(status=404)
+    if cfg["TOKEN"]:
+        given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(given.encode(), cfg["TOKEN"].encode()):
+            return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    publish()
+    return HttpResponse(render_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+class SQLProfileView(APIView):
+    """GET recent SQL profiles (?kind=request|task&limit=50), newest first; DELETE clears them."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 50)), settings.SQL_PROFILING["RING_SIZE"]))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        traces = recent_traces(request.query_params.get("kind"), limit)
+        return Response({"enabled": settings.SQL_PROFILING["ENABLED"], "count": len(traces), "traces": traces})
+
+    def delete(self, request):
+        clear_traces()
+        return Response(status=204)
@@ -6,6 +6,8 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from scanning.models import Platform, ScanJob, ScannedContent
+from scanning.dedupe import assign_clusters
+from content_protection_platform.common.payload_store import offload_raw_payload
 from django.utils import timezone
 import hashlib
 
@@ -33,7 +35,7 @@ class TelegramWebhookView(APIView):
         platform = _ensure_platform("telegram", "Telegram", "https://t.me")
         # You may create a synthetic ScanJob or keep None; here we keep None
         content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
-        ScannedContent.objects.create(
+        obj = ScannedContent.objects.create(
             scan_job=None,
             platform=platform,
             platform_content_id=str(message_id),
@@ -46,9 +48,10 @@ class TelegramWebhookView(APIView):
             published_at=timezone.now(),
             text_content=text,
             media_urls=[],
-            metadata={"raw": data},
+            metadata=offload_raw_payload({"raw": data}),
             content_hash=content_hash
         )
+        assign_clusters([obj])
         return Response({"ok": True})
 
 class WhatsAppVerifyView(APIView):
@@ -73,6 +76,7 @@ class WhatsAppWebhookView(APIView):
         data = request.data
         platform = _ensure_platform("whatsapp", "WhatsApp", "https://www.whatsapp.com")
         # Parse message(s)
+        created = []
         for entry in data.get("entry", []):
             for change in entry.get("changes", []):
                 value = change.get("value", {})
@@ -82,12 +86,13 @@ class WhatsAppWebhookView(APIView):
                     mid = msg.get("id")
                     url = f"https://wa.me/{from_num}"
                     content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
-                    ScannedContent.objects.create(
+                    created.append(ScannedContent.objects.create(
                         scan_job=None, platform=platform, platform_content_id=mid,
                         content_url=url, content_type="text",
                         title=f"WhatsApp message {mid}", author=from_num,
                         author_url=url, published_at=timezone.now(),
-                        text_content=text, media_urls=[], metadata={"raw": msg},
+                        text_content=text, media_urls=[], metadata=offload_raw_payload({"raw": msg}),
                         content_hash=content_hash
-                    )
+                    ))
+        assign_clusters(created)
         return Response({"ok": True})
@@ -0,0 +1,233 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import ProtectedContent
+from .catalog import catalog_version
+from .embeddings import embed_text, from_bytes, to_bytes
+
+
+class _InvList:
+    """Growable (ids, float16 vectors) list with O(1) swap-remove."""
+    __slots__ = ('ids', 'vecs', 'size')
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.ids = np.empty(capacity, dtype=np.int64); self.vecs = np.empty((capacity, dim), dtype=np.float16); self.size = 0
+
+    def _reserve(self, n: int):
+        if n <= len(self.ids):
+            return
+        cap = max(n, 2 * len(self.ids))
+        ids = np.empty(cap, dtype=np.int64); vecs = np.empty((cap, self.vecs.shape[1]), dtype=np.float16)
+        ids[:self.size] = self.ids[:self.size]; vecs[:self.size] = self.vecs[:self.size]
+        self.ids, self.vecs = ids, vecs
+
+    def extend(self, ids: np.ndarray, vecs: np.ndarray) -> int:
+        start = self.size; self._reserve(start + len(ids))
+        self.ids[start:start + len(ids)] = ids; self.vecs[start:start + len(ids)] = vecs
+        self.size += len(ids)
+        return start
+
+    def remove_at(self, pos: int) -> Optional[int]:
+        """Remove row `pos`; returns the id moved into its place (if any)."""
+        last = self.size - 1; moved = None
+        if pos != last:
+            self.ids[pos] = self.ids[last]; self.vecs[pos] = self.vecs[last]; moved = int(self.ids[pos])
+        self.size = last
+        return moved
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over unit vectors (cosine = dot product), numpy only.
+    Vectors are kept as float16; spherical k-means centroids partition them into
+    `nlist` lists and a query scans the `nprobe` closest lists. Below `min_train`
+    vectors it stays a single flat list (exact search). Supports incremental add/remove;
+    retrains when the index has grown 4x since the last training.
+    """
+    def __init__(self, dim: int, nprobe: int = 8, min_train: int = 1024, seed: int = 0):
+        self.dim = dim; self.nprobe = nprobe; self.min_train = min_train; self.seed = seed
+        self.centroids: Optional[np.ndarray] = None; self.trained_size = 0
+        self.lists: List[_InvList] = [_InvList(dim)]
+        self.where: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self): return len(self.where)
+
+    def __contains__(self, pk): return pk in self.where
+
+    # ---- training ----------------------------------------------------------------
+    def _kmeans(self, x: np.ndarray, k: int, iters: int = 10) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        sample = x[rng.choice(len(x), size=min(len(x), max(k * 40, 2048)), replace=False)]
+        c = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ c.T, axis=1)
+            sums = np.zeros_like(c); np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            c = np.where(norms > 0, sums / np.maximum(norms, 1e-12), c)  # empty clusters keep their centroid
+        return c.astype(np.float32)
+
+    def _assign(self, vecs: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.zeros(len(vecs), dtype=np.int64)
+        return np.concatenate([np.argmax(vecs[i:i + 8192].astype(np.float32) @ self.centroids.T, axis=1)
+                               for i in range(0, len(vecs), 8192)]) if len(vecs) else np.zeros(0, dtype=np.int64)
+
+    def _all(self) -> Tuple[np.ndarray, np.ndarray]:
+        lists = [l for l in self.lists if l.size]
+        if not lists:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dim), dtype=np.float16)
+        return np.concatenate([l.ids[:l.size] for l in lists]), np.concatenate([l.vecs[:l.size] for l in lists])
+
+    def train(self):
+        ids, vecs = self._all()
+        nlist = max(1, int(np.sqrt(len(ids))))
+        self.centroids = self._kmeans(vecs.astype(np.float32), nlist) if nlist > 1 else None
+        self.trained_size = len(ids)
+        self.lists = [_InvList(self.dim) for _ in range(len(self.centroids) if self.centroids is not None else 1)]
+        self.where = {}
+        self._insert(ids, vecs)
+
+    # ---- updates -----------------------------------------------------------------
+    def _insert(self, ids: np.ndarray, vecs: np.ndarray):
+        assign = self._assign(vecs)
+        for li in np.unique(assign).tolist():
+            sel = assign == li
+            start = self.lists[li].extend(ids[sel], vecs[sel])
+            for off, pk in enumerate(ids[sel].tolist()):
+                self.where[pk] = (li, start + off)
+
+    def add(self, ids: Iterable[int], vecs: np.ndarray):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if not len(ids):
+            return
+        self.remove(ids.tolist())
+        self._insert(ids, np.asarray(vecs, dtype=np.float16).reshape(len(ids), self.dim))
+        n = len(self.where)
+        if (self.centroids is None and n >= self.min_train) or (self.centroids is not None and n > 4 * self.trained_size):
+            self.train()
+
+    def remove(self, ids: Iterable[int]):
+        for pk in ids:
+            loc = self.where.pop(pk, None)
+            if loc is None:
+                continue
+            li, pos = loc
+            moved = self.lists[li].remove_at(pos)
+            if moved is not None:
+                self.where[moved] = (li, pos)
+
+    # ---- queries -----------------------------------------------------------------
+    @staticmethod
+    def _top(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not len(ids):
+            return []
+        k = min(k, len(ids))
+        part = np.argpartition(-scores, k - 1)[:k]
+        part = part[np.argsort(-scores[part])]
+        return [(int(ids[i]), float(scores[i])) for i in part]
+
+    def search(self, q: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        q = np.asarray(q, dtype=np.float32)
+        if self.centroids is None:
+            probe = range(len(self.lists))
+        else:
+            n = min(nprobe or self.nprobe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ q), n - 1)[:n].tolist()
+        lists = [self.lists[i] for i in probe if self.lists[i].size]
+        if not lists:
+            return []
+        ids = np.concatenate([l.ids[:l.size] for l in lists])
+        scores = np.concatenate([l.vecs[:l.size].astype(np.float32) @ q for l in lists])
+        return self._top(ids, scores, k)
+
+    def brute_force(self, q: np.ndarray, k: int = 10) -> List[Tuple[int, float]]:
+        ids, vecs = self._all()
+        return self._top(ids, vecs.astype(np.float32) @ np.asarray(q, dtype=np.float32), k)
+
+
+# -------- per-user indexes kept in sync with ProtectedContent ------------------------
+class _UserIndex:
+    __slots__ = ('index', 'version', 'synced_at', 'lock')
+
+    def __init__(self, index: IVFIndex):
+        self.index = index; self.version = None; self.synced_at = None; self.lock = threading.Lock()
+
+
+def _embedding_rows(qs) -> Tuple[List[int], List[np.ndarray]]:
+    """(ids, vectors) for text rows, computing (and storing) embeddings that are missing or stale."""
+    ids, vecs, backfill = [], [], []
+    for pk, blob, text in qs.values_list('id', 'embedding', 'text_content').iterator(chunk_size=2000):
+        vec = from_bytes(blob)
+        if vec is None:
+            vec = embed_text(text)
+            if vec is None:
+                continue
+            backfill.append(ProtectedContent(pk=pk, embedding=to_bytes(vec)))
+        ids.append(pk); vecs.append(vec)
+    if backfill:
+        ProtectedContent.objects.bulk_update(backfill, ['embedding'], batch_size=1000)
+    return ids, vecs
+
+
+def _sync(entry: _UserIndex, user_id: int):
+    """Full load on first use, then incremental: drop rows that left the catalog, re-add changed ones."""
+    started = timezone.now()
+    live = ProtectedContent.objects.filter(user_id=user_id, content_type='text', is_active=True, monitoring_enabled=True)
+    index = entry.index
+    if entry.synced_at is None:
+        changed = live
+    else:
+        live_ids: Set[int] = set(live.values_list('id', flat=True))
+        index.remove([pk for pk in list(index.where) if pk not in live_ids])
+        missing = [pk for pk in live_ids if pk not in index]
+        changed = live.filter(updated_at__gt=entry.synced_at) | live.filter(id__in=missing)
+    ids, vecs = _embedding_rows(changed)
+    if ids:
+        index.add(ids, np.stack(vecs))
+    entry.synced_at = started
+
+
+class _IndexRegistry:
+    def __init__(self):
+        self.lock = threading.Lock(); self.items: 'OrderedDict[int, _UserIndex]' = OrderedDict()
+
+    def get(self, user_id: int) -> IVFIndex:
+        cfg = settings.EMBEDDINGS
+        version = catalog_version(user_id)
+        with self.lock:
+            entry = self.items.get(user_id)
+            if entry is None:
+                entry = self.items[user_id] = _UserIndex(IVFIndex(cfg['DIM'], cfg['NPROBE'], cfg['MIN_TRAIN']))
+            self.items.move_to_end(user_id)
+            while len(self.items) > settings.DETECTION_CATALOG['MAX_USERS']:
+                self.items.popitem(last=False)
+        # synced under the user's own lock: a large first load doesn't hold up other users' lookups
+        with entry.lock:
+            # snapshots off: sync (incrementally) every time
+            if entry.version != version or not settings.DETECTION_CATALOG['SNAPSHOTS']:
+                _sync(entry, user_id); entry.version = version
+        return entry.index
+
+
+_indexes = _IndexRegistry()
+
+
+def get_user_index(user_id: int) -> IVFIndex:
+    """The user's text-embedding index, synced with ProtectedContent when their catalog version changed."""
+    return _indexes.get(user_id)
+
+
+def semantic_matches(user_id: int, text: str, k: Optional[int] = None, threshold: Optional[float] = None) -> List[Tuple[int, float]]:
+    """(protected_content_id, cosine) of the user's text assets semantically close to `text`."""
+    cfg = settings.EMBEDDINGS
+    q = embed_text(text)
+    if q is None:
+        return []
+    index = get_user_index(user_id)
+    if not len(index):
+        return []
+    threshold = cfg['SEMANTIC_THRESHOLD'] if threshold is None else threshold
+    return [(pk, s) for pk, s in index.search(q, k or cfg['TOP_K']) if s >= threshold]
@@ -4,6 +4,7 @@ class DetectionConfig(AppConfig):
     default_auto_field='django.db.models.BigAutoField'
     name='detection'
     def ready(self):
+        from . import signals  # noqa: F401  (catalog version bumps)
         if getattr(settings,'CONFIGURE_MODELS_ON_STARTUP', False):
             from .services import initialize_ai_models
             initialize_ai_models()
@@ -0,0 +1,285 @@
+import json, random, re, tempfile, threading, time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from content_protection_platform.common.llm import OpenRouterClient, llm_json
+from content_protection_platform.common.ratelimit import RateLimiter
+from content_protection_platform.common.stats import percentile
+from .models import AIModel, ModelPerformanceLog
+from .ann import IVFIndex
+from .catalog import fingerprint_to_int
+from .containment import asset_fingerprints
+from .embeddings import embed_text
+from .shards import TYPE_CODES, FingerprintShard, write_shard
+from .prompt import MATCH_DECISION_SYSTEM, MATCH_DECISION_USER_TEMPLATE, MATCH_DECISION_SCHEMA
+
+# Offline accuracy/latency harness for the fingerprint engines and the LLM judge
+# (`manage.py benchmark_detection`). Everything is synthetic and seeded, so runs are comparable.
+
+
+def paraphrase(text: str, rng: random.Random) -> str:
+    """Cheap paraphrase: drop, duplicate and swap a few words."""
+    words = text.split()
+    for _ in range(max(1, len(words) // 6)):
+        i = rng.randrange(len(words)); op = rng.random()
+        if op < 0.4 and len(words) > 3: words.pop(i)
+        elif op < 0.7: words.insert(i, words[i])
+        else:
+            j = rng.randrange(len(words)); words[i], words[j] = words[j], words[i]
+    return " ".join(words)
+
+
+# -------- synthetic catalogs ------------------------------------------------------
+@dataclass
+class Query:
+    content: str
+    source: Optional[int]  # index of the original it was derived from; None = unrelated (negative)
+    variant: str
+
+
+@dataclass
+class Dataset:
+    content_type: str
+    originals: List[str]
+    queries: List[Query] = field(default_factory=list)
+
+
+# The image/video services fingerprint the asset URL, so crops, resizes and trims are
+# modelled as the URL variants a CDN or re-uploader would produce for them.
+def _text_dataset(n: int, rng: random.Random) -> Dataset:
+    vocab = [f"w{i}" for i in range(5000)]
+    sentence = lambda: " ".join(rng.choices(vocab, k=rng.randint(15, 60)))
+    ds = Dataset("text", [sentence() for _ in range(n)])
+    for i, text in enumerate(ds.originals):
+        ds.queries += [Query(text, i, "copy"), Query(paraphrase(text, rng), i, "paraphrase"),
+                       Query(paraphrase(paraphrase(text, rng), rng), i, "paraphrase_heavy")]
+    ds.queries += [Query(sentence(), None, "unrelated") for _ in range(n)]
+    return ds
+
+
+def _image_dataset(n: int, rng: random.Random) -> Dataset:
+    ds = Dataset("image", [f"https://cdn.bench.local/img/{rng.getrandbits(64):016x}.jpg" for _ in range(n)])
+    for i, url in enumerate(ds.originals):
+        w = rng.choice([320, 640, 1280])
+        ds.queries += [Query(url, i, "copy"), Query(f"{url}?w={w}&h={w * 3 // 4}", i, "resize"),
+                       Query(f"{url}?crop={rng.randint(0, 50)},{rng.randint(0, 50)},{w},{w}", i, "crop")]
+    ds.queries += [Query(f"https://cdn.bench.local/img/{rng.getrandbits(64):016x}.jpg", None, "unrelated") for _ in range(n)]
+    return ds
+
+
+def _video_dataset(n: int, rng: random.Random) -> Dataset:
+    ds = Dataset("video", [f"https://cdn.bench.local/vid/{rng.getrandbits(64):016x}.mp4" for _ in range(n)])
+    for i, url in enumerate(ds.originals):
+        start = rng.randint(1, 30)
+        ds.queries += [Query(url, i, "copy"), Query(f"{url}#t={start},{start + rng.randint(10, 90)}", i, "trim")]
+    ds.queries += [Query(f"https://cdn.bench.local/vid/{rng.getrandbits(64):016x}.mp4", None, "unrelated") for _ in range(n)]
+    return ds
+
+
+DATASETS: Dict[str, Callable[[int, random.Random], Dataset]] = {"text": _text_dataset, "image": _image_dataset, "video": _video_dataset}
+
+
+# -------- scoring -----------------------------------------------------------------
+class Tally:
+    def __init__(self):
+        self.tp = self.fp = self.fn = self.tn = 0
+        self.latencies: List[float] = []; self.by_variant: Dict[str, List[int]] = {}
+
+    def add(self, q: Query, predicted: Optional[int], seconds: float):
+        self.latencies.append(seconds)
+        if q.source is None:
+            if predicted is None: self.tn += 1
+            else: self.fp += 1
+        elif predicted == q.source:
+            self.tp += 1
+        else:
+            self.fn += 1
+            if predicted is not None: self.fp += 1  # matched the wrong original
+        hits = self.by_variant.setdefault(q.variant, [0, 0])
+        hits[0] += (predicted == q.source) if q.source is not None else (predicted is None); hits[1] += 1
+
+    def summary(self, wall: float) -> Dict[str, Any]:
+        n = len(self.latencies)
+        precision = self.tp / (self.tp + self.fp) if self.tp + self.fp else 0.0
+        recall = self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+        return {
+            "items": n,
+            "accuracy": (self.tp + self.tn) / n if n else 0.0,
+            "precision": precision, "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "mean_s": sum(self.latencies) / n if n else 0.0,
+            "p50_ms": percentile(self.latencies, .5) * 1000, "p95_ms": percentile(self.latencies, .95) * 1000,
+            "p99_ms": percentile(self.latencies, .99) * 1000,
+            "throughput_per_s": n / wall if wall else 0.0,
+            "by_variant": {v: round(h / t, 4) for v, (h, t) in sorted(self.by_variant.items())},
+            "confusion": {"tp": self.tp, "fp": self.fp, "fn": self.fn, "tn": self.tn},
+        }
+
+
+def run_engine(service, ds: Dataset, threshold: float) -> Dict[str, Any]:
+    """Each query: fingerprint it, compare against every original, predict the best one above `threshold`."""
+    started = time.perf_counter()
+    catalog = [service.generate_fingerprint(o) for o in ds.originals]
+    index_s = time.perf_counter() - started
+    tally = Tally(); started = time.perf_counter()
+    for q in ds.queries:
+        t = time.perf_counter()
+        fp = service.generate_fingerprint(q.content)
+        best, best_sim = None, threshold
+        for i, cfp in enumerate(catalog):
+            sim = service.compare_fingerprints(cfp, fp)
+            if sim >= best_sim:
+                best, best_sim = i, sim
+        tally.add(q, best, time.perf_counter() - t)
+    return {**tally.summary(time.perf_counter() - started), "catalog_size": len(catalog), "index_s": index_s}
+
+
+def _run_matcher(ds: Dataset, predict: Callable[[str], Optional[int]], catalog_size: int, index_s: float) -> Dict[str, Any]:
+    tally = Tally(); started = time.perf_counter()
+    for q in ds.queries:
+        t = time.perf_counter()
+        tally.add(q, predict(q.content), time.perf_counter() - t)
+    return {**tally.summary(time.perf_counter() - started), "catalog_size": catalog_size, "index_s": index_s}
+
+
+def run_containment(ds: Dataset) -> Dict[str, Any]:
+    """Excerpt matching (containment.py) with its WINNOWING thresholds, over an in-memory inverted index."""
+    cfg = settings.WINNOWING; started = time.perf_counter(); index: Dict[int, set] = {}
+    for i, text in enumerate(ds.originals):
+        for h, _ in asset_fingerprints(text):
+            index.setdefault(h, set()).add(i)
+    index_s = time.perf_counter() - started
+
+    def predict(text):
+        hashes = {h for h, _ in asset_fingerprints(text)}
+        if len(hashes) < cfg["MIN_HITS"]:
+            return None
+        hits: Dict[int, int] = {}
+        for h in hashes:
+            for i in index.get(h, ()):
+                hits[i] = hits.get(i, 0) + 1
+        best = max(hits.items(), key=lambda kv: (kv[1], -kv[0]), default=None)
+        ok = best and best[1] >= cfg["MIN_HITS"] and best[1] / len(hashes) >= cfg["CONTAINMENT_THRESHOLD"]
+        return best[0] if ok else None
+    return _run_matcher(ds, predict, len(ds.originals), index_s)
+
+
+def run_semantic(ds: Dataset) -> Dict[str, Any]:
+    """Semantic matching (ann.py): hashed n-gram embeddings in an IVFIndex, best hit above SEMANTIC_THRESHOLD."""
+    cfg = settings.EMBEDDINGS; started = time.perf_counter()
+    index = IVFIndex(cfg["DIM"], cfg["NPROBE"], cfg["MIN_TRAIN"])
+    vecs = [(i, v) for i, v in enumerate(embed_text(o) for o in ds.originals) if v is not None]
+    if vecs:
+        index.add([i for i, _ in vecs], np.stack([v for _, v in vecs]))
+    index_s = time.perf_counter() - started
+
+    def predict(text):
+        q = embed_text(text)
+        hits = index.search(q, 1) if q is not None else []
+        return hits[0][0] if hits and hits[0][1] >= cfg["SEMANTIC_THRESHOLD"] else None
+    return _run_matcher(ds, predict, len(index), index_s)
+
+
+def run_shard(service, ds: Dataset) -> Dict[str, Any]:
+    """Exact fingerprint lookups (shards.py) in a memory-mapped shard written to a temporary directory."""
+    started = time.perf_counter()
+    hashes = np.array([fingerprint_to_int(service.generate_fingerprint(o)) for o in ds.originals], dtype='<u8')
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "bench.fps"
+        write_shard(path, np.arange(len(hashes), dtype='<u8'), np.full(len(hashes), TYPE_CODES[ds.content_type], dtype='u1'),
+                    hashes, timezone.now())
+        shard = FingerprintShard(path); index_s = time.perf_counter() - started
+
+        def predict(content):
+            ids = shard.lookup(fingerprint_to_int(service.generate_fingerprint(content)), ds.content_type)
+            return int(ids[0]) if len(ids) else None
+        return _run_matcher(ds, predict, len(shard), index_s)
+
+
+def run_llm_judge(client: OpenRouterClient, ds: Dataset, pairs: int, rng: random.Random) -> Dict[str, Any]:
+    """The judge sees (owner, candidate) pairs: candidates are derived copies or unrelated texts paired with a random original."""
+    sample = rng.sample(ds.queries, min(pairs, len(ds.queries)))
+    tally = Tally(); started = time.perf_counter(); errors = 0
+    for q in sample:
+        owner = q.source if q.source is not None else rng.randrange(len(ds.originals))
+        t = time.perf_counter()
+        try:
+            verdict = llm_json(client, MATCH_DECISION_SYSTEM, MATCH_DECISION_USER_TEMPLATE.format(
+                owner=ds.originals[owner][:4000], platform="benchmark", url="", text=q.content[:4000]), MATCH_DECISION_SCHEMA)
+            predicted = owner if verdict.get("decision") == "yes" else None
+        except Exception:
+            errors += 1; predicted = None
+        tally.add(q, predicted, time.perf_counter() - t)
+    return {**tally.summary(time.perf_counter() - started), "errors": errors}
+
+
+def log_performance(model: AIModel, result: Dict[str, Any], notes: Dict[str, Any]) -> ModelPerformanceLog:
+    """processing_time is mean seconds per item; latency percentiles and per-variant hit rates go to test_notes."""
+    return ModelPerformanceLog.objects.create(
+        model=model, processing_time=result["mean_s"], accuracy=result["accuracy"], precision=result["precision"],
+        recall=result["recall"], f1_score=result["f1"], test_dataset_size=result["items"], test_date=timezone.now(),
+        test_notes=json.dumps({**notes, **{k: result[k] for k in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "by_variant", "confusion")}}),
+    )
+
+
+def engine_model(name: str, model_type: str, version: str, description: str) -> AIModel:
+    """Non-default AIModel row that benchmark results of a matcher are logged against."""
+    model, _ = AIModel.objects.get_or_create(name=name, model_type=model_type, version=version,
+                                             defaults={"is_active": True, "is_default": False, "description": description})
+    return model
+
+
+def judge_model(client: OpenRouterClient, stub: bool) -> AIModel:
+    return engine_model("LLM Match Judge", "text", "local-stub" if stub else client.model, "LLM judgement of partial text matches")
+
+
+# -------- local OpenAI-compatible stub for the judge ------------------------------
+_SECTION = re.compile(r"OWNER_CONTENT:\n(.*?)\n\nCANDIDATE_CONTENT[^\n]*\n(.*?)\n\nTask:", re.S)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        prompt = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+        m = _SECTION.search(prompt)
+        owner, cand = (set(m.group(1).split()), set(m.group(2).split())) if m else (set(), set())
+        score = len(owner & cand) / len(owner | cand) if owner | cand else 0.0
+        verdict = {"decision": "yes" if score >= 0.5 else "maybe" if score >= 0.25 else "no",
+                   "similarity_score": round(score, 4), "rationale": "token overlap (benchmark stub)",
+                   "overlap_phrases": sorted(owner & cand)[:8]}
+        if self.latency:
+            time.sleep(self.latency)
+        out = json.dumps({"choices": [{"message": {"role": "assistant", "content": json.dumps(verdict)}}]}).encode()
+        self.send_response(200); self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out))); self.end_headers(); self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubLLMServer:
+    """`with StubLLMServer(latency_ms=...) as url:` an OpenAI-style /chat/completions judge on 127.0.0.1."""
+    def __init__(self, latency_ms: float = 0.0):
+        handler = type("Handler", (_StubHandler,), {"latency": latency_ms / 1000})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __exit__(self, *exc):
+        self.server.shutdown(); self.server.server_close()
+        return False
+
+
+def stub_client(url: str) -> OpenRouterClient:
+    client = OpenRouterClient(api_key="benchmark", base_url=url, model="local-stub")
+    client.rate_limiter = RateLimiter("ratelimit:benchmark:stub", rate=1e6, backend="local")  # no real quota to protect
+    return client
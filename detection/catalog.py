@@ -0,0 +1,159 @@
+import threading, time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from .models import ProtectedContent, AIModel
+
+# Which fingerprint column a protected item is matched on, per content type
+FINGERPRINT_FIELDS = {'text': 'text_fingerprint', 'image': 'visual_fingerprint', 'video': 'audio_fingerprint'}
+MODEL_TYPES = ('text', 'image', 'video')
+
+_MODELS_VERSION_KEY = 'detection:models:v'
+
+
+def _version(key: str) -> int:
+    # seeded with a timestamp so a flushed cache never hands out a version a worker already holds
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key) or 0
+
+
+def _bump(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:  # missing (evicted/flushed): any fresh value invalidates old snapshots
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+# A user's catalog version is a counter on their row, so every process (and the DetectionJob rows
+# stamped with it) agrees on it whatever the cache backend; one primary-key read per lookup.
+def catalog_version(user_id: int) -> int:
+    return get_user_model().objects.filter(pk=user_id).values_list('catalog_version', flat=True).first() or 0
+
+
+def bump_catalog_version(user_id: int):
+    get_user_model().objects.filter(pk=user_id).update(catalog_version=F('catalog_version') + 1)
+
+
+def bump_models_version(): _bump(_MODELS_VERSION_KEY)
+
+
+def fingerprint_to_int(fp: Optional[Dict[str, Any]]) -> int:
+    """Pack a {"hash": <16 hex chars>} fingerprint into a uint64 (0 = no fingerprint)."""
+    try:
+        return int(fp['hash'], 16) if fp and fp.get('hash') else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def int_to_fingerprint(h: int) -> Dict[str, Any]:
+    return {'hash': f'{h:016x}'} if h else {}
+
+
+@dataclass(slots=True)
+class CatalogEntry:
+    id: int
+    content_type: str
+    title: str
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of one user's monitored ProtectedContent: entries plus a parallel
+    array('Q') of packed fingerprint hashes, and the default AI model per type.
+    """
+    __slots__ = ('user_id', 'version', 'entries', 'hashes', 'models')
+
+    def __init__(self, user_id: int, version: Tuple[int, int], entries: List[CatalogEntry], hashes: array, models: Dict[str, Optional[Dict[str, str]]]):
+        self.user_id = user_id; self.version = version; self.entries = entries; self.hashes = hashes; self.models = models
+
+    def __len__(self): return len(self.entries)
+
+    def iter_type(self, content_types):
+        wanted = set(content_types)
+        for i, e in enumerate(self.entries):
+            if e.content_type in wanted:
+                yield e, self.hashes[i]
+
+    def model_versions(self) -> Dict[str, str]:
+        return {t: m['version'] for t, m in self.models.items() if m}
+
+
+def _load_models() -> Dict[str, Optional[Dict[str, str]]]:
+    models = {t: None for t in MODEL_TYPES}
+    for m in AIModel.objects.filter(is_active=True, is_default=True).only('name', 'version', 'model_type').order_by('id'):
+        if models.get(m.model_type) is None:
+            models[m.model_type] = {'name': m.name, 'version': m.version}
+    return models
+
+
+def build_snapshot(user_id: int, version: Tuple[int, int]) -> CatalogSnapshot:
+    entries: List[CatalogEntry] = []; hashes = array('Q')
+    rows = ProtectedContent.objects.filter(user_id=user_id, is_active=True, monitoring_enabled=True).order_by('id') \
+        .values_list('id', 'content_type', 'title', 'text_fingerprint', 'visual_fingerprint', 'audio_fingerprint')
+    for pk, ctype, title, text_fp, visual_fp, audio_fp in rows.iterator(chunk_size=2000):
+        fp = {'text': text_fp, 'image': visual_fp, 'video': audio_fp}.get(ctype)
+        entries.append(CatalogEntry(pk, ctype, title)); hashes.append(fingerprint_to_int(fp))
+    return CatalogSnapshot(user_id, version, entries, hashes, _load_models())
+
+
+_models_lock = threading.Lock()
+_models_cached: Tuple[Optional[int], Dict[str, Optional[Dict[str, str]]]] = (None, {})
+
+
+def get_model_info() -> Dict[str, Optional[Dict[str, str]]]:
+    """Default AI model per type, without loading a catalog (used with fingerprint shards)."""
+    global _models_cached
+    if not settings.DETECTION_CATALOG['SNAPSHOTS']:
+        return _load_models()
+    version = _version(_MODELS_VERSION_KEY)
+    with _models_lock:
+        if _models_cached[0] != version:
+            _models_cached = (version, _load_models())
+        return _models_cached[1]
+
+
+class _SnapshotCache:
+    """
+    Worker-local LRU of snapshots; validity is one cache read of the shared version counters.
+    With DETECTION_CATALOG['SNAPSHOTS'] off (no shared cache) every call builds a fresh snapshot.
+    """
+    def __init__(self):
+        self.lock = threading.Lock(); self.items: 'OrderedDict[int, CatalogSnapshot]' = OrderedDict()
+
+    def get(self, user_id: int) -> CatalogSnapshot:
+        version = (catalog_version(user_id), _version(_MODELS_VERSION_KEY))
+        if not settings.DETECTION_CATALOG['SNAPSHOTS']:
+            return build_snapshot(user_id, version)  # process-local cache: other processes' bumps are invisible
+        with self.lock:
+            snap = self.items.get(user_id)
+            if snap is not None and snap.version == version:
+                self.items.move_to_end(user_id)
+                return snap
+        # built outside the lock; the version was read first, so a concurrent edit triggers another rebuild
+        snap = build_snapshot(user_id, version)
+        with self.lock:
+            self.items[user_id] = snap; self.items.move_to_end(user_id)
+            while len(self.items) > settings.DETECTION_CATALOG['MAX_USERS']:
+                self.items.popitem(last=False)
+        return snap
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+_snapshots = _SnapshotCache()
+
+
+def get_catalog(user) -> CatalogSnapshot:
+    """The current catalog snapshot for `user` (a User or a user id)."""
+    return _snapshots.get(getattr(user, 'pk', user))
+
+
+def clear_local_catalogs():
+    _snapshots.clear()
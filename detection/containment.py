@@ -0,0 +1,66 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from .models import ProtectedContent, TextFingerprintIndex
+from .winnowing import fingerprint
+
+# Excerpt detection over TextFingerprintIndex. Whole-text hashes and embeddings compare two
+# documents symmetrically, so a few paragraphs lifted from a long course or book score low.
+# Here a scanned text is scored by containment: the share of its own winnowed fingerprints
+# that occur in an asset. An exact excerpt scores ~1.0 however long the asset is.
+
+
+def asset_fingerprints(text: Optional[str]) -> List[Tuple[int, int]]:
+    cfg = settings.WINNOWING
+    return fingerprint(text or '', cfg['K'], cfg['WINDOW'])
+
+
+def index_protected_content(pc: ProtectedContent) -> int:
+    """Bring one asset's index rows in line with its text; rows are only rewritten when the fingerprints changed."""
+    fps = asset_fingerprints(pc.text_content) if pc.content_type == 'text' else []
+    rows = TextFingerprintIndex.objects.filter(protected_content_id=pc.id)
+    if set(rows.values_list('hash', 'position')) == set(fps):
+        return 0
+    with transaction.atomic():
+        rows.delete()
+        TextFingerprintIndex.objects.bulk_create(
+            [TextFingerprintIndex(user_id=pc.user_id, protected_content_id=pc.id, hash=h, position=pos) for h, pos in fps],
+            batch_size=2000)
+    return len(fps)
+
+
+def rebuild_index(user_ids: Optional[Iterable[int]] = None, chunk_size: int = 500) -> Dict[str, int]:
+    """Re-fingerprint every text asset (of `user_ids`); needed after changing WINNOWING K/WINDOW."""
+    assets = ProtectedContent.objects.filter(content_type='text').only('id', 'user_id', 'content_type', 'text_content').order_by('id')
+    stale = TextFingerprintIndex.objects.exclude(protected_content__content_type='text')
+    if user_ids is not None:
+        user_ids = list(user_ids); assets = assets.filter(user_id__in=user_ids); stale = stale.filter(user_id__in=user_ids)
+    report = {'assets': 0, 'fingerprints': 0, 'removed': stale.delete()[0]}
+    for pc in assets.iterator(chunk_size=chunk_size):
+        report['assets'] += 1; report['fingerprints'] += index_protected_content(pc)
+    return report
+
+
+def containment_matches(user_id: int, text: str, exclude: Iterable[int] = ()) -> List[Tuple[int, float, int]]:
+    """
+    (protected_content_id, containment, hits) of the user's live text assets that contain
+    at least CONTAINMENT_THRESHOLD of `text`'s fingerprints, best first. Hits are counted in
+    the database, one grouped query per QUERY_BATCH hashes.
+    """
+    cfg = settings.WINNOWING
+    hashes = sorted({h for h, _ in asset_fingerprints(text)})
+    if len(hashes) < cfg['MIN_HITS']:
+        return []
+    hits: Dict[int, int] = {}
+    for i in range(0, len(hashes), cfg['QUERY_BATCH']):
+        # batches hold disjoint hashes, so per-batch distinct counts add up
+        for pc_id, n in (TextFingerprintIndex.objects
+                         .filter(user_id=user_id, hash__in=hashes[i:i + cfg['QUERY_BATCH']],
+                                 protected_content__is_active=True, protected_content__monitoring_enabled=True)
+                         .values_list('protected_content_id').order_by().annotate(n=Count('hash', distinct=True))):
+            hits[pc_id] = hits.get(pc_id, 0) + n
+    exclude = set(exclude)
+    out = [(pc_id, round(n / len(hashes), 4), n) for pc_id, n in hits.items()
+           if pc_id not in exclude and n >= cfg['MIN_HITS'] and n / len(hashes) >= cfg['CONTAINMENT_THRESHOLD']]
+    return sorted(out, key=lambda r: (-r[1], r[0]))
@@ -0,0 +1,67 @@
+import zlib
+from typing import Iterator, Optional
+import numpy as np
+from django.conf import settings
+from scanning.dedupe import normalize_content
+
+
+class HashedNgramVectorizer:
+    """
+    Offline text embedding: word unigrams/bigrams and character n-grams of the normalized
+    text, hashed (crc32, stable across processes) into `dim` signed buckets, sublinear tf,
+    L2-normalized. Character n-grams survive rewording, reordering and light paraphrase
+    far better than a whole-text hash.
+    """
+    def __init__(self, dim: int = 256, char_ngrams=(3, 5)):
+        self.dim = dim; self.char_ngrams = char_ngrams
+
+    def features(self, text: str) -> Iterator[str]:
+        norm = normalize_content(text)
+        if not norm:
+            return
+        words = norm.split()
+        yield from words
+        for a, b in zip(words, words[1:]):
+            yield f'{a} {b}'
+        padded = f' {norm} '
+        lo, hi = self.char_ngrams
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+    def transform(self, text: str) -> Optional[np.ndarray]:
+        """float32 unit vector, or None for text without features."""
+        hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in self.features(text)), dtype=np.uint32)
+        if not hashes.size:
+            return None
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        v = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        v = np.sign(v) * np.log1p(np.abs(v))
+        norm = np.linalg.norm(v)
+        return (v / norm).astype(np.float32) if norm else None
+
+
+_vectorizer = None
+
+
+def get_vectorizer() -> HashedNgramVectorizer:
+    global _vectorizer
+    if _vectorizer is None or _vectorizer.dim != settings.EMBEDDINGS['DIM']:
+        _vectorizer = HashedNgramVectorizer(settings.EMBEDDINGS['DIM'])
+    return _vectorizer
+
+
+def embed_text(text: str) -> Optional[np.ndarray]:
+    return get_vectorizer().transform(text or '')
+
+
+def to_bytes(vec: Optional[np.ndarray]) -> Optional[bytes]:
+    """Stored form: little-endian float16 (2 bytes per dimension)."""
+    return None if vec is None else vec.astype('<f2').tobytes()
+
+
+def from_bytes(data) -> Optional[np.ndarray]:
+    if not data:
+        return None
+    vec = np.frombuffer(bytes(data), dtype='<f2')
+    return vec if vec.size == settings.EMBEDDINGS['DIM'] else None  # dimension changed: recompute
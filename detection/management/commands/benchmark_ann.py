@@ -0,0 +1,70 @@
+import random, time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from detection.ann import IVFIndex, _embedding_rows
+from detection.embeddings import HashedNgramVectorizer
+from detection.benchmark import paraphrase as _perturb
+from content_protection_platform.common.stats import percentile as _pct
+from detection.models import ProtectedContent
+
+
+class Command(BaseCommand):
+    help = (
+        "Recall@k and query latency of the IVF text-embedding index versus exact brute force, "
+        "on a user's catalog (--user) or a synthetic corpus (--synthetic N)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Benchmark this user's text ProtectedContent")
+        parser.add_argument("--synthetic", type=int, default=20000, help="Synthetic corpus size (ignored with --user)")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--nprobe", default="1,2,4,8,16,32")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"]); k = opts["k"]
+        vectorizer = HashedNgramVectorizer(settings.EMBEDDINGS["DIM"])
+        started = time.perf_counter()
+        if opts["user"]:
+            qs = ProtectedContent.objects.filter(user_id=opts["user"], content_type="text")
+            ids, vecs = _embedding_rows(qs)
+            texts = dict(qs.filter(id__in=ids).values_list("id", "text_content"))
+            corpus = [texts[i] for i in ids]
+        else:
+            vocab = [f"w{i}" for i in range(5000)]
+            corpus = [" ".join(rng.choices(vocab, k=rng.randint(15, 60))) for _ in range(opts["synthetic"])]
+            ids = list(range(1, len(corpus) + 1)); vecs = [vectorizer.transform(t) for t in corpus]
+        if not ids:
+            raise CommandError("no vectors to index")
+        embed_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = IVFIndex(settings.EMBEDDINGS["DIM"], min_train=settings.EMBEDDINGS["MIN_TRAIN"])
+        index.add(ids, np.stack(vecs))
+        build_s = time.perf_counter() - started
+        lists = len(index.centroids) if index.centroids is not None else 1
+        self.stdout.write(f"{len(index)} vectors x {index.dim} dims (float16), {lists} lists; "
+                          f"embed {embed_s:.2f}s, build {build_s:.2f}s")
+
+        # each query is a paraphrase of a known source item
+        queries = []
+        for _ in range(opts["queries"]):
+            i = rng.randrange(len(corpus)); q = vectorizer.transform(_perturb(corpus[i], rng))
+            if q is not None: queries.append((ids[i], q))
+        truth, exact_ms, exact_src = [], [], 0
+        for src, q in queries:
+            t = time.perf_counter(); got = index.brute_force(q, k); exact_ms.append((time.perf_counter() - t) * 1000)
+            truth.append({pk for pk, _ in got}); exact_src += any(pk == src for pk, _ in got)
+        # recall@k: overlap with the exact top-k; source@k: the paraphrased item itself was returned
+        n = max(1, len(queries))
+        self.stdout.write(f"{'method':<14}{'recall@' + str(k):>10}{'source@' + str(k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        self.stdout.write(f"{'brute force':<14}{1.0:>10.3f}{exact_src / n:>10.3f}{_pct(exact_ms, .5):>10.3f}{_pct(exact_ms, .95):>10.3f}")
+        for nprobe in [int(p) for p in opts["nprobe"].split(",") if p.strip()]:
+            hits = 0; src_hits = 0; ms = []
+            for (src, q), want in zip(queries, truth):
+                t = time.perf_counter(); got = index.search(q, k, nprobe=nprobe); ms.append((time.perf_counter() - t) * 1000)
+                got_ids = {pk for pk, _ in got}; hits += len(want & got_ids); src_hits += src in got_ids
+            recall = hits / max(1, sum(len(w) for w in truth))
+            self.stdout.write(f"{'ivf nprobe=' + str(nprobe):<14}{recall:>10.3f}{src_hits / n:>10.3f}{_pct(ms, .5):>10.3f}{_pct(ms, .95):>10.3f}")
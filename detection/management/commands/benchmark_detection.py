@@ -0,0 +1,81 @@
+import json, random
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from detection.benchmark import (DATASETS, StubLLMServer, engine_model, judge_model, log_performance, run_containment, run_engine,
+                                 run_llm_judge, run_semantic, run_shard, stub_client)
+from detection.models import AIModel
+from detection.shards import FORMAT as SHARD_FORMAT
+from detection.services import ContentDetectionManager, initialize_ai_models
+from content_protection_platform.common.llm import OpenRouterClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Accuracy, latency and throughput of each fingerprint engine, the shard, containment and semantic "
+        "matchers (and the LLM judge, against a local stub unless --llm-url is given) on synthetic catalogs "
+        "with perturbed copies; results are written to ModelPerformanceLog for the default AIModel of each "
+        "type, or for a per-matcher AIModel row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--types", default="text,image,video")
+        parser.add_argument("--catalog", type=int, default=200, help="Protected originals per content type")
+        parser.add_argument("--threshold", type=float, help="Match threshold (default: AI_MODEL_SETTINGS SIMILARITY_THRESHOLD)")
+        parser.add_argument("--llm-pairs", type=int, default=100, help="Judge calls on text pairs (0 = skip the judge)")
+        parser.add_argument("--llm-url", help="Real OpenAI-compatible endpoint instead of the local stub (uses OPENROUTER settings)")
+        parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated stub latency")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--no-log", action="store_true", help="Print results without writing ModelPerformanceLog rows")
+
+    def _report(self, label, r):
+        self.stdout.write(f"{label:<24}{r['items']:>7}{r['accuracy']:>9.3f}{r['precision']:>9.3f}{r['recall']:>9.3f}{r['f1']:>9.3f}"
+                          f"{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}{r['throughput_per_s']:>10.0f}  {json.dumps(r['by_variant'])}")
+
+    def _matcher(self, opts, notes, label, result, model_spec):
+        self._report(label, result)
+        if not opts["no_log"]:
+            log_performance(engine_model(*model_spec), result, {**notes, "engine": model_spec[0]})
+
+    def handle(self, *args, **opts):
+        types = [t.strip() for t in opts["types"].split(",") if t.strip()]
+        unknown = set(types) - set(DATASETS)
+        if unknown:
+            raise CommandError(f"unknown content types: {', '.join(sorted(unknown))}")
+        threshold = opts["threshold"] if opts["threshold"] is not None else settings.AI_MODEL_SETTINGS["SIMILARITY_THRESHOLD"]
+        # the engines draw non-matching similarities at random: seed them too, so runs repeat exactly
+        random.seed(opts["seed"])
+        initialize_ai_models()
+        manager = ContentDetectionManager(user=None)
+        notes = {"seed": opts["seed"], "threshold": threshold, "catalog": opts["catalog"], "harness": "benchmark_detection"}
+        self.stdout.write(f"{'engine':<24}{'items':>7}{'acc':>9}{'prec':>9}{'recall':>9}{'f1':>9}{'p50 ms':>9}{'p99 ms':>9}{'items/s':>10}  hit rate by variant")
+        datasets = {}
+        for t in types:
+            datasets[t] = DATASETS[t](opts["catalog"], random.Random(f"{opts['seed']}:{t}"))
+            model = AIModel.objects.filter(model_type=t, is_active=True, is_default=True).first()
+            result = run_engine(manager._get_ai_service(t), datasets[t], threshold)
+            self._report(f"{t} {model.version if model else '-'}", result)
+            if model and not opts["no_log"]:
+                log_performance(model, result, {**notes, "engine": type(manager._get_ai_service(t, None)).__name__})
+            self._matcher(opts, notes, f"{t} shard", run_shard(manager._get_ai_service(t), datasets[t]),
+                          ("Fingerprint Shard", t, f"format-{SHARD_FORMAT}", "Exact lookups in a memory-mapped fingerprint shard"))
+            if t == "text":
+                w, e = settings.WINNOWING, settings.EMBEDDINGS
+                self._matcher(opts, notes, "text containment", run_containment(datasets[t]),
+                              ("Winnowing Containment", t, f"k{w['K']}-w{w['WINDOW']}", "Excerpt matching on winnowed fingerprints"))
+                self._matcher(opts, notes, "text semantic", run_semantic(datasets[t]),
+                              ("Semantic IVF", t, f"dim{e['DIM']}", "Hashed n-gram embeddings in an IVF index"))
+
+        if opts["llm_pairs"] and "text" in datasets:
+            rng = random.Random(f"{opts['seed']}:judge")
+            if opts["llm_url"]:
+                client = OpenRouterClient(base_url=opts["llm_url"])
+                result = run_llm_judge(client, datasets["text"], opts["llm_pairs"], rng)
+            else:
+                with StubLLMServer(opts["llm_latency_ms"]) as url:
+                    client = stub_client(url)
+                    result = run_llm_judge(client, datasets["text"], opts["llm_pairs"], rng)
+            self._report(f"llm judge {client.model}"[:23], result)
+            if result["errors"]:
+                self.stderr.write(f"{result['errors']} judge calls failed (counted as 'no')")
+            if not opts["no_log"]:
+                log_performance(judge_model(client, stub=not opts["llm_url"]), result, {**notes, "engine": "llm_judge", "errors": result["errors"]})
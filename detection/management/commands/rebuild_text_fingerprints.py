@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from detection.containment import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-fingerprint text ProtectedContent into the winnowing index used for excerpt detection. "
+        "Assets whose fingerprints are unchanged are left alone; run after changing WINNOWING K/WINDOW."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="User id (repeatable)")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        report = rebuild_index(opts["users"], chunk_size=opts["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {report['assets']} assets: {report['fingerprints']} fingerprints rewritten, "
+            f"{report['removed']} stale rows removed ({time.perf_counter() - started:.2f}s)"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protectedcontent',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
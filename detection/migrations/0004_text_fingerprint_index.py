@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0003_protected_content_embedding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextFingerprintIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.BigIntegerField()),
+                ('position', models.IntegerField()),
+                ('protected_content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='winnow_fingerprints', to='detection.protectedcontent')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'text_fingerprint_index',
+                'indexes': [models.Index(fields=['user', 'hash'], name='text_fp_user_hash_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0004_text_fingerprint_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='catalog_version',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import migrations
+
+from detection.winnowing import fingerprint
+
+
+def backfill(apps, schema_editor):
+    # Text assets created before 0004 have no index rows, so excerpt detection would never
+    # match them. Same fingerprints as containment.index_protected_content (historical models).
+    ProtectedContent = apps.get_model('detection', 'ProtectedContent')
+    TextFingerprintIndex = apps.get_model('detection', 'TextFingerprintIndex')
+    k, window = settings.WINNOWING['K'], settings.WINNOWING['WINDOW']
+    indexed = TextFingerprintIndex.objects.values('protected_content_id')
+    assets = (ProtectedContent.objects.filter(content_type='text').exclude(id__in=indexed)
+              .only('id', 'user_id', 'text_content').order_by('id'))
+    for pc in assets.iterator(chunk_size=500):
+        TextFingerprintIndex.objects.bulk_create(
+            [TextFingerprintIndex(user_id=pc.user_id, protected_content_id=pc.id, hash=h, position=pos)
+             for h, pos in fingerprint(pc.text_content or '', k, window)],
+            batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0005_detectionjob_catalog_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
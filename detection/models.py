@@ -16,6 +16,8 @@ class ProtectedContent(models.Model):
     text_fingerprint = models.JSONField(default=dict)
     visual_fingerprint = models.JSONField(default=dict)
     audio_fingerprint = models.JSONField(default=dict)
+    # float16 text embedding (detection/embeddings.py), kept current on save
+    embedding = models.BinaryField(blank=True, null=True, editable=False)
     tags = models.JSONField(default=list)
     category = models.CharField(max_length=100, blank=True, null=True)
     copyright_info = models.TextField(blank=True, null=True)
@@ -25,6 +27,14 @@ class ProtectedContent(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     class Meta: db_table='protected_content'
 
+class TextFingerprintIndex(models.Model):
+    """Inverted index of winnowed k-gram hashes of text assets (detection/containment.py): hash -> asset, token position."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    protected_content = models.ForeignKey(ProtectedContent, on_delete=models.CASCADE, related_name='winnow_fingerprints')
+    hash = models.BigIntegerField()
+    position = models.IntegerField()
+    class Meta: db_table='text_fingerprint_index'; indexes=[models.Index(fields=['user', 'hash'], name='text_fp_user_hash_idx')]
+
 class DetectionJob(models.Model):
     STATUS=[('pending','Pending'),('processing','Processing'),('completed','Completed'),('failed','Failed')]
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='detection_jobs')
@@ -36,6 +46,9 @@ class DetectionJob(models.Model):
     completed_at = models.DateTimeField(blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     model_versions = models.JSONField(default=dict)
+    # the user's catalog version (detection/catalog.py) the job matched against; cluster
+    # members only reuse this job's matches while the catalog is unchanged
+    catalog_version = models.BigIntegerField(blank=True, null=True)
     processing_time = models.FloatField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
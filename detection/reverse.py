@@ -0,0 +1,175 @@
+import heapq, multiprocessing, time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from scanning.models import ScannedContent
+from .models import ProtectedContent, DetectionJob, ContentMatch
+from .catalog import FINGERPRINT_FIELDS, fingerprint_to_int
+from .services import TextDetectionService, ImageDetectionService, VideoDetectionService
+from .winnowing import align_segments
+
+# The ScannedContent column a protected asset of each type is fingerprinted against
+# (the same pairing run_detection uses in the scanned -> catalog direction).
+SOURCE_FIELDS = {'text': 'text_content', 'image': 'media_urls', 'video': 'content_url'}
+_SERVICES = {'text': TextDetectionService, 'image': ImageDetectionService, 'video': VideoDetectionService}
+BACKENDS = ('process', 'celery')  # local process pool, or a chord over detect-cpu workers
+
+
+def hamming_similarity(hashes: np.ndarray, target: int) -> np.ndarray:
+    """1 - (differing bits / 64) between each packed uint64 fingerprint and `target`."""
+    return 1.0 - np.bitwise_count(hashes ^ np.uint64(target)).astype(np.float32) / 64.0
+
+
+def partition_ranges(lo: int, hi: int, shards: int) -> List[Tuple[int, int]]:
+    """Split the id range [lo, hi] into `shards` contiguous half-open ranges."""
+    if hi < lo:
+        return []
+    step = max(1, -(-(hi - lo + 1) // shards))
+    return [(start, min(start + step, hi + 1)) for start in range(lo, hi + 1, step)]
+
+
+def scan_partition(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Score every ScannedContent row in [lo, hi) against one asset fingerprint.
+    Rows are streamed with iterator() and compared a chunk at a time in numpy;
+    only the best `top_k` hits at or above `threshold` are kept.
+    """
+    ctype = task['content_type']; field = SOURCE_FIELDS[ctype]; chunk = task['chunk_size']
+    svc = _SERVICES[ctype](None)  # model metadata isn't needed to fingerprint
+    target = task['target']; threshold = task['threshold']; top_k = task['top_k']
+    best: List[Tuple[float, int]] = []; items = 0
+    ids = array('Q'); hashes = array('Q')
+
+    def flush():
+        if not ids:
+            return
+        scores = hamming_similarity(np.frombuffer(hashes, dtype='<u8'), target)
+        for i in np.flatnonzero(scores >= threshold).tolist():
+            entry = (float(scores[i]), ids[i])
+            if len(best) < top_k: heapq.heappush(best, entry)
+            elif entry > best[0]: heapq.heapreplace(best, entry)
+        del ids[:]; del hashes[:]
+
+    started = time.perf_counter()
+    rows = ScannedContent.objects.filter(id__gte=task['lo'], id__lt=task['hi']).order_by('id').values_list('id', field)
+    for pk, source in rows.iterator(chunk_size=chunk):
+        items += 1
+        if isinstance(source, list):
+            source = source[0] if source else None
+        packed = fingerprint_to_int(svc.generate_fingerprint(source)) if source else 0
+        if not packed:
+            continue
+        ids.append(pk); hashes.append(packed)
+        if len(ids) >= chunk:
+            flush()
+    flush()
+    seconds = time.perf_counter() - started
+    return {
+        'shard': task['shard'], 'range': [task['lo'], task['hi']], 'items': items, 'seconds': round(seconds, 3),
+        'items_per_sec': round(items / seconds, 1) if seconds else None,
+        'top': sorted(best, reverse=True),
+    }
+
+
+def _init_partition_worker():
+    # forked children must not share the parent's database sockets
+    connections.close_all()
+
+
+def merge_top(results: Iterable[Dict[str, Any]], top_k: int) -> List[Tuple[float, int]]:
+    return heapq.nlargest(top_k, (tuple(t) for r in results for t in r['top']))
+
+
+def build_partition_tasks(asset: ProtectedContent, shards: int, top_k: int, threshold: float, chunk_size: int) -> List[Dict[str, Any]]:
+    target = fingerprint_to_int(getattr(asset, FINGERPRINT_FIELDS[asset.content_type]))
+    if not target:
+        return []
+    bounds = ScannedContent.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return []
+    return [{'shard': i, 'lo': lo, 'hi': hi, 'content_type': asset.content_type, 'target': target,
+             'threshold': threshold, 'top_k': top_k, 'chunk_size': chunk_size}
+            for i, (lo, hi) in enumerate(partition_ranges(bounds['lo'], bounds['hi'], shards))]
+
+
+def default_threshold(asset: ProtectedContent) -> float:
+    cfg = getattr(asset.user, 'configuration', None)
+    return getattr(cfg, 'similarity_threshold', None) or settings.AI_MODEL_SETTINGS['SIMILARITY_THRESHOLD']
+
+
+def record_reverse_matches(asset: ProtectedContent, hits: List[Tuple[float, int]], threshold: float) -> int:
+    """Store hits as completed DetectionJobs + ContentMatches (pairs already matched are left alone)."""
+    if not hits:
+        return 0
+    known = set(ContentMatch.objects.filter(protected_content=asset, scanned_content_id__in=[sid for _, sid in hits])
+                .values_list('scanned_content_id', flat=True))
+    hits = [(score, sid) for score, sid in hits if sid not in known]
+    if not hits:
+        return 0
+    segments = {}
+    if asset.content_type == 'text' and asset.text_content and settings.SEGMENT_ALIGNMENT['ENABLED']:
+        texts = ScannedContent.objects.filter(id__in=[sid for _, sid in hits]).exclude(text_content__isnull=True)
+        segments = {sid: align_segments(asset.text_content, text) for sid, text in texts.values_list('id', 'text_content')}
+    now = timezone.now()
+    jobs = DetectionJob.objects.bulk_create([
+        DetectionJob(user_id=asset.user_id, scanned_content_id=sid, status='completed', detection_types=[asset.content_type],
+                     similarity_threshold=threshold, started_at=now, completed_at=now)
+        for _, sid in hits
+    ])
+    ContentMatch.objects.bulk_create([
+        ContentMatch(detection_job=job, protected_content=asset, scanned_content_id=sid,
+                     match_type='exact' if score >= 0.9 else 'partial', similarity_score=score,
+                     confidence_level='high' if score >= 0.9 else 'medium', matched_segments=segments.get(sid, []),
+                     match_metadata={'reverse_scan': True})
+        for job, (score, sid) in zip(jobs, hits)
+    ], ignore_conflicts=True)
+    return len(hits)
+
+
+def summarize_reverse_scan(asset_id: int, results: List[Dict[str, Any]], top_k: int, threshold: float, seconds: float, record: bool = True) -> Dict[str, Any]:
+    hits = merge_top(results, top_k)
+    recorded = record_reverse_matches(ProtectedContent.objects.get(pk=asset_id), hits, threshold) if record else 0
+    items = sum(r['items'] for r in results)
+    return {
+        'status': 'success',
+        'protected_content_id': asset_id,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'items_per_sec': round(items / seconds, 1) if seconds else None,
+        'shards': [{k: v for k, v in r.items() if k != 'top'} for r in sorted(results, key=lambda r: r['shard'])],
+        'matches': [{'scanned_content_id': sid, 'similarity': round(score, 4)} for score, sid in hits],
+        'matches_recorded': recorded,
+    }
+
+
+def run_reverse_scan(asset: ProtectedContent, shards: Optional[int] = None, top_k: Optional[int] = None,
+                     threshold: Optional[float] = None, workers: Optional[int] = None, record: bool = True) -> Dict[str, Any]:
+    """
+    Check one protected asset against the whole historical ScannedContent corpus
+    (the reverse of run_detection), partitioned by id range over a process pool.
+    With the current hash fingerprints only identical items reach a useful threshold;
+    the Hamming scoring is ready for perceptual (similarity-preserving) hashes.
+    """
+    cfg = settings.REVERSE_SCAN
+    shards = shards or cfg['SHARDS']; top_k = top_k or cfg['TOP_K']
+    threshold = threshold if threshold is not None else default_threshold(asset)
+    workers = workers or min(shards, multiprocessing.cpu_count())
+    started = time.perf_counter()
+    tasks = build_partition_tasks(asset, shards, top_k, threshold, cfg['CHUNK_SIZE'])
+    results = None
+    # daemonic processes (e.g. prefork Celery children) may not fork: scan the partitions inline there
+    if workers > 1 and len(tasks) > 1 and not multiprocessing.current_process().daemon:
+        connections.close_all()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_partition_worker) as pool:
+                results = list(pool.map(scan_partition, tasks))
+        except (OSError, AssertionError):
+            results = None
+    if results is None:
+        results = [scan_partition(t) for t in tasks]
+    return summarize_reverse_scan(asset.pk, results, top_k, threshold, time.perf_counter() - started, record)
@@ -1,11 +1,21 @@
 from rest_framework import serializers
 from .models import ProtectedContent, DetectionJob, ContentMatch, AIModel, ModelPerformanceLog, FeedbackData
 class ProtectedContentSerializer(serializers.ModelSerializer):
-    class Meta: model=ProtectedContent; fields='__all__'
+    class Meta: model=ProtectedContent; exclude=['embedding']
 class DetectionJobSerializer(serializers.ModelSerializer):
     class Meta: model=DetectionJob; fields='__all__'
 class ContentMatchSerializer(serializers.ModelSerializer):
+    # number of reposts of the infringing text across channels/platforms (takedown priority)
+    cluster_size=serializers.IntegerField(source='scanned_content.cluster.member_count', read_only=True, default=None)
     class Meta: model=ContentMatch; fields='__all__'
+class ContentMatchDetailSerializer(ContentMatchSerializer):
+    # the overlapping passages with their text from both sides, for review and claim drafting
+    segments=serializers.SerializerMethodField()
+    protected_title=serializers.CharField(source='protected_content.title', read_only=True)
+    infringing_url=serializers.CharField(source='scanned_content.content_url', read_only=True)
+    def get_segments(self, obj):
+        from .winnowing import segment_excerpts
+        return segment_excerpts(obj)
 class AIModelSerializer(serializers.ModelSerializer):
     class Meta: model=AIModel; fields='__all__'
 class ModelPerformanceLogSerializer(serializers.ModelSerializer):
@@ -1,16 +1,27 @@
 # detection/services.py
 import hashlib
 import random
+import time
 from typing import Any, Dict
 
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from .models import ProtectedContent, DetectionJob, ContentMatch, AIModel
+from .catalog import catalog_version, get_catalog, get_model_info, fingerprint_to_int, int_to_fingerprint
+from .shards import get_shard, shard_candidates
+from .ann import semantic_matches
+from .winnowing import SegmentAligner
+from .containment import containment_matches
 from scanning.models import ScannedContent
 
 # FIX: use the project package prefix so Python can find it
 # was: from common.llm import OpenRouterClient, llm_json
 from content_protection_platform.common.llm import OpenRouterClient, llm_json
+from content_protection_platform.common.metrics import (
+    timer, DB_WRITE_SECONDS, DETECTION_JOB_SECONDS, FINGERPRINT_SECONDS, MATCHES_FOUND, STAGE_SECONDS,
+)
 
 from .prompt import (
     MATCH_DECISION_SYSTEM,
@@ -18,10 +29,14 @@ from .prompt import (
     MATCH_DECISION_SCHEMA,
 )
 
+_UNSET = object()
+
+
 class BaseAIModelService:
-    def __init__(self, model_type: str):
+    def __init__(self, model_type: str, model_info: Any = _UNSET):
+        # model_info ({"name", "version"} or None) can be handed in from a catalog snapshot
         self.model_type = model_type
-        self.model = self._load_model()
+        self.model = self._load_model() if model_info is _UNSET else model_info
 
     def _load_model(self):
         try:
@@ -42,8 +57,8 @@ class BaseAIModelService:
 
 
 class TextDetectionService(BaseAIModelService):
-    def __init__(self):
-        super().__init__("text")
+    def __init__(self, model_info: Any = _UNSET):
+        super().__init__("text", model_info)
 
     def generate_fingerprint(self, text: str):
         return (
@@ -59,8 +74,8 @@ class TextDetectionService(BaseAIModelService):
 
 
 class ImageDetectionService(BaseAIModelService):
-    def __init__(self):
-        super().__init__("image")
+    def __init__(self, model_info: Any = _UNSET):
+        super().__init__("image", model_info)
 
     def generate_fingerprint(self, image_url: str):
         return (
@@ -80,8 +95,8 @@ class ImageDetectionService(BaseAIModelService):
 
 
 class VideoDetectionService(BaseAIModelService):
-    def __init__(self):
-        super().__init__("video")
+    def __init__(self, model_info: Any = _UNSET):
+        super().__init__("video", model_info)
 
     def generate_fingerprint(self, video_url: str):
         return (
@@ -104,12 +119,13 @@ class ContentDetectionManager:
     def __init__(self, user):
         self.user = user
 
-    def _get_ai_service(self, t):
-        return {
+    def _get_ai_service(self, t, model_info: Any = _UNSET):
+        cls = {
             "text": TextDetectionService,
             "image": ImageDetectionService,
             "video": VideoDetectionService,
-        }.get(t, lambda: None)()
+        }.get(t)
+        return cls(model_info) if cls else None
 
     def _initialize_default_ai_models(self):
         for t in ["text", "image", "video"]:
@@ -124,71 +140,217 @@ class ContentDetectionManager:
                 },
             )
 
+    def llm_match_judgement(self, owner: str, candidate: str, platform: str = "demo", url: str = "") -> Dict[str, Any]:
+        client = OpenRouterClient()
+        user_msg = MATCH_DECISION_USER_TEMPLATE.format(
+            owner=(owner or "")[:4000], platform=platform, url=url, text=(candidate or "")[:4000]
+        )
+        return llm_json(client, MATCH_DECISION_SYSTEM, user_msg, MATCH_DECISION_SCHEMA)
+
+    def fan_out_cluster_matches(self, detection_job: DetectionJob, members=None) -> int:
+        """
+        Copy the matches found for a cluster's representative to the other members of the
+        cluster (or to the given members), so reposts are not fingerprinted/judged again.
+        Clusters span tenants but only the job owner's items get copies, and only text matches
+        are copied: members share the normalized text, not media or URLs. Segments are offsets into
+        the representative's raw text, so copies carry none and segment_excerpts aligns them on read.
+        """
+        scanned = detection_job.scanned_content
+        if not scanned.cluster_id:
+            return 0
+        owned = ScannedContent.objects.filter(scan_job__user_id=detection_job.user_id).exclude(pk=scanned.pk)
+        if members is None:
+            member_ids = list(owned.filter(cluster_id=scanned.cluster_id).values_list('pk', flat=True))
+        else:
+            wanted = [m.pk if isinstance(m, ScannedContent) else m for m in members]
+            member_ids = list(owned.filter(pk__in=wanted).values_list('pk', flat=True)) if wanted else []
+        source = list(detection_job.matches.filter(protected_content__content_type='text', scanned_content_id=scanned.pk))
+        if not source or not member_ids:
+            return 0
+        copies = [
+            ContentMatch(
+                detection_job=detection_job,
+                protected_content_id=m.protected_content_id,
+                scanned_content_id=sid,
+                match_type=m.match_type,
+                confidence_level=m.confidence_level,
+                similarity_score=m.similarity_score,
+                matched_segments=[],
+                match_metadata={**{k: v for k, v in m.match_metadata.items() if k != "segment_coverage"},
+                                "cluster_id": scanned.cluster_id, "fanned_out_from": scanned.pk},
+            )
+            for sid in member_ids
+            for m in source
+        ]
+        # unique (protected_content, scanned_content) makes repeated fan-outs idempotent
+        ContentMatch.objects.bulk_create(copies, batch_size=500, ignore_conflicts=True)
+        return len(copies)
+
+    def attach_segments(self, scanned: ScannedContent, matches) -> int:
+        """Fill matched_segments of text matches against `scanned` (one query for the protected texts)."""
+        matches = [m for m in matches if not m.matched_segments]
+        if not matches or not scanned.text_content or not settings.SEGMENT_ALIGNMENT["ENABLED"]:
+            return 0
+        texts = dict(ProtectedContent.objects.filter(id__in={m.protected_content_id for m in matches})
+                     .values_list("id", "text_content"))
+        aligner = SegmentAligner(scanned.text_content)
+        for m in matches:
+            m.matched_segments = aligner.align(texts.get(m.protected_content_id) or "")
+            if m.matched_segments:
+                m.match_metadata = {**m.match_metadata, "segment_coverage": aligner.coverage(m.matched_segments)}
+        updated = [m for m in matches if m.matched_segments]
+        ContentMatch.objects.bulk_update(updated, ["matched_segments", "match_metadata"])
+        return len(updated)
+
     def run_detection(self, detection_job: DetectionJob):
+        started = time.perf_counter()
         detection_job.status = "processing"
         detection_job.started_at = timezone.now()
         detection_job.save(update_fields=["status", "started_at"])
         try:
             scanned: ScannedContent = detection_job.scanned_content
-            protected_qs = ProtectedContent.objects.filter(
-                user=detection_job.user,
-                is_active=True,
-                monitoring_enabled=True,
-                content_type__in=(detection_job.detection_types or ["text", "image", "video"]),
-            )
+            detection_types = detection_job.detection_types or ["text", "image", "video"]
+            # read before the catalog is loaded: a change made meanwhile leaves the job looking stale, never fresh
+            detection_job.catalog_version = catalog_version(detection_job.user_id)
+            # large (enterprise) catalogs are compiled into a memory-mapped shard; everyone
+            # else gets a worker-local snapshot. Neither queries the catalog per job.
+            shard = get_shard(detection_job.user_id)
+            catalog = None if shard is not None else get_catalog(detection_job.user_id)
+            models = get_model_info() if catalog is None else catalog.models
+            detection_job.model_versions = {t: m["version"] for t, m in models.items() if m}
+
+            # the scanned item is fingerprinted once per content type, not once per protected item
+            services, scanned_fps = {}, {}
+            for t, source in (("text", scanned.text_content),
+                              ("image", scanned.media_urls[0] if scanned.media_urls else None),
+                              ("video", scanned.content_url)):
+                services[t] = self._get_ai_service(t, models.get(t))
+                scanned_fps[t] = None
+                if source:
+                    with timer(FINGERPRINT_SECONDS, t):
+                        scanned_fps[t] = services[t].generate_fingerprint(source)
+
+            if catalog is not None:
+                candidates = ((e.id, e.content_type, h) for e, h in catalog.iter_type(detection_types))
+            else:
+                candidates = shard_candidates(detection_job.user_id, shard, {
+                    t: fingerprint_to_int(fp) for t, fp in scanned_fps.items() if fp and t in detection_types
+                })
 
             matches = 0
             high = 0
-
-            for pc in protected_qs:
-                svc = self._get_ai_service(pc.content_type)
-                if not svc:
+            to_judge = []
+            text_matches = []
+            matched = set()
+            compare_started = time.perf_counter()
+
+            for pc_id, content_type, packed in candidates:
+                svc = services.get(content_type)
+                fp = scanned_fps.get(content_type)
+                if not svc or fp is None:
                     continue
-
-                sim = 0.0
-                if pc.content_type == "text" and scanned.text_content:
-                    sim = svc.compare_fingerprints(
-                        pc.text_fingerprint,
-                        svc.generate_fingerprint(scanned.text_content),
-                    )
-                elif pc.content_type == "image" and scanned.media_urls:
-                    sim = svc.compare_fingerprints(
-                        pc.visual_fingerprint,
-                        svc.generate_fingerprint(scanned.media_urls[0]),
-                    )
-                elif pc.content_type == "video" and scanned.content_url:
-                    sim = svc.compare_fingerprints(
-                        pc.audio_fingerprint,
-                        svc.generate_fingerprint(scanned.content_url),
-                    )
+                sim = svc.compare_fingerprints(int_to_fingerprint(packed), fp)
 
                 if sim >= detection_job.similarity_threshold:
+                    matched.add(pc_id)
                     matches += 1
                     mt = "exact" if sim >= 0.9 else "partial"
                     if sim >= 0.9:
                         high += 1
-                    ContentMatch.objects.create(
-                        detection_job=detection_job,
-                        protected_content=pc,
-                        scanned_content=scanned,
-                        match_type=mt,
-                        similarity_score=sim,
-                        confidence_level=("high" if sim >= 0.9 else "medium"),
-                    )
+                    with timer(DB_WRITE_SECONDS, "content_matches"):
+                        match = ContentMatch.objects.create(
+                            detection_job=detection_job,
+                            protected_content_id=pc_id,
+                            scanned_content=scanned,
+                            match_type=mt,
+                            similarity_score=sim,
+                            confidence_level=("high" if sim >= 0.9 else "medium"),
+                        )
+                    MATCHES_FOUND.labels(mt, "fingerprint").inc()
+                    if content_type == "text":
+                        text_matches.append(match)
+                    if mt == "partial" and content_type == "text" and settings.AI_MODEL_SETTINGS.get("LLM_JUDGE_ENABLED"):
+                        to_judge.append(match.id)
+            # includes the match inserts (also in cp_db_write_seconds)
+            STAGE_SECONDS.labels("compare").observe(time.perf_counter() - compare_started)
+
+            # copied excerpts: most of the scanned text's winnowed fingerprints occur in one (longer) asset
+            if "text" in detection_types and scanned.text_content and settings.WINNOWING["ENABLED"]:
+                with timer(STAGE_SECONDS, "containment_search"):
+                    contained = containment_matches(detection_job.user_id, scanned.text_content, exclude=matched)
+                for pc_id, containment, hits in contained:
+                    matched.add(pc_id)
+                    matches += 1
+                    confidence = "high" if containment >= 0.9 else "medium"
+                    if confidence == "high":
+                        high += 1
+                    with timer(DB_WRITE_SECONDS, "content_matches"):
+                        match = ContentMatch.objects.create(
+                            detection_job=detection_job,
+                            protected_content_id=pc_id,
+                            scanned_content=scanned,
+                            match_type="partial",
+                            similarity_score=containment,
+                            confidence_level=confidence,
+                            match_metadata={"method": "winnowing", "containment": containment, "fingerprint_hits": hits},
+                        )
+                    MATCHES_FOUND.labels("partial", "winnowing").inc()
+                    text_matches.append(match)
+                    if confidence != "high" and settings.AI_MODEL_SETTINGS.get("LLM_JUDGE_ENABLED"):
+                        to_judge.append(match.id)
+
+            # paraphrases defeat the hashes: nearest neighbours in embedding space become partial matches
+            if "text" in detection_types and scanned.text_content and settings.EMBEDDINGS["ENABLED"]:
+                with timer(STAGE_SECONDS, "semantic_search"):
+                    neighbours = semantic_matches(detection_job.user_id, scanned.text_content)
+                for pc_id, cos in neighbours:
+                    if pc_id in matched:
+                        continue
+                    matches += 1
+                    with timer(DB_WRITE_SECONDS, "content_matches"):
+                        match = ContentMatch.objects.create(
+                            detection_job=detection_job,
+                            protected_content_id=pc_id,
+                            scanned_content=scanned,
+                            match_type="partial",
+                            similarity_score=cos,
+                            confidence_level="medium",
+                            match_metadata={"method": "embedding", "semantic_similarity": round(cos, 4)},
+                        )
+                    MATCHES_FOUND.labels("partial", "embedding").inc()
+                    text_matches.append(match)
+                    if settings.AI_MODEL_SETTINGS.get("LLM_JUDGE_ENABLED"):
+                        to_judge.append(match.id)
+
+            if text_matches:
+                # before the fan-out, so cluster copies carry the segments too
+                with timer(STAGE_SECONDS, "align_segments"):
+                    self.attach_segments(scanned, text_matches)
 
             detection_job.status = "completed"
             detection_job.completed_at = timezone.now()
-            detection_job.save(update_fields=["status", "completed_at"])
+            detection_job.processing_time = time.perf_counter() - started
+            detection_job.save(update_fields=["status", "completed_at", "model_versions", "catalog_version", "processing_time"])
+            DETECTION_JOB_SECONDS.labels("completed").observe(detection_job.processing_time)
+            fanned_out = self.fan_out_cluster_matches(detection_job) if matches else 0
+            if to_judge:
+                # LLM calls are slow: judge on the llm-io queue instead of holding a detect-cpu worker
+                from .tasks import llm_judge_match_task
+                for match_id in to_judge:
+                    transaction.on_commit(lambda match_id=match_id: llm_judge_match_task.delay(match_id))
             return {
                 "status": "success",
                 "matches_found": matches,
                 "high_confidence_matches": high,
+                "cluster_matches_fanned_out": fanned_out,
             }
         except Exception as e:
             detection_job.status = "failed"
             detection_job.error_message = str(e)
             detection_job.completed_at = timezone.now()
-            detection_job.save(update_fields=["status", "error_message", "completed_at"])
+            detection_job.processing_time = time.perf_counter() - started
+            detection_job.save(update_fields=["status", "error_message", "completed_at", "processing_time"])
+            DETECTION_JOB_SECONDS.labels("failed").observe(detection_job.processing_time)
             return {"status": "error", "error": str(e)}
 
     def add_protected_content(
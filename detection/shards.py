@@ -0,0 +1,177 @@
+import os, struct, threading
+from array import array
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import ProtectedContent
+from .catalog import FINGERPRINT_FIELDS, fingerprint_to_int
+
+# Compiled, read-only fingerprint shard (one file per user, little-endian):
+#
+#   header (128 bytes): magic, format, count, built_at (unix us), then the offsets table,
+#                       one u64 file offset per section below
+#   ids            u64[count]  ProtectedContent ids, ascending
+#   types          u8[count]   TYPE_CODES of each row
+#   hashes         u64[count]  packed fingerprint of each row (0 = none)
+#   sorted_hashes  u64[count]  hashes, ascending (binary-searched)
+#   sorted_rows    u32[count]  row index of each sorted hash
+#
+# Sections are 8-byte aligned, so readers map the file once and take zero-copy views;
+# every worker on a host shares the same page cache.
+MAGIC = b'CPFSHRD1'
+FORMAT = 1
+_HEADER = struct.Struct('<8sIIQq5Q')
+HEADER_SIZE = 128
+SECTIONS = (('ids', '<u8'), ('types', 'u1'), ('hashes', '<u8'), ('sorted_hashes', '<u8'), ('sorted_rows', '<u4'))
+TYPE_CODES = {'text': 1, 'image': 2, 'video': 3}
+SHARD_SUFFIX = '.fps'
+
+
+def shard_root() -> Path:
+    return Path(settings.FINGERPRINT_SHARDS['ROOT'])
+
+
+def shard_path(user_id: int, root: Optional[Path] = None) -> Path:
+    return Path(root or shard_root()) / f'user_{user_id}{SHARD_SUFFIX}'
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def write_shard(path: Path, ids: np.ndarray, types: np.ndarray, hashes: np.ndarray, built_at: datetime) -> int:
+    """Write a shard next to `path` and atomically swap it in. Returns the file size."""
+    ids = np.ascontiguousarray(ids, dtype='<u8'); types = np.ascontiguousarray(types, dtype='u1')
+    hashes = np.ascontiguousarray(hashes, dtype='<u8')
+    order = np.argsort(hashes, kind='stable')
+    arrays = {'ids': ids, 'types': types, 'hashes': hashes,
+              'sorted_hashes': hashes[order], 'sorted_rows': order.astype('<u4')}
+    offsets = []; pos = HEADER_SIZE
+    for name, _ in SECTIONS:
+        offsets.append(pos); pos = _align(pos + arrays[name].nbytes)
+
+    path = Path(path); path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    built_us = int(built_at.timestamp() * 1_000_000)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT, 0, len(ids), built_us, *offsets).ljust(HEADER_SIZE, b'\0'))
+            for (name, _), off in zip(SECTIONS, offsets):
+                f.write(b'\0' * (off - f.tell()))
+                f.write(memoryview(arrays[name]).cast('B'))
+            f.write(b'\0' * (pos - f.tell()))
+            f.flush(); os.fsync(f.fileno())
+        # readers holding the old file keep their mapping of the old inode
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True); raise
+    return pos
+
+
+class FingerprintShard:
+    """Memory-mapped shard with zero-copy numpy views of each section."""
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        st = os.stat(self.path); self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self._mm = np.memmap(self.path, dtype='u1', mode='r')
+        magic, fmt, _, count, built_us, *offsets = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f'{self.path} is not a fingerprint shard (format {FORMAT})')
+        self.count = count
+        self.built_at = datetime.fromtimestamp(built_us / 1_000_000, tz=dt_timezone.utc)
+        for (name, dtype), off in zip(SECTIONS, offsets):
+            setattr(self, name, np.frombuffer(self._mm, dtype=dtype, count=count, offset=off))
+
+    def __len__(self): return self.count
+
+    def lookup(self, packed_hash: int, content_type: Optional[str] = None) -> np.ndarray:
+        """ProtectedContent ids whose fingerprint equals `packed_hash` (binary search, O(log n))."""
+        if not packed_hash or not self.count:
+            return np.empty(0, dtype='<u8')
+        h = np.uint64(packed_hash)
+        lo = np.searchsorted(self.sorted_hashes, h, side='left')
+        hi = np.searchsorted(self.sorted_hashes, h, side='right')
+        rows = self.sorted_rows[lo:hi]
+        if content_type is not None:
+            rows = rows[self.types[rows] == TYPE_CODES[content_type]]
+        return self.ids[rows]
+
+
+class _ShardRegistry:
+    """Per-process open shards; a changed inode/mtime/size (atomic swap) triggers a reopen."""
+    def __init__(self):
+        self.lock = threading.Lock(); self.shards: Dict[int, FingerprintShard] = {}
+
+    def get(self, user_id: int) -> Optional[FingerprintShard]:
+        path = shard_path(user_id)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.shards.pop(user_id, None)
+            return None
+        with self.lock:
+            shard = self.shards.get(user_id)
+            if shard is None or shard.stamp != (st.st_ino, st.st_mtime_ns, st.st_size):
+                shard = self.shards[user_id] = FingerprintShard(path)
+            return shard
+
+
+_registry = _ShardRegistry()
+
+
+def get_shard(user_id: int) -> Optional[FingerprintShard]:
+    return _registry.get(user_id)
+
+
+def build_user_shard(user_id: int, root: Optional[Path] = None, chunk_size: int = 20000) -> Tuple[Path, int, int]:
+    """Compile one user's monitored ProtectedContent into a shard. Returns (path, rows, bytes)."""
+    # taken before reading: rows changed while we read count as "changed since build" for readers
+    built_at = timezone.now()
+    ids = array('Q'); types = bytearray(); hashes = array('Q')
+    rows = ProtectedContent.objects.filter(user_id=user_id, is_active=True, monitoring_enabled=True).order_by('id') \
+        .values_list('id', 'content_type', *FINGERPRINT_FIELDS.values())
+    for pk, ctype, text_fp, visual_fp, audio_fp in rows.iterator(chunk_size=chunk_size):
+        fp = {'text': text_fp, 'image': visual_fp, 'video': audio_fp}.get(ctype)
+        ids.append(pk); types.append(TYPE_CODES.get(ctype, 0)); hashes.append(fingerprint_to_int(fp))
+    path = shard_path(user_id, root)
+    size = write_shard(path, np.frombuffer(ids, dtype='<u8'), np.frombuffer(bytes(types), dtype='u1'),
+                       np.frombuffer(hashes, dtype='<u8'), built_at)
+    return path, len(ids), size
+
+
+def build_fingerprint_shards(user_ids: Optional[Iterable[int]] = None, root: Optional[Path] = None, chunk_size: int = 20000) -> List[Dict]:
+    """Build shards for the given users, or for every user on a plan listed in FINGERPRINT_SHARDS['PLANS']."""
+    if user_ids is None:
+        from users.models import User
+        user_ids = User.objects.filter(subscription_plan__in=settings.FINGERPRINT_SHARDS['PLANS']).values_list('id', flat=True)
+    report = []
+    for uid in user_ids:
+        path, n, size = build_user_shard(uid, root, chunk_size)
+        report.append({'user_id': uid, 'path': str(path), 'rows': n, 'bytes': size})
+    return report
+
+
+def shard_candidates(user_id: int, shard: FingerprintShard, scanned_hashes: Dict[str, int]) -> List[Tuple[int, str, int]]:
+    """
+    (protected_content_id, content_type, packed_hash) to compare for one scanned item:
+    exact shard hits that are still unchanged and monitored, plus every row changed since
+    the shard was built (compared directly, so results never depend on shard freshness).
+    """
+    hits = {}
+    for t, h in scanned_hashes.items():
+        for pk in shard.lookup(h, t).tolist():
+            hits[pk] = (t, h)
+    base = ProtectedContent.objects.filter(user_id=user_id, is_active=True, monitoring_enabled=True)
+    out = []
+    if hits:
+        for pk, t in base.filter(id__in=list(hits), updated_at__lte=shard.built_at).values_list('id', 'content_type'):
+            out.append((pk, t, hits[pk][1]))
+    changed = base.filter(updated_at__gt=shard.built_at, content_type__in=list(scanned_hashes)) \
+        .values_list('id', 'content_type', *FINGERPRINT_FIELDS.values())
+    for pk, t, text_fp, visual_fp, audio_fp in changed.iterator():
+        out.append((pk, t, fingerprint_to_int({'text': text_fp, 'image': visual_fp, 'video': audio_fp}[t])))
+    return out
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import ProtectedContent, AIModel
+from .catalog import bump_catalog_version, bump_models_version
+from .embeddings import embed_text, to_bytes
+from .containment import index_protected_content
+
+# Bumped after commit so a worker can't rebuild from pre-commit rows under the new version.
+# QuerySet.update()/bulk_* bypass these signals: call bump_catalog_version() yourself there.
+
+
+@receiver(pre_save, sender=ProtectedContent)
+def embed_protected_content(sender, instance, update_fields=None, **kwargs):
+    # partial saves only persist the embedding when they list it (update_fields=[..., 'text_content', 'embedding'])
+    if update_fields is not None and 'embedding' not in update_fields:
+        return
+    instance.embedding = to_bytes(embed_text(instance.text_content)) if instance.content_type == 'text' else None
+
+
+@receiver(post_save, sender=ProtectedContent)
+def index_protected_content_fingerprints(sender, instance, update_fields=None, **kwargs):
+    # rows go away with the asset (CASCADE); they only need rewriting when the text may have changed
+    if not settings.WINNOWING['ENABLED'] or (update_fields is not None and not {'text_content', 'content_type'} & set(update_fields)):
+        return
+    transaction.on_commit(lambda: index_protected_content(instance))
+
+
+@receiver([post_save, post_delete], sender=ProtectedContent)
+def protected_content_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_catalog_version(user_id))
+
+
+@receiver([post_save, post_delete], sender=AIModel)
+def ai_model_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_models_version)
@@ -0,0 +1,55 @@
+from celery import shared_task, chord
+from django.conf import settings
+from .models import ContentMatch, ProtectedContent
+from .services import ContentDetectionManager
+import logging, time
+logger=logging.getLogger(__name__)
+
+@shared_task(bind=True, max_retries=3)
+def llm_judge_match_task(self, match_id):
+    """LLM judgement for a partial text match; the verdict is copied to every fanned-out cluster copy."""
+    try:
+        match=ContentMatch.objects.select_related('protected_content','scanned_content__platform','detection_job__user').get(id=match_id)
+        sc=match.scanned_content
+        judgement=ContentDetectionManager(match.detection_job.user).llm_match_judgement(
+            match.protected_content.text_content or '', sc.text_content, sc.platform.name, sc.content_url)
+    except ContentMatch.DoesNotExist:
+        return {'status':'missing'}
+    except Exception as exc:
+        logger.error(f"Error judging match {match_id}: {exc}"); raise self.retry(exc=exc, countdown=30)
+    copies=[match]
+    if sc.cluster_id:
+        copies+=list(ContentMatch.objects.filter(protected_content_id=match.protected_content_id, scanned_content__cluster_id=sc.cluster_id).exclude(pk=match.pk))
+    for m in copies: m.match_metadata={**m.match_metadata, 'llm_judgement':judgement}
+    ContentMatch.objects.bulk_update(copies, ['match_metadata'])
+    return {'status':'success','decision':judgement.get('decision'),'matches_updated':len(copies)}
+
+@shared_task(bind=True)
+def reverse_scan_task(self, protected_content_id, shards=None, top_k=None, backend=None):
+    """
+    Reverse detection of one protected asset against the scanned corpus. backend="process" scans the
+    id-range partitions in a local process pool; "celery" fans them out as a chord over detect-cpu workers.
+    """
+    from .reverse import run_reverse_scan, build_partition_tasks, default_threshold, summarize_reverse_scan
+    cfg=settings.REVERSE_SCAN; backend=backend or cfg['BACKEND']
+    try: asset=ProtectedContent.objects.select_related('user').get(id=protected_content_id)
+    except ProtectedContent.DoesNotExist: return {'status':'missing'}
+    if backend!='celery':
+        return run_reverse_scan(asset, shards=shards, top_k=top_k)
+    top_k=top_k or cfg['TOP_K']; threshold=default_threshold(asset)
+    parts=build_partition_tasks(asset, shards or cfg['SHARDS'], top_k, threshold, cfg['CHUNK_SIZE'])
+    if not parts: return summarize_reverse_scan(asset.id, [], top_k, threshold, 0.0)
+    chord(reverse_scan_partition_task.s(p) for p in parts)(merge_reverse_scan_task.s(asset.id, top_k, threshold, time.time()))
+    return {'status':'dispatched','protected_content_id':asset.id,'shards':len(parts)}
+
+@shared_task
+def reverse_scan_partition_task(partition):
+    from .reverse import scan_partition
+    return scan_partition(partition)
+
+@shared_task
+def merge_reverse_scan_task(results, protected_content_id, top_k, threshold, started_at):
+    from .reverse import summarize_reverse_scan
+    report=summarize_reverse_scan(protected_content_id, results, top_k, threshold, time.time()-started_at)
+    logger.info(f"Reverse scan of protected content {protected_content_id}: {report['items']} items, {report['items_per_sec']}/s, {report['matches_recorded']} new matches")
+    return report
@@ -0,0 +1,280 @@
+import io, tempfile, threading
+import numpy as np
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from detection.catalog import catalog_version, clear_local_catalogs, get_catalog
+from detection.containment import containment_matches
+from detection.embeddings import embed_text
+from detection import ann
+from detection.shards import build_user_shard, get_shard, shard_candidates
+from detection.models import ContentMatch, DetectionJob, ModelPerformanceLog, ProtectedContent
+from detection.services import ContentDetectionManager
+from detection.winnowing import align_segments, segment_excerpts, winnow
+from scanning.models import ContentCluster, Platform, ScanJob, ScannedContent
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        clear_local_catalogs(); self.addCleanup(clear_local_catalogs)
+        self.user = get_user_model().objects.create_user(username='erin', email='erin@example.com', password='pw')
+        ProtectedContent.objects.create(user=self.user, title='Course', content_type='text', text_content='lesson one', content_hash='x')
+        get_catalog(self.user)
+
+    def edit_elsewhere(self):
+        # a queryset update stands in for an edit whose version bump this process can't see
+        ProtectedContent.objects.filter(user=self.user).update(monitoring_enabled=False)
+
+    @override_settings(DETECTION_CATALOG={'MAX_USERS': 8, 'SNAPSHOTS': False})
+    def test_rebuilt_per_job_without_shared_cache(self):
+        self.edit_elsewhere()
+        self.assertEqual(len(get_catalog(self.user)), 0)
+
+    @override_settings(DETECTION_CATALOG={'MAX_USERS': 8, 'SNAPSHOTS': True})
+    def test_reused_while_version_unchanged(self):
+        first = get_catalog(self.user)
+        self.edit_elsewhere()
+        self.assertIs(get_catalog(self.user), first)
+
+    @override_settings(DETECTION_CATALOG={'MAX_USERS': 8, 'SNAPSHOTS': True})
+    def test_version_bump_is_stored_on_the_user_row(self):
+        first, before = get_catalog(self.user), catalog_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProtectedContent.objects.create(user=self.user, title='Book', content_type='text', text_content='chapter two', content_hash='y')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.catalog_version, before + 1)
+        self.assertIsNot(get_catalog(self.user), first)
+        self.assertEqual(len(get_catalog(self.user)), 2)
+
+
+class ReverseScanRequestTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='frank', email='frank@example.com', password='pw')
+        self.asset = ProtectedContent.objects.create(user=self.user, title='Course', content_type='text', text_content='lesson one', content_hash='x')
+        self.client = APIClient(); self.client.force_authenticate(self.user)
+        patcher = mock.patch('detection.tasks.reverse_scan_task.delay', return_value=mock.Mock(id='t1'))
+        self.delay = patcher.start(); self.addCleanup(patcher.stop)
+
+    def post(self, **data):
+        return self.client.post(f'/api/protected-content/{self.asset.pk}/reverse-scan/', data, format='json')
+
+    @override_settings(REVERSE_SCAN={**settings.REVERSE_SCAN, 'MAX_SHARDS': 16, 'MAX_TOP_K': 100})
+    def test_options_are_parsed_and_clamped(self):
+        self.assertEqual(self.post(shards='1000', top_k=0, backend='celery').status_code, 202)
+        self.delay.assert_called_once_with(self.asset.pk, 16, 1, 'celery')
+
+    def test_defaults_pass_through(self):
+        self.assertEqual(self.post().status_code, 202)
+        self.delay.assert_called_once_with(self.asset.pk, None, None, None)
+
+    def test_invalid_options_are_rejected(self):
+        for data in ({'shards': 'many'}, {'top_k': [1]}, {'top_k': True}, {'backend': 'thread'}):
+            self.assertEqual(self.post(**data).status_code, 400, data)
+        self.delay.assert_not_called()
+
+
+class ClusterFanOutTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(username='mia', email='mia@example.com', password='pw')
+        self.other = User.objects.create_user(username='ned', email='ned@example.com', password='pw')
+        platform = Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})[0]
+        cluster = ContentCluster.objects.create(normalized_hash='h')
+
+        def item(user, n, text):
+            job = ScanJob.objects.create(user=user, platform=platform, keywords=['x'])
+            return ScannedContent.objects.create(scan_job=job, platform=platform, platform_content_id=n, content_url=f'https://example.com/{n}',
+                                                 content_type='text', text_content=text, cluster=cluster)
+        self.rep = item(self.owner, 'rep', 'Copied lesson text, word for word.')
+        self.mine = item(self.owner, 'mine', 'copied   lesson text word for word')
+        self.theirs = item(self.other, 'theirs', 'copied lesson text word for word')
+        self.text = ProtectedContent.objects.create(user=self.owner, title='Lesson', content_type='text', text_content='Copied lesson text, word for word.', content_hash='t')
+        self.image = ProtectedContent.objects.create(user=self.owner, title='Cover', content_type='image', content_hash='i')
+        self.job = DetectionJob.objects.create(user=self.owner, scanned_content=self.rep, detection_types=['text', 'image'], status='completed')
+        for pc in (self.text, self.image):
+            ContentMatch.objects.create(detection_job=self.job, protected_content=pc, scanned_content=self.rep, match_type='exact',
+                                        similarity_score=1.0, confidence_level='high')
+
+    def test_only_the_owners_members_get_text_matches(self):
+        ContentDetectionManager(self.owner).fan_out_cluster_matches(self.job)
+        self.assertEqual(list(ContentMatch.objects.filter(scanned_content=self.mine).values_list('protected_content_id', flat=True)), [self.text.pk])
+        self.assertFalse(ContentMatch.objects.filter(scanned_content=self.theirs).exists())
+
+    def test_explicit_members_are_filtered_too(self):
+        ContentDetectionManager(self.owner).fan_out_cluster_matches(self.job, [self.mine, self.theirs])
+        self.assertEqual(ContentMatch.objects.filter(scanned_content__in=[self.mine, self.theirs]).count(), 1)
+
+    def test_copies_realign_segments_against_the_member_text(self):
+        passage = 'the quick brown fox jumps over the lazy dog while the farmer sleeps in the warm afternoon sun'
+        ProtectedContent.objects.filter(pk=self.text.pk).update(text_content=passage)
+        ScannedContent.objects.filter(pk=self.rep.pk).update(text_content=passage)
+        ScannedContent.objects.filter(pk=self.mine.pk).update(text_content='REPOST >>>   ' + passage.upper())
+        ContentMatch.objects.filter(protected_content=self.text).update(
+            matched_segments=[{'protected_start': 0, 'protected_end': len(passage), 'scanned_start': 0, 'scanned_end': len(passage)}],
+            match_metadata={'segment_coverage': 1.0})
+        ContentDetectionManager(self.owner).fan_out_cluster_matches(self.job)
+        copy = ContentMatch.objects.get(scanned_content=self.mine)
+        self.assertEqual(copy.matched_segments, [])
+        self.assertNotIn('segment_coverage', copy.match_metadata)
+        excerpts = segment_excerpts(copy)
+        self.assertTrue(excerpts)
+        self.assertTrue(excerpts[0]['scanned_excerpt'].startswith('THE QUICK'))
+
+
+def _filler(n, prefix):
+    return ' '.join(f'{prefix}{i}' for i in range(n))
+
+
+class WinnowingTests(SimpleTestCase):
+    def test_rightmost_minimum_of_each_window(self):
+        # windows [5,1,4] and [1,4,1] both hold the minimum 1: the second picks the later one
+        self.assertEqual(winnow([5, 1, 4, 1, 6, 7], 3), [(1, 1), (1, 3)])
+
+    def test_input_shorter_than_the_window(self):
+        self.assertEqual(winnow([4, 2, 9], 5), [(2, 1)])
+        self.assertEqual(winnow([3, 1, 1, 2], 4), [(1, 2)])
+        self.assertEqual(winnow([], 4), [])
+
+
+class SegmentAlignerTests(SimpleTestCase):
+    passage = 'the quick brown fox jumps over the lazy dog while the farmer sleeps'
+    other = 'a completely different sentence about rivers mountains and valleys far away'
+
+    def test_excerpts_of_a_long_text_map_back_to_both_sides(self):
+        protected = f"{_filler(200, 'w')} {self.passage}. {_filler(50, 'x')} {self.other} {_filler(30, 'y')}"
+        scanned = f"Look at this: {self.passage.upper()}!! and {self.other} end"
+        segments = align_segments(protected, scanned)
+        self.assertEqual([(protected[s['protected_start']:s['protected_end']], scanned[s['scanned_start']:s['scanned_end']].lower()) for s in segments],
+                         [(self.passage, self.passage), (self.other, self.other)])
+
+    def test_segments_never_share_scanned_tokens(self):
+        # the passage occurs twice in the protected text but only once in the scanned one
+        protected = f"{self.passage} {_filler(40, 'w')} {self.passage} {self.other}"
+        scanned = f"{self.passage} {self.other}"
+        segments = align_segments(protected, scanned)
+        spans = [(s['scanned_start'], s['scanned_end']) for s in segments]
+        self.assertTrue(all(a[1] <= b[0] for a, b in zip(spans, spans[1:])))
+        self.assertEqual(sum(s['tokens'] for s in segments), len(scanned.split()))
+
+
+class ContainmentMatchTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='ivy', email='ivy@example.com', password='pw')
+        self.book = ' '.join(f'{_filler(40, f"c{n}w")}.' for n in range(10))  # ten 40-word chapters
+        with self.captureOnCommitCallbacks(execute=True):
+            self.asset = ProtectedContent.objects.create(user=self.user, title='Book', content_type='text', text_content=self.book, content_hash='b')
+            self.other = ProtectedContent.objects.create(user=self.user, title='Notes', content_type='text', text_content=_filler(80, 'n'), content_hash='n')
+
+    def test_an_excerpt_of_a_long_asset_scores_about_one(self):
+        excerpt = 'Reposted: ' + ' '.join(self.book.split()[120:180])
+        (pc_id, containment, hits), = containment_matches(self.user.id, excerpt)
+        self.assertEqual(pc_id, self.asset.id)
+        self.assertGreaterEqual(containment, 0.9)
+
+    def test_exclude_and_min_hits(self):
+        excerpt = ' '.join(self.book.split()[120:180])
+        self.assertEqual(containment_matches(self.user.id, excerpt, exclude=[self.asset.id]), [])
+        with override_settings(WINNOWING={**settings.WINNOWING, 'MIN_HITS': 1000}):
+            self.assertEqual(containment_matches(self.user.id, excerpt), [])
+
+
+class FingerprintShardTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory(); self.addCleanup(root.cleanup)
+        patcher = override_settings(FINGERPRINT_SHARDS={**settings.FINGERPRINT_SHARDS, 'ROOT': root.name})
+        patcher.enable(); self.addCleanup(patcher.disable)
+        self.user = get_user_model().objects.create_user(username='kai', email='kai@example.com', password='pw')
+
+    def asset(self, ctype, fp, **kw):
+        field = {'text': 'text_fingerprint', 'image': 'visual_fingerprint', 'video': 'audio_fingerprint'}[ctype]
+        return ProtectedContent.objects.create(user=self.user, title=fp, content_type=ctype, content_hash=fp, **{field: {'hash': fp}}, **kw)
+
+    def test_lookup_by_hash_and_type(self):
+        text, image = self.asset('text', '00000000000000aa'), self.asset('image', '00000000000000aa')
+        self.asset('text', '00000000000000bb', monitoring_enabled=False)
+        _, rows, _ = build_user_shard(self.user.id)
+        shard = get_shard(self.user.id)
+        self.assertEqual((rows, len(shard)), (2, 2))
+        self.assertEqual(sorted(shard.lookup(0xaa).tolist()), [text.id, image.id])
+        self.assertEqual(shard.lookup(0xaa, 'image').tolist(), [image.id])
+        self.assertEqual(shard.lookup(0xbb).tolist(), [])
+
+    def test_rebuilt_shard_is_reopened_and_later_edits_are_compared_directly(self):
+        old = self.asset('text', '00000000000000aa')
+        build_user_shard(self.user.id); first = get_shard(self.user.id)
+        new = self.asset('text', '00000000000000cc')  # not in the shard yet
+        self.assertEqual(sorted(pk for pk, _, _ in shard_candidates(self.user.id, first, {'text': 0xaa})), [old.id, new.id])
+        build_user_shard(self.user.id)
+        self.assertIsNot(get_shard(self.user.id), first)
+        self.assertEqual(get_shard(self.user.id).lookup(0xcc).tolist(), [new.id])
+
+
+class UserIndexRegistryTests(SimpleTestCase):
+    def test_a_slow_sync_does_not_block_other_users(self):
+        registry = ann._IndexRegistry(); started, release = threading.Event(), threading.Event()
+
+        def sync(entry, user_id):
+            if user_id == 1:
+                started.set(); release.wait(5)
+        with mock.patch('detection.ann._sync', side_effect=sync), mock.patch('detection.ann.catalog_version', return_value=1):
+            slow = threading.Thread(target=registry.get, args=(1,)); slow.start()
+            self.assertTrue(started.wait(5))
+            try:
+                other = threading.Thread(target=registry.get, args=(2,)); other.start(); other.join(5)
+                self.assertFalse(other.is_alive())
+            finally:
+                release.set(); slow.join(5)
+
+
+class IVFIndexTests(SimpleTestCase):
+    def vectors(self, n, dim=16, seed=1):
+        x = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    def test_trained_search_agrees_with_brute_force_on_near_duplicates(self):
+        x = self.vectors(400); index = ann.IVFIndex(16, nprobe=4, min_train=100)
+        index.add(range(400), x)
+        self.assertIsNotNone(index.centroids)
+        for pk in (3, 150, 399):
+            self.assertEqual(index.search(x[pk], 1)[0][0], pk)
+            self.assertEqual(index.search(x[pk], 1)[0][0], index.brute_force(x[pk], 1)[0][0])
+
+    def test_add_replaces_and_remove_drops(self):
+        x = self.vectors(3); index = ann.IVFIndex(16)
+        index.add([1, 2, 3], x)
+        index.add([1], x[2:3])  # re-embedded: one entry per id
+        index.remove([3])
+        self.assertEqual(len(index), 2)
+        self.assertEqual({pk for pk, _ in index.search(x[2], 5)}, {1, 2})
+
+
+class SemanticMatchTests(TestCase):
+    def setUp(self):
+        ann._indexes.items.clear(); self.addCleanup(ann._indexes.items.clear)
+        self.user = get_user_model().objects.create_user(username='noa', email='noa@example.com', password='pw')
+        self.lesson = ProtectedContent.objects.create(user=self.user, title='Lesson', content_type='text', content_hash='l',
+                                                      text_content='Photosynthesis turns sunlight, water and carbon dioxide into glucose and oxygen inside chloroplasts.')
+        ProtectedContent.objects.create(user=self.user, title='Recipe', content_type='text', content_hash='r',
+                                        text_content='Whisk two eggs with flour and milk, then fry the pancakes in butter until golden.')
+
+    def test_a_light_rewording_finds_the_asset(self):
+        self.assertIsNotNone(embed_text(self.lesson.text_content))
+        matches = ann.semantic_matches(self.user.id, 'photosynthesis turns sunlight water and CO2 into glucose and oxygen in the chloroplasts')
+        self.assertEqual([pk for pk, _ in matches], [self.lesson.id])
+
+    def test_unmonitored_assets_leave_the_index(self):
+        ann.semantic_matches(self.user.id, 'warm up')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.monitoring_enabled = False; self.lesson.save()
+        self.assertEqual(ann.semantic_matches(self.user.id, self.lesson.text_content), [])
+
+
+class BenchmarkDetectionTests(TestCase):
+    def test_every_matcher_is_benchmarked_and_logged(self):
+        call_command('benchmark_detection', catalog=10, llm_pairs=0, stdout=io.StringIO())
+        logged = {(log.model.name, log.model.model_type) for log in ModelPerformanceLog.objects.select_related('model')}
+        self.assertTrue({('Winnowing Containment', 'text'), ('Semantic IVF', 'text'), ('Fingerprint Shard', 'text'),
+                         ('Fingerprint Shard', 'image'), ('Fingerprint Shard', 'video')} <= logged)
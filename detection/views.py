@@ -1,6 +1,9 @@
-from rest_framework import viewsets, permissions
+from django.conf import settings
+from django.db import transaction
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
 from .models import ProtectedContent, DetectionJob, ContentMatch, AIModel, FeedbackData
-from .serializers import ProtectedContentSerializer, DetectionJobSerializer, ContentMatchSerializer, AIModelSerializer, FeedbackDataSerializer
+from .serializers import ProtectedContentSerializer, DetectionJobSerializer, ContentMatchSerializer, ContentMatchDetailSerializer, AIModelSerializer, FeedbackDataSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -24,12 +27,40 @@ class BaseViewSet(viewsets.ModelViewSet):
 
 class ProtectedContentViewSet(BaseViewSet):
     queryset=ProtectedContent.objects.all(); serializer_class=ProtectedContentSerializer
+    def perform_create(self, serializer):
+        pc=serializer.save()
+        if settings.REVERSE_SCAN['ON_CREATE']:
+            # check the new asset against everything already scanned
+            from .tasks import reverse_scan_task
+            transaction.on_commit(lambda: reverse_scan_task.delay(pc.id))
+    @action(detail=True, methods=['post'], url_path='reverse-scan')
+    def reverse_scan(self, request, pk=None):
+        """Queue a reverse detection of this asset against the historical scanned corpus."""
+        from .tasks import reverse_scan_task
+        from .reverse import BACKENDS
+        pc=self.get_object(); cfg=settings.REVERSE_SCAN; opts={}
+        for name, limit in (('shards', cfg['MAX_SHARDS']), ('top_k', cfg['MAX_TOP_K'])):
+            value=request.data.get(name)
+            if value in (None, ''): opts[name]=None; continue
+            try:
+                if isinstance(value, bool): raise TypeError
+                opts[name]=min(max(int(value), 1), limit)
+            except (TypeError, ValueError): return Response({'error':f"{name} must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        backend=request.data.get('backend') or None
+        if backend is not None and backend not in BACKENDS: return Response({'error':f"backend must be one of {BACKENDS}"}, status=status.HTTP_400_BAD_REQUEST)
+        res=reverse_scan_task.delay(pc.id, opts['shards'], opts['top_k'], backend)
+        return Response({'task_id':res.id,'protected_content_id':pc.id}, status=status.HTTP_202_ACCEPTED)
 
 class DetectionJobViewSet(BaseViewSet):
     queryset=DetectionJob.objects.all(); serializer_class=DetectionJobSerializer
 
 class ContentMatchViewSet(BaseViewSet):
-    queryset=ContentMatch.objects.all(); serializer_class=ContentMatchSerializer
+    queryset=ContentMatch.objects.select_related('scanned_content__cluster'); serializer_class=ContentMatchSerializer
+    def get_queryset(self):
+        qs=super().get_queryset()
+        return qs.select_related('protected_content') if self.action=='retrieve' else qs
+    def get_serializer_class(self):
+        return ContentMatchDetailSerializer if self.action=='retrieve' else ContentMatchSerializer
 
 class AIModelViewSet(BaseViewSet):
     queryset=AIModel.objects.all(); serializer_class=AIModelSerializer
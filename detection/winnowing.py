@@ -0,0 +1,148 @@
+import re, unicodedata, zlib
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+
+# Matched-segment extraction: texts become word tokens (with character offsets into the
+# original), k-token shingles are hashed with a rolling hash, and winnowing keeps the
+# minimum hash of every window of `w` shingles. A winnowed shingle of the scanned text that
+# also occurs in the protected text seeds a match, which is extended token by token in both
+# directions. Any shared run of at least w + k - 1 tokens is guaranteed to produce a seed,
+# and the whole alignment is linear in the two texts (plus the length of the segments found).
+
+_TOKEN = re.compile(r'\w+')
+_BASE = 1_000_003
+_MOD = (1 << 61) - 1
+_MAX_OCCURRENCES = 16  # positions tried per seed hash; bounds the work on very repetitive text
+
+
+def tokenize(text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """Case/width-folded word tokens and their (start, end) character offsets in `text`."""
+    keys, spans = [], []
+    for m in _TOKEN.finditer(text or ''):
+        keys.append(unicodedata.normalize('NFKC', m.group()).casefold()); spans.append(m.span())
+    return keys, spans
+
+
+def token_hash(token: str) -> int:
+    # crc32 rather than hash(): stable across processes, so fingerprints can be stored
+    return zlib.crc32(token.encode('utf-8')) + 1
+
+
+def kgram_hashes(keys: Sequence[str], k: int) -> List[int]:
+    """Rolling polynomial hash of every k-token shingle (len(keys) - k + 1 values)."""
+    if len(keys) < k:
+        return []
+    hs = [token_hash(t) for t in keys]
+    top = pow(_BASE, k - 1, _MOD); h = 0
+    for x in hs[:k]:
+        h = (h * _BASE + x) % _MOD
+    out = [h]
+    for i in range(k, len(hs)):
+        h = ((h - hs[i - k] * top) * _BASE + hs[i]) % _MOD
+        out.append(h)
+    return out
+
+
+def winnow(hashes: Sequence[int], w: int) -> List[Tuple[int, int]]:
+    """(hash, shingle position) selected by winnowing: the rightmost minimum of each window, each kept once."""
+    if not hashes:
+        return []
+    if len(hashes) <= w:
+        i = min(range(len(hashes)), key=lambda j: (hashes[j], -j))
+        return [(hashes[i], i)]
+    window: deque = deque(); out = []; last = -1
+    for i, h in enumerate(hashes):
+        while window and hashes[window[-1]] >= h:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - w:
+            window.popleft()
+        if i >= w - 1 and window[0] != last:
+            last = window[0]; out.append((hashes[last], last))
+    return out
+
+
+def fingerprint(text: str, k: int, w: int) -> List[Tuple[int, int]]:
+    """Winnowed document fingerprint: (hash, token position) pairs."""
+    return winnow(kgram_hashes(tokenize(text)[0], k), w)
+
+
+class SegmentAligner:
+    """
+    Aligns one scanned text against any number of protected texts; the scanned side is
+    tokenized and winnowed once. `align()` returns segments as character offsets:
+        {'protected_start', 'protected_end', 'scanned_start', 'scanned_end', 'tokens'}
+    """
+    def __init__(self, scanned_text: str, k: Optional[int] = None, w: Optional[int] = None,
+                 min_tokens: Optional[int] = None, max_segments: Optional[int] = None):
+        cfg = settings.SEGMENT_ALIGNMENT
+        self.k = k or cfg['K']; self.w = w or cfg['WINDOW']
+        self.min_tokens = max(self.k, min_tokens or cfg['MIN_TOKENS']); self.max_segments = max_segments or cfg['MAX_SEGMENTS']
+        self.keys, self.spans = tokenize(scanned_text)
+        self.seeds = winnow(kgram_hashes(self.keys, self.k), self.w)
+
+    def align(self, protected_text: str) -> List[Dict[str, int]]:
+        if not self.seeds:
+            return []
+        pkeys, pspans = tokenize(protected_text)
+        index: Dict[int, List[int]] = {}
+        for i, h in enumerate(kgram_hashes(pkeys, self.k)):
+            pos = index.setdefault(h, [])
+            if len(pos) < _MAX_OCCURRENCES:
+                pos.append(i)
+        skeys = self.keys; k = self.k
+        reach: Dict[int, int] = {}  # diagonal (i - j) -> scanned token index already covered up to
+        found = []
+        for h, j in self.seeds:
+            for i in index.get(h, ()):
+                if reach.get(i - j, -1) > j or pkeys[i:i + k] != skeys[j:j + k]:
+                    continue  # inside a segment already extended, or a hash collision
+                i0, j0 = i, j
+                while i0 and j0 and pkeys[i0 - 1] == skeys[j0 - 1]:
+                    i0 -= 1; j0 -= 1
+                i1, j1 = i + k, j + k
+                while i1 < len(pkeys) and j1 < len(skeys) and pkeys[i1] == skeys[j1]:
+                    i1 += 1; j1 += 1
+                reach[i - j] = j1
+                if j1 - j0 >= self.min_tokens:
+                    found.append((j1 - j0, i0, i1, j0, j1))
+        # longest first, no two segments claiming the same scanned tokens
+        taken: List[Tuple[int, int]] = []; segments = []
+        for n, i0, i1, j0, j1 in sorted(found, key=lambda s: (-s[0], s[3])):
+            if any(j0 < b and a < j1 for a, b in taken):
+                continue
+            taken.append((j0, j1))
+            segments.append({'protected_start': pspans[i0][0], 'protected_end': pspans[i1 - 1][1],
+                             'scanned_start': self.spans[j0][0], 'scanned_end': self.spans[j1 - 1][1], 'tokens': n})
+            if len(segments) >= self.max_segments:
+                break
+        return sorted(segments, key=lambda s: s['scanned_start'])
+
+    def coverage(self, segments: List[Dict[str, int]]) -> float:
+        """Share of the scanned text's tokens covered by `segments`."""
+        return round(sum(s['tokens'] for s in segments) / len(self.keys), 4) if self.keys else 0.0
+
+
+def align_segments(protected_text: str, scanned_text: str, **kw) -> List[Dict[str, int]]:
+    return SegmentAligner(scanned_text, **kw).align(protected_text)
+
+
+def _clip(text: str, start: int, end: int, limit: int) -> str:
+    s = ' '.join(text[start:end].split())  # display only: line breaks would split a quoted passage
+    return s if len(s) <= limit else f"{s[:limit].rstrip()}…"
+
+
+def segment_excerpts(match, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    A ContentMatch's segments with the passage text from both sides (for review and notices).
+    Matches stored before segments were extracted are aligned on the fly, not saved.
+    """
+    pc, sc = match.protected_content, match.scanned_content
+    ptext, stext = pc.text_content or '', sc.text_content or ''
+    segments = match.matched_segments
+    if not segments and ptext and stext and pc.content_type == 'text':
+        segments = align_segments(ptext, stext)
+    limit = limit or settings.SEGMENT_ALIGNMENT['EXCERPT_CHARS']
+    return [{**s, 'protected_excerpt': _clip(ptext, s['protected_start'], s['protected_end'], limit),
+             'scanned_excerpt': _clip(stext, s['scanned_start'], s['scanned_end'], limit)} for s in segments]
@@ -0,0 +1,196 @@
+import hashlib, ipaddress, os, socket, tempfile
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlparse
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import EvidenceChain, EvidenceLog
+
+GENESIS_HASH = '0' * 64
+
+
+class UnsafeURLError(ValueError):
+    """The URL points at a non-public address (or isn't http/https); never retried."""
+
+
+def _check_address(host: str, ip: str):
+    addr = ipaddress.ip_address(ip.split('%')[0])
+    if addr.version == 6 and addr.ipv4_mapped: addr = addr.ipv4_mapped
+    if not addr.is_global or addr.is_multicast:
+        raise UnsafeURLError(f"{host} resolves to non-public address {addr}")
+
+
+def check_public_url(url: str):
+    """Reject URLs whose host resolves to a private, loopback, link-local or otherwise non-global address."""
+    p = urlparse(url)
+    if p.scheme not in ('http', 'https') or not p.hostname:
+        raise UnsafeURLError(f"unsupported URL: {url}")
+    if p.hostname.lower() in settings.EVIDENCE_FETCH_ALLOWED_HOSTS: return
+    try:
+        infos = socket.getaddrinfo(p.hostname, p.port or (443 if p.scheme == 'https' else 80), proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise requests.ConnectionError(f"cannot resolve {p.hostname}: {e}")
+    for info in infos: _check_address(p.hostname, info[4][0])
+
+
+def _check_peer(url: str, resp: requests.Response):
+    # the connection may have resolved the name again (DNS rebinding): check where it actually went
+    host = urlparse(url).hostname or ''
+    if host.lower() in settings.EVIDENCE_FETCH_ALLOWED_HOSTS: return
+    for sock in (lambda: resp.raw._fp.fp.raw._sock, lambda: resp.raw.connection.sock):
+        try: peer = sock().getpeername()[0]
+        except (AttributeError, OSError, TypeError): continue  # http.client drops conn.sock for will-close responses
+        return _check_address(host, peer)
+
+
+class EvidenceBlobStore:
+    """
+    Content-addressed, write-once blob store under EVIDENCE_STORAGE_PATH.
+    Bodies are streamed to a temp file while hashing, then renamed into
+    blobs/<aa>/<bb>/<sha256>; identical content is stored once.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.EVIDENCE_STORAGE_PATH)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / 'blobs' / digest[:2] / digest[2:4] / digest
+
+    def put_stream(self, chunks: Iterable[bytes], max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        tmpdir = self.root / 'tmp'; tmpdir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmpdir, prefix='blob-')
+        h = hashlib.sha256(); size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if not chunk: continue
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise ValueError(f"evidence body exceeds {max_bytes} bytes")
+                    h.update(chunk); f.write(chunk)
+                f.flush(); os.fsync(f.fileno())
+            digest = h.hexdigest(); dest = self.blob_path(digest)
+            if dest.exists():
+                os.unlink(tmp)
+                return {'sha256': digest, 'size': size, 'path': str(dest), 'deduplicated': True}
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, dest)
+            return {'sha256': digest, 'size': size, 'path': str(dest), 'deduplicated': False}
+        except BaseException:
+            if os.path.exists(tmp): os.unlink(tmp)
+            raise
+
+    def put_file(self, file_path) -> Dict[str, Any]:
+        with open(file_path, 'rb') as f:
+            return self.put_stream(iter(lambda: f.read(self.CHUNK_SIZE), b''))
+
+    def put_url(self, url: str, session: Optional[requests.Session] = None, timeout: int = 20,
+                max_bytes: Optional[int] = None, gate: Optional[Callable[[str], ContextManager]] = None) -> Dict[str, Any]:
+        """`gate(url)` is entered around each hop's request (and the final download), e.g. a per-host limit."""
+        max_bytes = max_bytes if max_bytes is not None else getattr(settings, 'EVIDENCE_MAX_SNAPSHOT_BYTES', None)
+        # redirects are followed by hand so every hop goes through check_public_url (and its host's gate)
+        for _ in range(settings.EVIDENCE_MAX_REDIRECTS + 1):
+            check_public_url(url)
+            with ExitStack() as hop:
+                if gate: hop.enter_context(gate(url))
+                resp = (session or requests).get(url, stream=True, timeout=timeout, allow_redirects=False)
+                if not resp.is_redirect:
+                    hop = hop.pop_all(); break  # the final hop keeps its gate until the body is stored
+            url = urljoin(url, resp.headers['Location']); resp.close()
+        else:
+            raise UnsafeURLError(f"more than {settings.EVIDENCE_MAX_REDIRECTS} redirects")
+        with hop, resp:
+            _check_peer(url, resp)
+            resp.raise_for_status()
+            blob = self.put_stream(resp.iter_content(self.CHUNK_SIZE), max_bytes=max_bytes)
+            blob.update({'status_code': resp.status_code, 'final_url': resp.url,
+                         'content_type': resp.headers.get('Content-Type', '')})
+        return blob
+
+    def verify_blob(self, digest: str) -> bool:
+        path = self.blob_path(digest)
+        if not path.exists(): return False
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''): h.update(chunk)
+        return h.hexdigest() == digest
+
+
+# -------- hash chain ----------------------------------------------------------
+def chain_entry_hash(prev_hash: str, sequence: int, evidence: EvidenceLog) -> str:
+    parts = [prev_hash, str(sequence), evidence.evidence_type or '', evidence.content_sha256 or '',
+             evidence.url_snapshot or '', str(evidence.file_path or '')]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _store_upload(evidence: EvidenceLog, store: EvidenceBlobStore):
+    # an uploaded (uncommitted) file would be renamed into MEDIA_ROOT by FileField.pre_save after
+    # the chain hash was taken; it goes to the blob store instead and is chained by its digest
+    upload = evidence.file_path
+    if not upload or upload._committed: return
+    blob = store.put_stream(upload.chunks(store.CHUNK_SIZE))
+    evidence.file_path = None; evidence.content_sha256 = blob['sha256']; evidence.content_size = blob['size']
+    evidence.metadata = {**(evidence.metadata or {}), 'source': 'uploaded', 'original_name': os.path.basename(upload.name),
+                         'content_hash': blob['sha256'], 'blob_path': blob['path']}
+
+
+def append_evidence(user, entries: List[EvidenceLog], store: Optional[EvidenceBlobStore] = None) -> List[EvidenceLog]:
+    """Link unsaved EvidenceLog rows onto the user's chain and insert them in one statement."""
+    if not entries: return entries
+    store = store or EvidenceBlobStore()
+    for e in entries: _store_upload(e, store)
+    with transaction.atomic():
+        EvidenceChain.objects.get_or_create(user=user)
+        chain = EvidenceChain.objects.select_for_update().get(user=user)
+        prev, seq = chain.head_hash, chain.length
+        for e in entries:
+            seq += 1
+            e.user = user; e.chain_sequence = seq; e.prev_hash = prev
+            e.chain_hash = prev = chain_entry_hash(prev, seq, e)
+        EvidenceLog.objects.bulk_create(entries)
+        chain.length = seq; chain.head_hash = prev
+        chain.save(update_fields=['length', 'head_hash', 'updated_at'])
+    return entries
+
+
+def verify_evidence_chain(user, full: bool = False, check_blobs: bool = False,
+                          store: Optional[EvidenceBlobStore] = None) -> Dict[str, Any]:
+    """
+    Re-derive chain hashes for entries added since the last verified checkpoint
+    (or from genesis with full=True) and advance the checkpoint on success.
+    Entries logged before the chain existed (migration 0003) have no sequence: they are
+    counted as 'pre_chain' in the result and are not covered by the verification.
+    """
+    res = _verify_chain(user, full, check_blobs, store)
+    res['pre_chain'] = EvidenceLog.objects.filter(user=user, chain_sequence__isnull=True).count()
+    return res
+
+
+def _verify_chain(user, full: bool, check_blobs: bool, store: Optional[EvidenceBlobStore]) -> Dict[str, Any]:
+    chain = EvidenceChain.objects.filter(user=user).first()
+    if chain is None:
+        return {'status': 'ok', 'verified': 0, 'length': 0}
+    store = store or EvidenceBlobStore()
+    seq, prev = (0, GENESIS_HASH) if full else (chain.verified_length, chain.verified_hash)
+    checked = 0
+    qs = EvidenceLog.objects.filter(user=user, chain_sequence__gt=seq, chain_sequence__lte=chain.length).order_by('chain_sequence')
+    for e in qs.iterator(chunk_size=1000):
+        seq += 1
+        problem = None
+        if e.chain_sequence != seq: problem = f'missing entry {seq}'
+        elif e.prev_hash != prev: problem = 'prev_hash mismatch'
+        elif chain_entry_hash(prev, seq, e) != e.chain_hash: problem = 'chain_hash mismatch'
+        elif check_blobs and e.content_sha256 and not store.verify_blob(e.content_sha256): problem = 'blob missing or altered'
+        if problem:
+            return {'status': 'broken', 'sequence': seq, 'evidence_id': e.id, 'reason': problem, 'verified': checked}
+        prev = e.chain_hash; checked += 1
+    if seq != chain.length or prev != chain.head_hash:
+        return {'status': 'broken', 'sequence': seq, 'reason': 'chain head does not match last entry', 'verified': checked}
+    if seq >= chain.verified_length:
+        EvidenceChain.objects.filter(pk=chain.pk).update(verified_length=seq, verified_hash=prev, verified_at=timezone.now())
+    return {'status': 'ok', 'verified': checked, 'length': seq}
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from legal.models import EvidenceChain
+from legal.evidence_store import verify_evidence_chain
+
+
+class Command(BaseCommand):
+    help = "Verify evidence hash chains incrementally (entries added since the last verified checkpoint)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", help="User id (repeatable); default: every chain")
+        parser.add_argument("--full", action="store_true", help="Re-verify from the start of each chain")
+        parser.add_argument("--check-blobs", action="store_true", help="Also re-hash the stored evidence blobs")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        user_ids = opts["user"] or list(EvidenceChain.objects.values_list("user_id", flat=True))
+        broken = 0
+        for user in User.objects.filter(id__in=user_ids):
+            res = verify_evidence_chain(user, full=opts["full"], check_blobs=opts["check_blobs"])
+            if res["status"] == "ok":
+                self.stdout.write(f"user {user.id}: ok ({res['verified']} new entries, length {res['length']})")
+            else:
+                broken += 1
+                self.stdout.write(self.style.ERROR(f"user {user.id}: BROKEN at sequence {res['sequence']}: {res['reason']}"))
+        if broken:
+            self.stderr.write(self.style.ERROR(f"{broken} chain(s) failed verification"))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS(f"{len(user_ids)} chain(s) verified"))
@@ -45,9 +45,24 @@ class EvidenceLog(models.Model):
     evidence_type=models.CharField(max_length=50); description=models.TextField(blank=True, null=True)
     file_path=models.FileField(upload_to='evidence/', blank=True, null=True); url_snapshot=models.URLField(blank=True, null=True)
     metadata=models.JSONField(default=dict); is_tamper_proof=models.BooleanField(default=True); created_at=models.DateTimeField(auto_now_add=True)
-    class Meta: db_table='evidence_logs'; ordering=['-created_at']
+    # SHA-256 of the captured body/file in the evidence blob store (legal/evidence_store.py)
+    content_sha256=models.CharField(max_length=64, blank=True, null=True, db_index=True); content_size=models.BigIntegerField(blank=True, null=True)
+    # per-user hash chain: chain_hash = sha256(prev_hash | sequence | type | content_sha256 | url | path)
+    chain_sequence=models.PositiveIntegerField(blank=True, null=True); prev_hash=models.CharField(max_length=64, blank=True, null=True); chain_hash=models.CharField(max_length=64, blank=True, null=True)
+    class Meta:
+        db_table='evidence_logs'; ordering=['-created_at']
+        constraints=[models.UniqueConstraint(fields=['user','chain_sequence'], name='uniq_evidence_chain_sequence')]
     def __str__(self): return f"Evidence {self.id} - {self.evidence_type}"
 
+class EvidenceChain(models.Model):
+    """Head and last verified checkpoint of a user's evidence hash chain."""
+    user=models.OneToOneField(User, on_delete=models.CASCADE, related_name='evidence_chain')
+    length=models.PositiveIntegerField(default=0); head_hash=models.CharField(max_length=64, default='0'*64)
+    verified_length=models.PositiveIntegerField(default=0); verified_hash=models.CharField(max_length=64, default='0'*64); verified_at=models.DateTimeField(blank=True, null=True)
+    updated_at=models.DateTimeField(auto_now=True)
+    class Meta: db_table='evidence_chains'
+    def __str__(self): return f"Evidence chain for {self.user.email} ({self.length} entries)"
+
 class LegalCompliance(models.Model):
     user=models.ForeignKey(User, on_delete=models.CASCADE, related_name='legal_compliance')
     jurisdiction=models.ForeignKey(Jurisdiction, on_delete=models.CASCADE, related_name='compliance_records')
@@ -15,7 +15,7 @@ class CourtOrderSerializer(serializers.ModelSerializer):
 
 class EvidenceLogSerializer(serializers.ModelSerializer):
     user_email=serializers.CharField(source='user.email', read_only=True)
-    class Meta: model=EvidenceLog; fields='__all__'; read_only_fields=['created_at']
+    class Meta: model=EvidenceLog; fields='__all__'; read_only_fields=['user','created_at','content_sha256','content_size','chain_sequence','prev_hash','chain_hash']
 
 class LegalComplianceSerializer(serializers.ModelSerializer):
     user_email=serializers.CharField(source='user.email', read_only=True)
@@ -1,30 +1,173 @@
-import os, hashlib
+import os, io, tarfile, tempfile, time, zipfile, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.template import Context, Engine
+from django.template.loader import get_template, render_to_string
 from django.utils import timezone
+from content_protection_platform.common.stats import percentile
 from .models import DMCAClaim, EvidenceLog
+from detection.winnowing import segment_excerpts
+from .evidence_store import EvidenceBlobStore, append_evidence, verify_evidence_chain
+
+DMCA_TEMPLATE = 'legal/dmca_notice_template.md'
 
 class LegalDocumentGenerator:
     def __init__(self, claim: DMCAClaim): self.claim=claim
     def generate_dmca_notice(self) -> str:
         context={'claim':self.claim, 'current_date': timezone.now().strftime('%Y-%m-%d'),
                  'protected_content': getattr(self.claim.content_match,'protected_content',None) if self.claim.content_match else None,
-                 'infringing_content': getattr(self.claim.content_match,'scanned_content',None) if self.claim.content_match else None}
+                 'infringing_content': getattr(self.claim.content_match,'scanned_content',None) if self.claim.content_match else None,
+                 'matched_segments': segment_excerpts(self.claim.content_match) if self.claim.content_match else []}
         md=render_to_string('legal/dmca_notice_template.md', context)
         dirp = settings.MEDIA_ROOT / 'legal_documents' / 'dmca'; os.makedirs(dirp, exist_ok=True)
         fname=f"dmca_notice_{self.claim.id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.md"; fpath=dirp / fname
         with open(fpath, 'w', encoding='utf-8') as f: f.write(md)
         return str(fpath)
 
+# -------- batch generation --------------------------------------------------
+# Worker processes get plain dicts (no ORM access) and compile the template once.
+_worker_template = None
+
+def _init_render_worker(source: str):
+    global _worker_template
+    _worker_template = Engine(autoescape=True).from_string(source)
+
+def _render_notice(item: Tuple[int, str, Dict[str, Any]]) -> Tuple[int, str, str, float]:
+    claim_id, platform, ctx = item
+    t0 = time.perf_counter()
+    text = _worker_template.render(Context(ctx))
+    return claim_id, platform, text, time.perf_counter() - t0
+
+def _claim_context(claim: DMCAClaim, current_date: str) -> Dict[str, Any]:
+    cm = claim.content_match
+    pc = cm.protected_content if cm else None
+    sc = cm.scanned_content if cm else None
+    return {
+        'current_date': current_date,
+        'claim': {'id': claim.id, 'title': claim.title, 'description': claim.description,
+                  'claimant_name': claim.claimant_name, 'claimant_email': claim.claimant_email,
+                  'claimant_company': claim.claimant_company, 'original_content_url': claim.original_content_url,
+                  'infringing_content_url': claim.infringing_content_url},
+        'protected_content': {'id': pc.id, 'title': pc.title} if pc else None,
+        'infringing_content': {'id': sc.id, 'title': sc.title, 'content_url': sc.content_url,
+                               'author': sc.author, 'platform': sc.platform.name} if sc else None,
+        'matched_segments': segment_excerpts(cm) if cm else [],
+    }
+
+class BatchDMCAGenerator:
+    """
+    Render many DMCA notices at once: claims are loaded with their match/content/platform in
+    one query, the template is compiled once per process, and output goes to one archive
+    (bundle='single') or one per platform ('platform'). run() renders in a local process pool
+    when the caller may fork (shell, web process); Celery prefork children can't, so the legal
+    task splits large batches into a chord of render chunks (load_items/render + finish).
+    """
+    FORMATS = ('zip', 'tar')
+    BUNDLES = ('single', 'platform')
+
+    def __init__(self, claims: Iterable[DMCAClaim], archive_format: str = 'zip', bundle: str = 'single',
+                 workers: Optional[int] = None, chunksize: int = 64):
+        if archive_format not in self.FORMATS: raise ValueError(f"archive_format must be one of {self.FORMATS}")
+        if bundle not in self.BUNDLES: raise ValueError(f"bundle must be one of {self.BUNDLES}")
+        if hasattr(claims, 'select_related'):
+            claims = claims.select_related('content_match__protected_content', 'content_match__scanned_content__platform')
+        self.claims = claims
+        self.archive_format = archive_format; self.bundle = bundle
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunksize = chunksize
+
+    def _render_all(self, items: List[Tuple[int, str, Dict[str, Any]]]) -> List[Tuple[int, str, str, float]]:
+        source = get_template(DMCA_TEMPLATE).template.source
+        # daemonic processes (e.g. some worker pools) may not fork children: render inline there
+        if self.workers > 1 and len(items) > self.chunksize and not multiprocessing.current_process().daemon:
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_render_worker, initargs=(source,)) as pool:
+                    return list(pool.map(_render_notice, items, chunksize=self.chunksize))
+            except (OSError, AssertionError):
+                pass
+        _init_render_worker(source)
+        return [_render_notice(item) for item in items]
+
+    def _write_archive(self, path, rendered: List[Tuple[int, str, str, float]]) -> str:
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        os.close(fd)
+        try:
+            if self.archive_format == 'zip':
+                with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                    for claim_id, platform, text, _ in rendered:
+                        zf.writestr(f"{platform}/dmca_notice_{claim_id}.md", text)
+            else:
+                with tarfile.open(tmp, 'w:gz') as tf:
+                    for claim_id, platform, text, _ in rendered:
+                        data = text.encode('utf-8')
+                        info = tarfile.TarInfo(f"{platform}/dmca_notice_{claim_id}.md"); info.size = len(data); info.mtime = int(time.time())
+                        tf.addfile(info, io.BytesIO(data))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp): os.unlink(tmp)
+            raise
+        return str(path)
+
+    def load_items(self) -> List[Tuple[int, str, Dict[str, Any]]]:
+        current_date = timezone.now().strftime('%Y-%m-%d')
+        items = []
+        for claim in self.claims:
+            ctx = _claim_context(claim, current_date)
+            platform = (ctx['infringing_content'] or {}).get('platform') or 'unknown'
+            items.append((claim.id, platform, ctx))
+        return items
+
+    def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        items = self.load_items()
+        load_time = time.perf_counter() - started
+        rendered = self._render_all(items)
+        render_time = time.perf_counter() - started - load_time
+        return self.finish(rendered, load_time, render_time, started)
+
+    def finish(self, rendered: List[Tuple[int, str, str, float]], load_time: float, render_time: float, started: float) -> Dict[str, Any]:
+        """Write the archives for `rendered` notices and summarize the run (`started` is a perf_counter value)."""
+        dirp = settings.MEDIA_ROOT / 'legal_documents' / 'dmca' / 'batches'; os.makedirs(dirp, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        ext = 'zip' if self.archive_format == 'zip' else 'tar.gz'
+        groups: Dict[str, list] = {}
+        if self.bundle == 'platform':
+            for r in rendered: groups.setdefault(r[1], []).append(r)
+        elif rendered:
+            groups['all'] = rendered
+        archives = {name: self._write_archive(dirp / f"dmca_batch_{stamp}_{name}.{ext}", rows) for name, rows in groups.items()}
+
+        timings = sorted(r[3] for r in rendered)
+        return {
+            'status': 'success',
+            'notices': len(rendered),
+            'archives': archives,
+            'workers': self.workers,
+            'load_seconds': round(load_time, 4),
+            'render_seconds': round(render_time, 4),
+            'total_seconds': round(time.perf_counter() - started, 4),
+            'per_notice_seconds': {str(r[0]): round(r[3], 6) for r in rendered},
+            'per_notice_p50': percentile(timings, 0.50),
+            'per_notice_p95': percentile(timings, 0.95),
+            'per_notice_max': timings[-1] if timings else 0.0,
+        }
+
 class EvidenceManager:
-    def __init__(self, user): self.user=user
+    def __init__(self, user, store: Optional[EvidenceBlobStore]=None): self.user=user; self.store=store or EvidenceBlobStore()
     def capture_web_snapshot(self, url: str, description: str=None, **refs):
-        content_hash=hashlib.sha256(url.encode('utf-8')).hexdigest()
-        evidence=EvidenceLog.objects.create(user=self.user, evidence_type='web_snapshot', description=description or f'Web snapshot of {url}',
-                                            url_snapshot=url, metadata={'content_hash':content_hash, 'original_url':url}, **refs)
-        return evidence
+        blob=self.store.put_url(url)
+        evidence=EvidenceLog(evidence_type='web_snapshot', description=description or f'Web snapshot of {url}', url_snapshot=url,
+                             content_sha256=blob['sha256'], content_size=blob['size'],
+                             metadata={'content_hash':blob['sha256'], 'original_url':url, 'final_url':blob['final_url'], 'status_code':blob['status_code'],
+                                       'content_type':blob['content_type'], 'blob_path':blob['path'], 'captured_at':timezone.now().isoformat()}, **refs)
+        return append_evidence(self.user, [evidence])[0]
     def log_file_evidence(self, file_path: str, description: str=None, **refs):
         if not os.path.exists(file_path): raise FileNotFoundError(file_path)
-        evidence=EvidenceLog.objects.create(user=self.user, evidence_type='file_upload', description=description or os.path.basename(file_path),
-                                            file_path=file_path, metadata={'source':'uploaded'}, **refs)
-        return evidence
+        blob=self.store.put_file(file_path)
+        evidence=EvidenceLog(evidence_type='file_upload', description=description or os.path.basename(file_path), file_path=file_path,
+                             content_sha256=blob['sha256'], content_size=blob['size'],
+                             metadata={'source':'uploaded', 'content_hash':blob['sha256'], 'blob_path':blob['path']}, **refs)
+        return append_evidence(self.user, [evidence])[0]
+    def verify_integrity(self, full: bool=False, check_blobs: bool=False):
+        return verify_evidence_chain(self.user, full=full, check_blobs=check_blobs, store=self.store)
@@ -0,0 +1,120 @@
+import threading, time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from django.utils import timezone
+from .models import EvidenceLog
+from .evidence_store import EvidenceBlobStore, append_evidence
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class _HostGate:
+    """At most `concurrency` requests in flight per host, and `min_interval` seconds between request starts."""
+    def __init__(self, concurrency: int, min_interval: float):
+        self.sem = threading.BoundedSemaphore(concurrency)
+        self.min_interval = min_interval
+        self.lock = threading.Lock(); self.next_start = 0.0
+
+    def __enter__(self):
+        self.sem.acquire()
+        with self.lock:
+            now = time.monotonic(); start = max(now, self.next_start)
+            self.next_start = start + self.min_interval
+        if start > now: time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc):
+        self.sem.release()
+
+
+class SnapshotCaptureService:
+    """
+    Capture many infringing URLs concurrently before they disappear.
+    Bodies are streamed straight into the evidence blob store; successful captures
+    are appended to the user's evidence chain in bulk at the end.
+
+    targets: [{"url": ..., "content_match_id": ..., "dmca_claim_id": ..., "description": ...}, ...]
+    """
+    def __init__(self, user, store: Optional[EvidenceBlobStore] = None, max_workers: int = 16, per_host: int = 2,
+                 host_interval: float = 0.5, retries: int = 3, backoff: float = 0.5, timeout: int = 20,
+                 max_retry_after: float = 30.0):
+        self.user = user; self.store = store or EvidenceBlobStore()
+        self.max_workers = max_workers; self.per_host = per_host; self.host_interval = host_interval
+        self.retries = retries; self.backoff = backoff; self.timeout = timeout; self.max_retry_after = max_retry_after
+        self._gates: Dict[str, _HostGate] = defaultdict(lambda: _HostGate(self.per_host, self.host_interval))
+        self._gates_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, 'session', None)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.per_host, pool_maxsize=self.per_host)
+            s.mount('http://', adapter); s.mount('https://', adapter)
+            self._local.session = s
+        return s
+
+    def _gate(self, url: str) -> _HostGate:
+        host = urlparse(url).netloc.lower()
+        with self._gates_lock:
+            return self._gates[host]
+
+    def _fetch(self, target: Dict[str, Any]) -> Dict[str, Any]:
+        url = target['url']; attempt = 0; started = time.perf_counter()
+        while True:
+            attempt += 1
+            try:
+                # gated per hop: a redirect to another host waits for that host's gate
+                blob = self.store.put_url(url, session=self._session(), timeout=self.timeout, gate=self._gate)
+                return {**target, 'ok': True, 'blob': blob, 'attempts': attempt, 'seconds': time.perf_counter() - started}
+            except requests.HTTPError as e:
+                code = e.response.status_code if e.response is not None else None
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                if code not in RETRYABLE_STATUS or attempt > self.retries:
+                    return {**target, 'ok': False, 'error': f'HTTP {code}', 'attempts': attempt}
+                # capped: a hostile host must not park a pool slot with a huge Retry-After
+                delay = min(float(retry_after), self.max_retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** (attempt - 1)
+            except (requests.RequestException, ValueError) as e:
+                if isinstance(e, ValueError) or attempt > self.retries:
+                    return {**target, 'ok': False, 'error': str(e), 'attempts': attempt}
+                delay = self.backoff * 2 ** (attempt - 1)
+            time.sleep(delay)
+
+    def _evidence_for(self, r: Dict[str, Any]) -> EvidenceLog:
+        blob = r['blob']
+        return EvidenceLog(evidence_type='web_snapshot', description=r.get('description') or f"Web snapshot of {r['url']}",
+                           url_snapshot=r['url'], content_sha256=blob['sha256'], content_size=blob['size'],
+                           content_match_id=r.get('content_match_id'), dmca_claim_id=r.get('dmca_claim_id'),
+                           metadata={'content_hash': blob['sha256'], 'original_url': r['url'], 'final_url': blob['final_url'],
+                                     'status_code': blob['status_code'], 'content_type': blob['content_type'],
+                                     'blob_path': blob['path'], 'attempts': r['attempts'], 'captured_at': r['captured_at']})
+
+    def capture(self, targets: List[Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.perf_counter(); results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._fetch, t) for t in targets if t.get('url')]
+            for fut in as_completed(futures):
+                r = fut.result()
+                if r['ok']: r['captured_at'] = timezone.now().isoformat()
+                results.append(r)
+        ok = [r for r in results if r['ok']]
+        entries = append_evidence(self.user, [self._evidence_for(r) for r in ok])
+        return {
+            'status': 'success',
+            'captured': len(ok),
+            'failed': [{'url': r['url'], 'error': r['error'], 'attempts': r['attempts']} for r in results if not r['ok']],
+            'evidence_ids': [e.id for e in entries],
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+
+def capture_match_snapshots(user, match_ids: List[int], **options) -> Dict[str, Any]:
+    from detection.models import ContentMatch
+    matches = ContentMatch.objects.filter(id__in=match_ids, detection_job__user=user).select_related('scanned_content')
+    targets = [{'url': m.scanned_content.content_url, 'content_match_id': m.id,
+                'description': f"Snapshot of match {m.id}: {m.scanned_content.content_url}"} for m in matches]
+    return SnapshotCaptureService(user, **options).capture(targets)
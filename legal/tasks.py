@@ -0,0 +1,60 @@
+from celery import shared_task, chord
+from django.conf import settings
+from .models import DMCAClaim
+from .services import BatchDMCAGenerator
+import logging, time
+logger=logging.getLogger(__name__)
+
+@shared_task(bind=True)
+def generate_dmca_batch_task(self, claim_ids, archive_format='zip', bundle='single', workers=None):
+    """
+    Batches up to DMCA_BATCH['CHUNK_SIZE'] claims render here; larger ones fan out as a chord of
+    render chunks over the legal workers (a prefork child can't start a process pool of its own).
+    """
+    try:
+        chunk=settings.DMCA_BATCH['CHUNK_SIZE']; claim_ids=sorted(claim_ids)
+        if len(claim_ids)<=chunk:
+            return BatchDMCAGenerator(DMCAClaim.objects.filter(id__in=claim_ids).order_by('id'), archive_format=archive_format, bundle=bundle, workers=workers).run()
+        chunks=[claim_ids[i:i+chunk] for i in range(0, len(claim_ids), chunk)]
+        chord(render_dmca_chunk_task.s(ids) for ids in chunks)(assemble_dmca_batch_task.s(archive_format, bundle, time.time()))
+        return {'status':'dispatched','claims':len(claim_ids),'chunks':len(chunks)}
+    except Exception as exc:
+        logger.error(f"Error generating DMCA batch ({len(claim_ids)} claims): {exc}"); raise
+
+@shared_task
+def render_dmca_chunk_task(claim_ids):
+    gen=BatchDMCAGenerator(DMCAClaim.objects.filter(id__in=claim_ids).order_by('id'), workers=1)
+    t0=time.perf_counter(); items=gen.load_items(); load=time.perf_counter()-t0
+    rendered=gen._render_all(items)
+    return {'rendered':rendered,'load_seconds':load,'render_seconds':time.perf_counter()-t0-load}
+
+@shared_task
+def assemble_dmca_batch_task(results, archive_format, bundle, started_at):
+    """Chord callback: archive every chunk's notices. load/render seconds are summed over the chunks."""
+    rendered=sorted((tuple(r) for res in results for r in res['rendered']), key=lambda r: r[0])
+    gen=BatchDMCAGenerator([], archive_format=archive_format, bundle=bundle, workers=len(results))
+    # finish() measures total time with perf_counter: shift the chord's wall-clock start onto it
+    started=time.perf_counter()-(time.time()-started_at)
+    return gen.finish(rendered, sum(r['load_seconds'] for r in results), sum(r['render_seconds'] for r in results), started)
+
+@shared_task
+def verify_evidence_chains():
+    """Incremental integrity check of every evidence chain (only entries added since the last run)."""
+    from .models import EvidenceChain
+    from .evidence_store import verify_evidence_chain
+    broken=[]
+    for chain in EvidenceChain.objects.select_related('user'):
+        res=verify_evidence_chain(chain.user)
+        if res['status']!='ok':
+            logger.error(f"Evidence chain for user {chain.user_id} broken: {res}"); broken.append(chain.user_id)
+    return {'status':'ok' if not broken else 'broken','broken_users':broken}
+
+@shared_task(bind=True, max_retries=1)
+def capture_match_snapshots_task(self, user_id, match_ids):
+    from django.contrib.auth import get_user_model
+    from .snapshots import capture_match_snapshots
+    try:
+        user=get_user_model().objects.get(id=user_id)
+        return capture_match_snapshots(user, match_ids)
+    except Exception as exc:
+        logger.error(f"Error capturing snapshots for {len(match_ids)} matches: {exc}"); raise self.retry(exc=exc, countdown=30)
@@ -0,0 +1,175 @@
+import hashlib, tempfile, threading, time, zipfile
+from pathlib import Path
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from legal.evidence_store import EvidenceBlobStore, UnsafeURLError, _check_peer, append_evidence, check_public_url, verify_evidence_chain
+from legal.models import DMCAClaim, EvidenceLog
+from legal.tasks import generate_dmca_batch_task
+from legal.snapshots import SnapshotCaptureService
+
+
+class EvidenceUploadChainTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory(); self.addCleanup(self.root.cleanup)
+        self.settings_override = override_settings(EVIDENCE_STORAGE_PATH=self.root.name, MEDIA_ROOT=self.root.name)
+        self.settings_override.enable(); self.addCleanup(self.settings_override.disable)
+        self.user = get_user_model().objects.create_user(username='ev', email='ev@example.com', password='pw')
+        self.client = APIClient(); self.client.force_authenticate(self.user)
+
+    def upload(self, body: bytes, name='proof.png'):
+        return self.client.post('/api/evidence-logs/', {'evidence_type': 'file_upload',
+                                                        'file_path': SimpleUploadedFile(name, body)}, format='multipart')
+
+    def test_uploaded_file_keeps_chain_verifiable(self):
+        for body in (b'first screenshot', b'second screenshot'):
+            self.assertEqual(self.upload(body).status_code, 201)
+        self.assertEqual(verify_evidence_chain(self.user, full=True, check_blobs=True), {'status': 'ok', 'verified': 2, 'length': 2, 'pre_chain': 0})
+
+    def test_upload_is_stored_content_addressed(self):
+        body = b'screenshot bytes'
+        self.upload(body)
+        e = EvidenceLog.objects.get(user=self.user)
+        digest = hashlib.sha256(body).hexdigest()
+        self.assertEqual((e.content_sha256, e.content_size), (digest, len(body)))
+        self.assertFalse(e.file_path)
+        self.assertEqual(e.metadata['original_name'], 'proof.png')
+        self.assertTrue(EvidenceBlobStore().verify_blob(digest))
+
+
+class EvidenceLogAPITests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='jo', email='jo@example.com', password='pw')
+        self.other = User.objects.create_user(username='kim', email='kim@example.com', password='pw')
+        self.client = APIClient(); self.client.force_authenticate(self.user)
+
+    def test_entries_go_on_the_callers_chain(self):
+        resp = self.client.post('/api/evidence-logs/', {'user': self.other.id, 'evidence_type': 'note', 'url_snapshot': 'https://example.com/a'}, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(EvidenceLog.objects.get().user, self.user)
+        self.assertEqual(verify_evidence_chain(self.other)['length'], 0)
+
+    def test_append_only_and_scoped(self):
+        mine = append_evidence(self.user, [EvidenceLog(evidence_type='note')])[0]
+        theirs = append_evidence(self.other, [EvidenceLog(evidence_type='note')])[0]
+        self.assertEqual([e['id'] for e in self.client.get('/api/evidence-logs/').json()['results']], [mine.id])
+        self.assertEqual(self.client.get(f'/api/evidence-logs/{theirs.id}/').status_code, 404)
+        self.assertEqual(self.client.patch(f'/api/evidence-logs/{mine.id}/', {'description': 'x'}, format='json').status_code, 405)
+        self.assertEqual(self.client.delete(f'/api/evidence-logs/{mine.id}/').status_code, 405)
+        self.assertEqual(verify_evidence_chain(self.user, full=True)['status'], 'ok')
+
+    def test_pre_chain_entries_are_reported(self):
+        EvidenceLog.objects.create(user=self.user, evidence_type='note')  # logged before the chain existed
+        append_evidence(self.user, [EvidenceLog(evidence_type='note')])
+        self.assertEqual(verify_evidence_chain(self.user, full=True), {'status': 'ok', 'verified': 1, 'length': 1, 'pre_chain': 1})
+
+
+class _SnapshotHandler(BaseHTTPRequestHandler):
+    hits = {}
+
+    def do_GET(self):
+        n = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path == '/flaky' and n == 1:
+            self.send_response(503); self.send_header('Retry-After', '3600'); self.end_headers(); return
+        if self.path == '/to-metadata':
+            self.send_response(302); self.send_header('Location', 'http://169.254.169.254/latest/meta-data/'); self.end_headers(); return
+        if self.path == '/to-other-host':
+            self.send_response(302); self.send_header('Location', f'http://localhost:{self.server.server_address[1]}/a'); self.end_headers(); return
+        body = f"page {self.path}".encode()
+        self.send_response(200); self.send_header('Content-Type', 'text/html'); self.send_header('Content-Length', str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SnapshotCaptureTests(TestCase):
+    """Captures against a local http.server; 127.0.0.1 is only reachable because it is allowlisted."""
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory(); self.addCleanup(self.root.cleanup)
+        _SnapshotHandler.hits = {}
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _SnapshotHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close); self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.user = get_user_model().objects.create_user(username='snap', email='snap@example.com', password='pw')
+
+    def capture(self, paths, **options):
+        service = SnapshotCaptureService(self.user, store=EvidenceBlobStore(self.root.name), backoff=0.01, **options)
+        return service.capture([{'url': f"{self.base}{p}"} for p in paths])
+
+    def test_captures_and_chains_pages(self):
+        with override_settings(EVIDENCE_FETCH_ALLOWED_HOSTS=['127.0.0.1']):
+            report = self.capture(['/a', '/b'])
+        self.assertEqual((report['captured'], report['failed']), (2, []))
+        self.assertEqual(verify_evidence_chain(self.user, full=True)['status'], 'ok')
+
+    def test_retry_after_is_capped(self):
+        started = time.monotonic()
+        with override_settings(EVIDENCE_FETCH_ALLOWED_HOSTS=['127.0.0.1']):
+            report = self.capture(['/flaky'], max_retry_after=0.05)
+        self.assertEqual(report['captured'], 1)
+        self.assertEqual(_SnapshotHandler.hits['/flaky'], 2)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_private_addresses_are_refused(self):
+        report = self.capture(['/a'])
+        self.assertEqual(report['captured'], 0)
+        self.assertIn('non-public address', report['failed'][0]['error'])
+        self.assertEqual(_SnapshotHandler.hits, {})  # refused before connecting
+
+    def test_redirect_to_private_address_is_refused(self):
+        with override_settings(EVIDENCE_FETCH_ALLOWED_HOSTS=['127.0.0.1']):
+            report = self.capture(['/to-metadata'])
+        self.assertEqual(report['captured'], 0)
+        self.assertIn('169.254.169.254', report['failed'][0]['error'])
+        self.assertEqual(report['failed'][0]['attempts'], 1)
+
+    def test_each_redirect_hop_is_gated_by_its_host(self):
+        service = SnapshotCaptureService(self.user, store=EvidenceBlobStore(self.root.name)); gate = service._gate; hosts = []
+        service._gate = lambda url: hosts.append(urlparse(url).hostname) or gate(url)
+        with override_settings(EVIDENCE_FETCH_ALLOWED_HOSTS=['127.0.0.1', 'localhost']):
+            report = service.capture([{'url': f"{self.base}/to-other-host"}])
+        self.assertEqual(report['captured'], 1)
+        self.assertEqual(hosts, ['127.0.0.1', 'localhost'])
+
+    def test_check_public_url(self):
+        for url in ('http://localhost/', 'http://10.1.2.3/', 'http://[::ffff:127.0.0.1]/', 'file:///etc/passwd', 'ftp://example.com/'):
+            with self.assertRaises(UnsafeURLError, msg=url):
+                check_public_url(url)
+        check_public_url('http://93.184.216.34/')
+
+    def test_connected_peer_is_checked(self):
+        # a public name that resolved to a private address at connect time (DNS rebinding)
+        with requests.get(f"{self.base}/a", stream=True) as resp:
+            with self.assertRaises(UnsafeURLError):
+                _check_peer('http://rebound.example.com/a', resp)
+
+
+class BatchDMCAChordTests(TestCase):
+    def setUp(self):
+        from content_protection_platform.celery import app
+        self.root = tempfile.TemporaryDirectory(); self.addCleanup(self.root.cleanup)
+        override = override_settings(MEDIA_ROOT=Path(self.root.name), DMCA_BATCH={'CHUNK_SIZE': 2})
+        override.enable(); self.addCleanup(override.disable)
+        eager = app.conf.task_always_eager; app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', eager)
+        user = get_user_model().objects.create_user(username='ida', email='ida@example.com', password='pw')
+        self.ids = [DMCAClaim.objects.create(user=user, title=f'Claim {i}', description='d', infringing_content_url=f'https://example.com/{i}',
+                                             claimant_name='Ida', claimant_email='ida@example.com').id for i in range(5)]
+
+    def test_large_batch_renders_as_chunks(self):
+        self.assertEqual(generate_dmca_batch_task.apply(args=(self.ids,)).get(), {'status': 'dispatched', 'claims': 5, 'chunks': 3})
+        archives = list(Path(self.root.name).glob('legal_documents/dmca/batches/*.zip'))
+        self.assertEqual(len(archives), 1)
+        with zipfile.ZipFile(archives[0]) as zf:
+            self.assertEqual(sorted(zf.namelist()), sorted(f'unknown/dmca_notice_{i}.md' for i in self.ids))
+
+    def test_small_batch_renders_inline(self):
+        res = generate_dmca_batch_task.apply(args=(self.ids[:2],)).get()
+        self.assertEqual((res['status'], res['notices']), ('success', 2))
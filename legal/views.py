@@ -1,10 +1,52 @@
-from rest_framework import viewsets, permissions
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from .models import Jurisdiction, DMCAClaim, CourtOrder, EvidenceLog, LegalCompliance
 from .serializers import JurisdictionSerializer, DMCAClaimSerializer, CourtOrderSerializer, EvidenceLogSerializer, LegalComplianceSerializer
 
 class BaseViewSet(viewsets.ModelViewSet): permission_classes=[permissions.IsAuthenticated]
 class JurisdictionViewSet(BaseViewSet): queryset=Jurisdiction.objects.all(); serializer_class=JurisdictionSerializer
-class DMCAClaimViewSet(BaseViewSet): queryset=DMCAClaim.objects.all(); serializer_class=DMCAClaimSerializer
+class DMCAClaimViewSet(BaseViewSet):
+    queryset=DMCAClaim.objects.all(); serializer_class=DMCAClaimSerializer
+    @action(detail=False, methods=['post'], url_path='generate-batch')
+    def generate_batch(self, request):
+        """Queue notice generation for claim_ids (default: all of the caller's draft claims)."""
+        from .services import BatchDMCAGenerator
+        from .tasks import generate_dmca_batch_task
+        archive_format=request.data.get('archive_format','zip'); bundle=request.data.get('bundle','single')
+        if archive_format not in BatchDMCAGenerator.FORMATS: return Response({'error':f"archive_format must be one of {BatchDMCAGenerator.FORMATS}"}, status=status.HTTP_400_BAD_REQUEST)
+        if bundle not in BatchDMCAGenerator.BUNDLES: return Response({'error':f"bundle must be one of {BatchDMCAGenerator.BUNDLES}"}, status=status.HTTP_400_BAD_REQUEST)
+        own=DMCAClaim.objects.filter(user=request.user)
+        requested=request.data.get('claim_ids')
+        if requested:
+            try:
+                if not isinstance(requested, list): raise TypeError
+                requested={int(i) for i in requested}
+            except (TypeError, ValueError): return Response({'error':'claim_ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+            ids=sorted(own.filter(id__in=requested).values_list('id', flat=True))
+            # unknown and other users' claims are reported the same way, so ids can't be probed
+            if len(ids)!=len(requested): return Response({'error':'unknown claim_ids','claim_ids':sorted(requested-set(ids))}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            ids=list(own.filter(status='draft').values_list('id', flat=True))
+        if not ids: return Response({'error':'no claims to generate'}, status=status.HTTP_400_BAD_REQUEST)
+        res=generate_dmca_batch_task.delay(ids, archive_format, bundle)
+        return Response({'task_id':res.id,'claims':len(ids)}, status=status.HTTP_202_ACCEPTED)
 class CourtOrderViewSet(BaseViewSet): queryset=CourtOrder.objects.all(); serializer_class=CourtOrderSerializer
-class EvidenceLogViewSet(BaseViewSet): queryset=EvidenceLog.objects.all(); serializer_class=EvidenceLogSerializer
+class EvidenceLogViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """The caller's evidence; append-only (no update/delete), since every entry is part of their hash chain."""
+    permission_classes=[permissions.IsAuthenticated]
+    queryset=EvidenceLog.objects.all(); serializer_class=EvidenceLogSerializer
+    def get_queryset(self): return super().get_queryset().filter(user=self.request.user)
+    def perform_create(self, serializer):
+        # entries created through the API are linked onto the caller's hash chain as well
+        from .evidence_store import append_evidence
+        serializer.instance=append_evidence(self.request.user, [EvidenceLog(**serializer.validated_data)])[0]
+    @action(detail=False, methods=['post'], url_path='capture-matches')
+    def capture_matches(self, request):
+        """Queue concurrent snapshot capture for the infringing URLs of match_ids."""
+        from .tasks import capture_match_snapshots_task
+        ids=request.data.get('match_ids') or []
+        if not ids: return Response({'error':'match_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        res=capture_match_snapshots_task.delay(request.user.id, ids)
+        return Response({'task_id':res.id,'matches':len(ids)}, status=status.HTTP_202_ACCEPTED)
 class LegalComplianceViewSet(BaseViewSet): queryset=LegalCompliance.objects.all(); serializer_class=LegalComplianceSerializer
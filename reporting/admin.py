@@ -0,0 +1,3 @@
+from django.contrib import admin
+from .models import MatchDailyRollup, ScanDailyRollup, TakedownStatusRollup, RollupWatermark
+admin.site.register(MatchDailyRollup); admin.site.register(ScanDailyRollup); admin.site.register(TakedownStatusRollup); admin.site.register(RollupWatermark)
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('scanning', '0006_scan_job_checkpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('last_time', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rollup_watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='MatchDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('confidence_level', models.CharField(max_length=20)),
+                ('match_count', models.PositiveIntegerField(default=0)),
+                ('platform', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='scanning.platform')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'rollup_matches_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScanDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('items_scanned', models.PositiveIntegerField(default=0)),
+                ('jobs_completed', models.PositiveIntegerField(default=0)),
+                ('platform', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='scanning.platform')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'rollup_scans_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='TakedownStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('claim_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='takedown_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'rollup_takedown_status',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='matchdailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'platform', 'confidence_level'), name='rollup_match_daily_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='scandailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'platform'), name='rollup_scan_daily_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='takedownstatusrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'status'), name='rollup_takedown_status_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TakedownRecount',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rollup_takedown_recounts',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0002_takedownrecount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyReportDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_report_deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'weekly_report_deliveries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyreportdelivery',
+            constraint=models.UniqueConstraint(fields=('user', 'week'), name='weekly_report_delivery_uniq'),
+        ),
+    ]
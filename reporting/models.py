@@ -0,0 +1,58 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+User = get_user_model()
+
+# Dashboard rollups, maintained incrementally by reporting.rollups.update_rollups()
+
+class MatchDailyRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='match_rollups')
+    day = models.DateField()
+    platform = models.ForeignKey('scanning.Platform', on_delete=models.CASCADE, related_name='+')
+    confidence_level = models.CharField(max_length=20)
+    match_count = models.PositiveIntegerField(default=0)
+    class Meta:
+        db_table='rollup_matches_daily'
+        constraints=[models.UniqueConstraint(fields=['user','day','platform','confidence_level'], name='rollup_match_daily_uniq')]
+
+class ScanDailyRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_rollups')
+    day = models.DateField()
+    platform = models.ForeignKey('scanning.Platform', on_delete=models.CASCADE, related_name='+')
+    items_scanned = models.PositiveIntegerField(default=0)
+    jobs_completed = models.PositiveIntegerField(default=0)
+    class Meta:
+        db_table='rollup_scans_daily'
+        constraints=[models.UniqueConstraint(fields=['user','day','platform'], name='rollup_scan_daily_uniq')]
+
+class TakedownStatusRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='takedown_rollups')
+    status = models.CharField(max_length=20)
+    claim_count = models.PositiveIntegerField(default=0)
+    class Meta:
+        db_table='rollup_takedown_status'
+        constraints=[models.UniqueConstraint(fields=['user','status'], name='rollup_takedown_status_uniq')]
+
+class TakedownRecount(models.Model):
+    """Users whose claims were deleted since the last takedown rollup (a deleted row has no updated_at to find it by)."""
+    # a plain id, not a FK: the marker is written while a user's claims are cascade-deleted with the user
+    user_id = models.BigIntegerField(primary_key=True)
+    marked_at = models.DateTimeField(auto_now=True)
+    class Meta: db_table='rollup_takedown_recounts'
+
+class WeeklyReportDelivery(models.Model):
+    """A weekly report that went out; a retried chunk skips the users already recorded for that week."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_report_deliveries')
+    week = models.DateField()  # Monday of the report's ISO week
+    sent_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        db_table='weekly_report_deliveries'
+        constraints=[models.UniqueConstraint(fields=['user','week'], name='weekly_report_delivery_uniq')]
+
+class RollupWatermark(models.Model):
+    """How far each rollup has consumed its source table (last id and/or timestamp)."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_time = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta: db_table='rollup_watermarks'
+    def __str__(self): return f"{self.name} @ {self.last_id or self.last_time}"
@@ -0,0 +1,163 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from scanning.models import ScanJob, ScannedContent
+from detection.models import ContentMatch
+from legal.models import DMCAClaim
+from .models import MatchDailyRollup, ScanDailyRollup, TakedownStatusRollup, TakedownRecount, RollupWatermark
+
+# Incremental rollups. Append-only sources (matches, scanned items) are consumed by id
+# high-water mark; rows younger than LAG_SECONDS are left for the next run so a transaction
+# that commits late with a lower id isn't skipped. Each rollup runs under a row lock on
+# its watermark, so concurrent runs serialize and every source row is counted once.
+
+
+def _locked_watermark(name: str) -> RollupWatermark:
+    RollupWatermark.objects.get_or_create(name=name)
+    return RollupWatermark.objects.select_for_update().get(name=name)
+
+
+def _day(dt):
+    return timezone.localtime(dt).date()
+
+
+def _consumable(rows: Iterable[Tuple], cutoff) -> list:
+    """Leading run of id-ordered rows created before `cutoff` (stop at the first newer one)."""
+    out = []
+    for row in rows:
+        if row[2] >= cutoff:
+            break
+        out.append(row)
+    return out
+
+
+def _add_counts(model, counts: Counter, key_fields: Tuple[str, ...], field: str):
+    """Add `counts` {key tuple: n} onto rollup rows (caller holds the watermark lock)."""
+    if not counts:
+        return
+    users = {k[0] for k in counts}; days = {k[1] for k in counts}
+    existing = {tuple(getattr(r, f if f not in ('user', 'platform') else f + '_id') for f in key_fields): r
+                for r in model.objects.filter(user_id__in=users, day__in=days)}
+    new, changed = [], []
+    for key, n in counts.items():
+        row = existing.get(key)
+        if row is None:
+            new.append(model(**{(f + '_id' if f in ('user', 'platform') else f): v for f, v in zip(key_fields, key)}, **{field: n}))
+        else:
+            setattr(row, field, getattr(row, field) + n); changed.append(row)
+    model.objects.bulk_create(new, batch_size=1000)
+    model.objects.bulk_update(changed, [field], batch_size=1000)
+
+
+def roll_up_matches(batch_size: int, cutoff) -> int:
+    with transaction.atomic():
+        wm = _locked_watermark('matches')
+        rows = _consumable(ContentMatch.objects.filter(id__gt=wm.last_id).order_by('id').values_list(
+            'id', 'detection_job__user_id', 'created_at', 'scanned_content__platform_id', 'confidence_level')[:batch_size], cutoff)
+        if not rows:
+            return 0
+        counts = Counter((uid, _day(created), pid, level) for _, uid, created, pid, level in rows)
+        _add_counts(MatchDailyRollup, counts, ('user', 'day', 'platform', 'confidence_level'), 'match_count')
+        wm.last_id = rows[-1][0]; wm.save(update_fields=['last_id', 'updated_at'])
+        return len(rows)
+
+
+def roll_up_scanned_items(batch_size: int, cutoff) -> int:
+    with transaction.atomic():
+        wm = _locked_watermark('scanned_items')
+        rows = _consumable(ScannedContent.objects.filter(id__gt=wm.last_id).order_by('id').values_list(
+            'id', 'scan_job__user_id', 'created_at', 'platform_id')[:batch_size], cutoff)
+        if not rows:
+            return 0
+        # items that arrived outside a scan job (webhooks, manual channel scans) have no owner to report to
+        counts = Counter((uid, _day(created), pid) for _, uid, created, pid in rows if uid)
+        _add_counts(ScanDailyRollup, counts, ('user', 'day', 'platform'), 'items_scanned')
+        wm.last_id = rows[-1][0]; wm.save(update_fields=['last_id', 'updated_at'])
+        return len(rows)
+
+
+def roll_up_completed_jobs(cutoff) -> int:
+    """Completed scan jobs by completion day (completed_at is written once, on completion)."""
+    with transaction.atomic():
+        wm = _locked_watermark('scan_jobs')
+        qs = ScanJob.objects.filter(status='completed', completed_at__lt=cutoff)
+        if wm.last_time:
+            qs = qs.filter(completed_at__gte=wm.last_time)
+        counts = Counter((uid, _day(done), pid) for uid, done, pid in qs.values_list('user_id', 'completed_at', 'platform_id').iterator())
+        _add_counts(ScanDailyRollup, counts, ('user', 'day', 'platform'), 'jobs_completed')
+        wm.last_time = cutoff; wm.save(update_fields=['last_time', 'updated_at'])
+        return sum(counts.values())
+
+
+def roll_up_takedowns(cutoff) -> int:
+    """
+    Claims change status in place: recount only the users whose claims changed since the last run,
+    plus those marked by a claim deletion (reporting.signals).
+    """
+    with transaction.atomic():
+        wm = _locked_watermark('takedowns')
+        changed = DMCAClaim.objects.filter(updated_at__lt=cutoff)
+        if wm.last_time:
+            changed = changed.filter(updated_at__gte=wm.last_time)
+        users = set(changed.values_list('user_id', flat=True))
+        marked = list(TakedownRecount.objects.select_for_update().values_list('user_id', flat=True))
+        users.update(marked)
+        TakedownRecount.objects.filter(user_id__in=marked).delete()
+        if users:
+            counts = DMCAClaim.objects.filter(user_id__in=users).values_list('user_id', 'status').annotate(n=Count('id'))
+            TakedownStatusRollup.objects.filter(user_id__in=users).delete()
+            TakedownStatusRollup.objects.bulk_create([TakedownStatusRollup(user_id=u, status=s, claim_count=n) for u, s, n in counts])
+        wm.last_time = cutoff; wm.save(update_fields=['last_time', 'updated_at'])
+        return len(users)
+
+
+def update_rollups() -> Dict[str, Any]:
+    cfg = settings.REPORTING
+    cutoff = timezone.now() - timedelta(seconds=cfg['ROLLUP_LAG_SECONDS'])
+    done = defaultdict(int)
+    # drain the append-only sources in bounded batches (each batch is its own short transaction)
+    while (n := roll_up_matches(cfg['ROLLUP_BATCH_SIZE'], cutoff)):
+        done['matches'] += n
+    while (n := roll_up_scanned_items(cfg['ROLLUP_BATCH_SIZE'], cutoff)):
+        done['scanned_items'] += n
+    done['scan_jobs'] = roll_up_completed_jobs(cutoff)
+    done['takedown_users'] = roll_up_takedowns(cutoff)
+    return {'status': 'ok', 'cutoff': cutoff.isoformat(), **done}
+
+
+def dashboard_stats(user, days: int = 30) -> Dict[str, Any]:
+    """Everything the dashboard shows, read from the rollups (bounded by days x platforms, not by data volume)."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    matches = list(MatchDailyRollup.objects.filter(user=user, day__gte=since)
+                   .values_list('day', 'platform__name', 'confidence_level', 'match_count'))
+    scans = list(ScanDailyRollup.objects.filter(user=user, day__gte=since)
+                 .values_list('day', 'platform__name', 'items_scanned', 'jobs_completed'))
+    by_day = Counter(); by_platform = Counter(); by_confidence = Counter()
+    for day, platform, level, n in matches:
+        by_day[day] += n; by_platform[platform] += n; by_confidence[level] += n
+    scans_by_day = defaultdict(lambda: {'items_scanned': 0, 'jobs_completed': 0}); scans_by_platform = Counter()
+    for day, platform, items, jobs in scans:
+        scans_by_day[day]['items_scanned'] += items; scans_by_day[day]['jobs_completed'] += jobs
+        scans_by_platform[platform] += items
+    return {
+        'days': days,
+        'since': since,
+        'matches': {
+            'total': sum(by_day.values()),
+            'by_day': [{'day': d, 'count': by_day[d]} for d in sorted(by_day)],
+            'by_platform': dict(by_platform),
+            'by_confidence': dict(by_confidence),
+        },
+        'scans': {
+            'items_scanned': sum(v['items_scanned'] for v in scans_by_day.values()),
+            'jobs_completed': sum(v['jobs_completed'] for v in scans_by_day.values()),
+            'by_day': [{'day': d, **scans_by_day[d]} for d in sorted(scans_by_day)],
+            'by_platform': dict(scans_by_platform),
+        },
+        'takedowns': dict(TakedownStatusRollup.objects.filter(user=user).values_list('status', 'claim_count')),
+        'as_of': dict(RollupWatermark.objects.values_list('name', 'updated_at')),
+    }
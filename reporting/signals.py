@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from legal.models import DMCAClaim
+from .models import TakedownRecount
+
+# Written in the deleting transaction, so the next rollup run can't miss it.
+# QuerySet.delete() sends post_delete per row; raw SQL deletes need a manual marker.
+
+
+@receiver(post_delete, sender=DMCAClaim)
+def mark_takedowns_for_recount(sender, instance, **kwargs):
+    TakedownRecount.objects.update_or_create(user_id=instance.user_id)
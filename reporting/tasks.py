@@ -0,0 +1,23 @@
+from celery import shared_task
+from .rollups import update_rollups
+import logging
+logger=logging.getLogger(__name__)
+
+@shared_task
+def update_rollups_task():
+    """Fold rows added since the last run into the dashboard rollups."""
+    try:
+        return update_rollups()
+    except Exception as exc:
+        logger.error(f"Error updating dashboard rollups: {exc}"); raise
+
+@shared_task(bind=True, max_retries=2)
+def send_weekly_reports_task(self, user_ids, start, end):
+    """One chunk of the weekly report run (see scanning.tasks.generate_weekly_report)."""
+    from django.utils.dateparse import parse_datetime
+    from .weekly import send_weekly_reports
+    try:
+        return send_weekly_reports(user_ids, parse_datetime(start), parse_datetime(end))
+    except Exception as exc:
+        logger.error(f"Error sending weekly reports ({len(user_ids)} users): {exc}")
+        raise self.retry(exc=exc, countdown=300)
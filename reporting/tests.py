@@ -0,0 +1,73 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from unittest import mock
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from legal.models import DMCAClaim
+from reporting.models import TakedownRecount, TakedownStatusRollup, WeeklyReportDelivery
+from reporting.rollups import roll_up_takedowns
+from reporting.weekly import report_window, send_weekly_reports
+
+
+class TakedownRollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hana', email='hana@example.com', password='pw')
+
+    def claim(self, status='draft'):
+        return DMCAClaim.objects.create(user=self.user, title='t', description='d', infringing_content_url='https://example.com/x',
+                                        claimant_name='Hana', claimant_email='hana@example.com', status=status)
+
+    def roll_up(self):
+        roll_up_takedowns(timezone.now() + timedelta(seconds=1))
+        return dict(TakedownStatusRollup.objects.filter(user=self.user).values_list('status', 'claim_count'))
+
+    def test_deleted_claims_are_recounted(self):
+        keep, gone = self.claim(), self.claim('submitted')
+        self.assertEqual(self.roll_up(), {'draft': 1, 'submitted': 1})
+        gone.delete()
+        self.assertTrue(TakedownRecount.objects.filter(user_id=self.user.pk).exists())
+        self.assertEqual(self.roll_up(), {'draft': 1})
+        self.assertFalse(TakedownRecount.objects.exists())
+        DMCAClaim.objects.filter(pk=keep.pk).delete()
+        self.assertEqual(self.roll_up(), {})
+
+    def test_deleting_the_user_cascades(self):
+        self.claim(); self.roll_up()
+        self.user.delete()
+        self.assertEqual(roll_up_takedowns(timezone.now()), 1)
+        self.assertFalse(TakedownStatusRollup.objects.exists())
+
+
+class _FlakyConnection:
+    """Email connection that fails on the n-th message (a dropped SMTP session mid-chunk)."""
+    def __init__(self, fail_at):
+        self.fail_at = fail_at; self.calls = 0
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+    def send_messages(self, messages):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise ConnectionError('connection lost')
+        mail.outbox.extend(messages); return len(messages)
+
+
+@override_settings(WEEKLY_REPORT={'SUBJECT': 'Weekly', 'CHUNK_SIZE': 10, 'EMAIL_BATCH_SIZE': 2, 'TOP_AUTHORS': 5, 'SEND_EMPTY': True})
+class WeeklyReportRetryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.ids = [User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='pw').id for i in range(5)]
+        self.start, self.end = report_window()
+
+    def test_retry_skips_users_already_mailed(self):
+        with mock.patch('reporting.weekly.get_connection', return_value=_FlakyConnection(fail_at=4)), self.assertRaises(ConnectionError):
+            send_weekly_reports(self.ids, self.start, self.end)
+        self.assertEqual(WeeklyReportDelivery.objects.count(), 3)
+        first = [m.to[0] for m in mail.outbox]
+        result = send_weekly_reports(self.ids, self.start, self.end)
+        self.assertEqual((result['skipped'], result['sent']), (3, 2))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(f'u{i}@example.com' for i in range(5)))
+        self.assertEqual(len(set(first) & {m.to[0] for m in mail.outbox[len(first):]}), 0)
+        self.assertEqual(send_weekly_reports(self.ids, self.start, self.end)['sent'], 0)
@@ -0,0 +1,16 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from .rollups import dashboard_stats
+
+
+class StatsView(APIView):
+    """GET /api/stats/?days=30 — dashboard statistics served from the rollup tables."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get("days", 30))
+        except ValueError:
+            return Response({"error": "days must be an integer"}, status=400)
+        return Response(dashboard_stats(request.user, max(1, min(days, 365))))
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import get_template
+from django.utils import timezone
+from scanning.models import ScanJob
+from detection.models import ContentMatch
+from legal.models import DMCAClaim
+from .models import WeeklyReportDelivery
+
+User = get_user_model()
+TEXT_TEMPLATE = 'reporting/weekly_report.txt'
+HTML_TEMPLATE = 'reporting/weekly_report.html'
+
+
+def report_window(now=None) -> Tuple[Any, Any]:
+    end = now or timezone.now()
+    return end - timedelta(days=7), end
+
+
+def recipient_ids() -> List[int]:
+    """Active users with an address who haven't switched email alerts off (no configuration = default on)."""
+    return list(User.objects.filter(is_active=True).exclude(email='').exclude(configuration__email_alerts=False)
+                .order_by('id').values_list('id', flat=True))
+
+
+def _by_user(rows, key: str) -> Dict[int, Dict[str, Any]]:
+    return {r.pop(key): r for r in rows}
+
+
+def weekly_stats(user_ids: Iterable[int], start, end) -> Dict[int, Dict[str, Any]]:
+    """
+    The week's numbers for a chunk of users: one grouped query per section, whatever
+    the number of users or rows (no per-user queries, no Python loops over source rows).
+    """
+    user_ids = list(user_ids); top_n = settings.WEEKLY_REPORT['TOP_AUTHORS']
+    scans = _by_user(ScanJob.objects.filter(user_id__in=user_ids, created_at__gte=start, created_at__lt=end)
+                     .values('user_id').order_by()
+                     .annotate(jobs=Count('id'), completed=Count('id', filter=Q(status='completed')),
+                               failed=Count('id', filter=Q(status='failed')), items=Sum('total_items_scanned')), 'user_id')
+    matches = _by_user(ContentMatch.objects.filter(detection_job__user_id__in=user_ids, created_at__gte=start, created_at__lt=end)
+                       .values(uid=F('detection_job__user_id')).order_by()
+                       .annotate(total=Count('id'), high=Count('id', filter=Q(confidence_level='high')),
+                                 medium=Count('id', filter=Q(confidence_level='medium')),
+                                 low=Count('id', filter=Q(confidence_level='low')),
+                                 confirmed=Count('id', filter=Q(is_confirmed=True))), 'uid')
+    # no status history is kept, so "transitions" are the claims submitted / resolved this week
+    # plus every claim touched this week counted by the status it moved to
+    claims = _by_user(DMCAClaim.objects.filter(user_id__in=user_ids).filter(
+                          Q(updated_at__gte=start, updated_at__lt=end) | Q(submission_date__gte=start, submission_date__lt=end))
+                      .values('user_id').order_by()
+                      .annotate(submitted=Count('id', filter=Q(submission_date__gte=start, submission_date__lt=end)),
+                                resolved=Count('id', filter=Q(resolution_date__gte=start, resolution_date__lt=end)),
+                                updated=Count('id', filter=Q(updated_at__gte=start, updated_at__lt=end))), 'user_id')
+    claim_status = defaultdict(dict)
+    for uid, status, n in (DMCAClaim.objects.filter(user_id__in=user_ids, updated_at__gte=start, updated_at__lt=end)
+                           .values_list('user_id', 'status').order_by().annotate(n=Count('id'))):
+        claim_status[uid][status] = n
+    # top infringing authors/channels per user, ranked in the database
+    top = defaultdict(list)
+    ranked = (ContentMatch.objects.filter(detection_job__user_id__in=user_ids, created_at__gte=start, created_at__lt=end)
+              .exclude(scanned_content__author__isnull=True).exclude(scanned_content__author='')
+              .values(uid=F('detection_job__user_id'), author=F('scanned_content__author'),
+                      author_url=F('scanned_content__author_url'), platform=F('scanned_content__platform__name'))
+              .order_by().annotate(matches=Count('id'))
+              .annotate(rank=Window(RowNumber(), partition_by=[F('detection_job__user_id')], order_by=[F('matches').desc(), F('author').asc()]))
+              .filter(rank__lte=top_n))
+    for row in ranked:
+        row.pop('rank'); top[row.pop('uid')].append(row)
+    out = {}
+    for uid in user_ids:
+        out[uid] = {
+            'scans': scans.get(uid) or {'jobs': 0, 'completed': 0, 'failed': 0, 'items': 0},
+            'matches': matches.get(uid) or {'total': 0, 'high': 0, 'medium': 0, 'low': 0, 'confirmed': 0},
+            'claims': {**(claims.get(uid) or {'submitted': 0, 'resolved': 0, 'updated': 0}), 'by_status': claim_status.get(uid, {})},
+            'top_authors': sorted(top.get(uid, []), key=lambda r: (-r['matches'], r['author'])),
+        }
+    return out
+
+
+def has_activity(stats: Dict[str, Any]) -> bool:
+    return bool(stats['scans']['jobs'] or stats['matches']['total'] or stats['claims']['updated'] or stats['claims']['submitted'])
+
+
+@lru_cache(maxsize=None)
+def _templates():
+    """Text and HTML templates, loaded and compiled once per worker process."""
+    return get_template(TEXT_TEMPLATE), get_template(HTML_TEMPLATE)
+
+
+def render_report(user, stats: Dict[str, Any], start, end) -> EmailMultiAlternatives:
+    text_t, html_t = _templates()
+    ctx = {'user': user, 'start': start, 'end': end, **stats}
+    msg = EmailMultiAlternatives(settings.WEEKLY_REPORT['SUBJECT'], text_t.render(ctx), settings.DEFAULT_FROM_EMAIL, [user.email])
+    msg.attach_alternative(html_t.render(ctx), 'text/html')
+    return msg
+
+
+def report_week(end) -> date:
+    """Monday of the ISO week a report ending at `end` belongs to (the delivery key)."""
+    day = timezone.localtime(end).date()
+    return day - timedelta(days=day.weekday())
+
+
+def _mark_sent(user_ids: List[int], week: date):
+    WeeklyReportDelivery.objects.bulk_create([WeeklyReportDelivery(user_id=uid, week=week) for uid in user_ids], ignore_conflicts=True)
+
+
+def send_weekly_reports(user_ids: Iterable[int], start, end) -> Dict[str, int]:
+    """
+    Aggregate, render and send the reports for one chunk of users over a single SMTP connection.
+    Each delivery is recorded (every EMAIL_BATCH_SIZE messages, and before a failure propagates),
+    so a retried chunk only mails the users that didn't get their report for the week yet.
+    """
+    cfg = settings.WEEKLY_REPORT; week = report_week(end); user_ids = list(user_ids)
+    done = set(WeeklyReportDelivery.objects.filter(user_id__in=user_ids, week=week).values_list('user_id', flat=True))
+    user_ids = [uid for uid in user_ids if uid not in done]
+    stats = weekly_stats(user_ids, start, end)
+    users = User.objects.filter(id__in=user_ids).only('id', 'email', 'username', 'first_name', 'company_name')
+    messages = [(u.id, render_report(u, stats[u.id], start, end)) for u in users if cfg['SEND_EMPTY'] or has_activity(stats[u.id])]
+    sent: List[int] = []; marked = 0
+    try:
+        if messages:
+            with get_connection(fail_silently=False) as conn:
+                for uid, msg in messages:
+                    if conn.send_messages([msg]):
+                        sent.append(uid)
+                    if len(sent) - marked >= cfg['EMAIL_BATCH_SIZE']:
+                        _mark_sent(sent[marked:], week); marked = len(sent)
+    finally:
+        _mark_sent(sent[marked:], week)
+    return {'users': len(user_ids), 'skipped': len(done), 'rendered': len(messages), 'sent': len(sent)}
@@ -14,14 +14,18 @@ from telethon import TelegramClient, functions, types
 API_BASE = os.getenv("API_BASE", "http://127.0.0.1:8000")
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASS = os.getenv("ADMIN_PASS", "admin")
+# Prefer an API key (POST /api/users/rotate-api-key/): Basic auth runs a password hash on every request
+API_KEY = os.getenv("API_KEY")
 PLATFORM_NAME = os.getenv("PLATFORM_NAME", "telegram")
 
 API_ID = int(config("TG_API_ID"))
 API_HASH = config("TG_API_HASH")
 SESSION_FILE = config("TG_SESSION_FILE", default=".tg_session")
 
-AUTH = (ADMIN_USER, ADMIN_PASS)
+AUTH = None if API_KEY else (ADMIN_USER, ADMIN_PASS)
 HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
+if API_KEY:
+    HEADERS["Authorization"] = f"Api-Key {API_KEY}"
 
 URL_RE = re.compile(r"(https?://\S+)", re.IGNORECASE)
 
@@ -1,3 +1,3 @@
 from django.contrib import admin
-from .models import Platform, ScanJob, ScannedContent, ScanSchedule, PlatformCredential
-admin.site.register(Platform); admin.site.register(ScanJob); admin.site.register(ScannedContent); admin.site.register(ScanSchedule); admin.site.register(PlatformCredential)
+from .models import Platform, ScanJob, ScannedContent, ScanSchedule, PlatformCredential, ContentCluster
+admin.site.register(Platform); admin.site.register(ScanJob); admin.site.register(ScannedContent); admin.site.register(ScanSchedule); admin.site.register(PlatformCredential); admin.site.register(ContentCluster)
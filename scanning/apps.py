@@ -2,3 +2,5 @@ from django.apps import AppConfig
 class ScanningConfig(AppConfig):
     default_auto_field='django.db.models.BigAutoField'
     name='scanning'
+    def ready(self):
+        from . import signals  # noqa: F401  (cluster member counts)
@@ -0,0 +1,66 @@
+import hashlib, re, unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ContentCluster, ScannedContent
+
+_PUNCT_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_content(text: str) -> str:
+    """Case-, width-, punctuation- and whitespace-insensitive form of a post's text."""
+    if not text:
+        return ""
+    t = unicodedata.normalize("NFKC", text).casefold()
+    t = _PUNCT_RE.sub(" ", t)
+    return _WS_RE.sub(" ", t).strip()
+
+
+def normalized_content_hash(text: str) -> str:
+    norm = normalize_content(text)
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest() if norm else ""
+
+
+def assign_clusters(items: Iterable[ScannedContent]) -> Dict[int, int]:
+    """
+    Attach unclustered ScannedContent rows to their ContentCluster, creating clusters as needed.
+    Items without text are left alone (they are detected individually).
+    Returns {scanned_content_id: cluster_id} for the rows that were assigned.
+    """
+    by_hash = defaultdict(list)
+    for obj in items:
+        if obj.cluster_id:
+            continue
+        h = obj.normalized_hash or normalized_content_hash(obj.text_content)
+        if h:
+            obj.normalized_hash = h
+            by_hash[h].append(obj)
+    if not by_hash:
+        return {}
+
+    with transaction.atomic():
+        # ignore_conflicts + re-read keeps concurrent writers from creating duplicate clusters
+        ContentCluster.objects.bulk_create(
+            [ContentCluster(normalized_hash=h) for h in by_hash], ignore_conflicts=True
+        )
+        clusters = {c.normalized_hash: c for c in ContentCluster.objects.filter(normalized_hash__in=list(by_hash))}
+
+        assigned = {}; changed = []
+        for h, objs in by_hash.items():
+            cluster = clusters[h]
+            for obj in objs:
+                obj.cluster_id = cluster.id
+                assigned[obj.id] = cluster.id
+                changed.append(obj)
+        ScannedContent.objects.bulk_update(changed, ["normalized_hash", "cluster"])
+
+        now = timezone.now()
+        for h, objs in by_hash.items():
+            cluster = clusters[h]
+            ContentCluster.objects.filter(pk=cluster.pk).update(member_count=F("member_count") + len(objs), last_seen_at=now)
+            if cluster.representative_id is None:
+                ContentCluster.objects.filter(pk=cluster.pk, representative__isnull=True).update(representative_id=objs[0].id)
+    return assigned
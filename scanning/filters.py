@@ -0,0 +1,47 @@
+import re
+from typing import Iterable, List, Optional
+from urllib.parse import urlparse
+
+_LINK_RE = re.compile(r"(https?://\S+|t\.me/\S+|tg://\S+)", re.IGNORECASE)
+
+
+def extract_links(text: str) -> List[str]:
+    if not text:
+        return []
+    return _LINK_RE.findall(text)
+
+
+def is_suspicious(text: str,
+                  keywords: Optional[Iterable[str]],
+                  allow_domains: Optional[Iterable[str]]) -> bool:
+    if not text:
+        return False
+
+    # If keywords were provided, use them (case-insensitive)
+    if keywords:
+        t = text.lower()
+        return any(str(k).lower() in t for k in keywords)
+
+    # Otherwise: suspicious == contains a link not on the allow-list (or any link if no allow-list)
+    links = extract_links(text)
+    if not links:
+        return False
+    if not allow_domains:
+        return True
+
+    allow = [d.lower().strip() for d in allow_domains if d]
+    for raw in links:
+        # t.me / tg:// special-cases
+        if raw.lower().startswith(("t.me/", "http://t.me/", "https://t.me/", "tg://")):
+            host = "t.me"
+        else:
+            try:
+                host = urlparse(raw).netloc.lower()
+            except Exception:
+                host = ""
+
+        if not any(host.endswith(ad) for ad in allow):
+            # found a link NOT on the allow-list -> suspicious
+            return True
+
+    return False
@@ -0,0 +1,180 @@
+import json, random, threading, time
+from typing import Any, Dict, Iterable, List, Tuple
+from django.conf import settings
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+from content_protection_platform.common.stats import percentile
+from .models import Platform, ScanJob, ScannedContent
+from .pipeline import ScanRecord
+from .services import BasePlatformService
+
+# Offline load generator for the scan -> detect -> match path (`manage.py load_test`).
+# Everything it creates lives on the "loadtest" platform or carries an "lt-" content id.
+
+PLATFORM = 'loadtest'
+ID_PREFIX = 'lt-'
+
+
+def ensure_platform() -> Platform:
+    return Platform.objects.get_or_create(name=PLATFORM, defaults={'display_name': 'Load test', 'base_url': 'https://loadtest.local'})[0]
+
+
+class FakePlatformService(BasePlatformService):
+    """
+    Deterministic paged platform: every (keyword, page) yields the same records. A share of
+    them copy the owner's protected texts (COPY_RATE) or repeat an earlier record of the page
+    (DUP_RATE, so clusters form). Registered with the factory when LOAD_TEST['FAKE_PLATFORM'] is on.
+    """
+    def __init__(self, user):
+        super().__init__(PLATFORM, user)
+        from detection.models import ProtectedContent
+        self.protected = list(ProtectedContent.objects.filter(user=user, content_type='text', is_active=True)
+                              .order_by('id').values_list('text_content', flat=True)[:500])
+
+    def fetch_page(self, keyword, content_types, page_token=None):
+        cfg = settings.LOAD_TEST
+        page = int(page_token or 0); rng = random.Random(f"{keyword}:{page}")
+        if cfg['LATENCY_MS']:
+            time.sleep(cfg['LATENCY_MS'] / 1000)
+        records: List[ScanRecord] = []
+        for i in range(cfg['PAGE_SIZE']):
+            roll = rng.random()
+            if records and roll < cfg['DUP_RATE']:
+                text = rng.choice(records).text_content
+            elif self.protected and roll < cfg['DUP_RATE'] + cfg['COPY_RATE']:
+                text = rng.choice(self.protected)
+            else:
+                text = ' '.join(f"w{rng.randrange(5000)}" for _ in range(rng.randint(15, 60)))
+            pcid = f"{ID_PREFIX}{keyword}-{page}-{i}"
+            records.append(ScanRecord(platform_content_id=pcid, content_url=f"https://loadtest.local/{pcid}", content_type='text',
+                                      title=f"Load test item {pcid}", author=f"channel{rng.randrange(50)}", text_content=text,
+                                      metadata={'emitted_at': time.time()}))
+        return records, (str(page + 1) if page + 1 < cfg['PAGES'] else None)
+
+
+# -------- query counting ----------------------------------------------------------
+class QueryCounter:
+    """Counts SQL statements on this thread's connection (connection.execute_wrapper)."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._cm = connection.execute_wrapper(self); self._cm.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cm.__exit__(*exc)
+
+
+# -------- webhook replay ----------------------------------------------------------
+def synthetic_payloads(n: int, rng: random.Random) -> Iterable[Dict[str, Any]]:
+    """{'kind': 'telegram'|'whatsapp', 'body': <payload as the platform posts it>}, in the recorded-file format."""
+    for i in range(n):
+        text = ' '.join(f"w{rng.randrange(5000)}" for _ in range(rng.randint(5, 40)))
+        if i % 2:
+            yield {'kind': 'telegram', 'body': {'update_id': i, 'channel_post': {
+                'message_id': f"{ID_PREFIX}{i}", 'date': int(time.time()), 'text': text,
+                'chat': {'id': -1000 - rng.randrange(20), 'title': 'Load test', 'username': f"loadtest{rng.randrange(20)}"}}}}
+        else:
+            yield {'kind': 'whatsapp', 'body': {'object': 'whatsapp_business_account', 'entry': [{'changes': [{'value': {'messages': [
+                {'from': f"1555{rng.randrange(10 ** 6):06d}", 'id': f"{ID_PREFIX}wamid.{i}", 'type': 'text', 'text': {'body': text}}]}}]}]}}
+
+
+def load_payloads(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_webhooks(payloads: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """POST every payload straight into the webhook views (no HTTP server) and time each request."""
+    from content_protection_platform.webhooks.views import TelegramWebhookView, WhatsAppWebhookView
+    factory = APIRequestFactory(); secret = settings.TELEGRAM.get('WEBHOOK_SECRET') or ''
+    views = {'telegram': TelegramWebhookView.as_view(), 'whatsapp': WhatsAppWebhookView.as_view()}
+    latencies, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for p in payloads:
+        request = factory.post(f"/webhooks/{p['kind']}/", p['body'], format='json')
+        kwargs = {'secret': secret} if p['kind'] == 'telegram' else {}
+        with QueryCounter() as qc:
+            t = time.perf_counter(); resp = views[p['kind']](request, **kwargs); latencies.append(time.perf_counter() - t)
+        queries.append(qc.count); errors += resp.status_code >= 400
+    wall = time.perf_counter() - started
+    return {'requests': len(latencies), 'errors': errors, 'wall_s': wall, 'per_s': len(latencies) / wall if wall else 0.0,
+            'p50_ms': percentile(latencies, .5) * 1000, 'p99_ms': percentile(latencies, .99) * 1000,
+            'queries_per_item': sum(queries) / len(queries) if queries else 0.0}
+
+
+# -------- queue depth sampling -----------------------------------------------------
+class QueueSampler(threading.Thread):
+    """Every `interval` seconds: broker queue lengths (when a broker is reachable) and the detection backlog in the DB."""
+    def __init__(self, user, queues: List[str], interval: float, use_broker: bool):
+        super().__init__(daemon=True)
+        self.user = user; self.queues = queues; self.interval = interval; self.use_broker = use_broker
+        self.samples: List[Dict[str, Any]] = []; self.halt = threading.Event(); self.t0 = time.perf_counter()
+
+    def _broker_depths(self, channel) -> Dict[str, int]:
+        depths = {}
+        for q in self.queues:
+            try:
+                depths[q] = channel.queue_declare(queue=q, passive=True).message_count
+            except Exception:
+                depths[q] = None
+        return depths
+
+    def run(self):
+        from detection.models import DetectionJob
+        conn = None
+        try:
+            if self.use_broker:
+                from content_protection_platform.celery import app
+                conn = app.connection_for_read(); channel = conn.default_channel
+            while not self.halt.is_set():
+                backlog = DetectionJob.objects.filter(user=self.user, status__in=['pending', 'processing']).count()
+                sample = {'t': round(time.perf_counter() - self.t0, 2), 'detection_backlog': backlog}
+                if conn is not None:
+                    sample['queues'] = self._broker_depths(channel)
+                self.samples.append(sample)
+                self.halt.wait(self.interval)
+        finally:
+            if conn is not None:
+                conn.release()
+            connection.close()
+
+    def stop(self):
+        self.halt.set(); self.join()
+
+
+# -------- end-to-end latency -------------------------------------------------------
+def e2e_latencies(scan_job_ids: List[int]) -> Tuple[List[float], int]:
+    """
+    Seconds from a record leaving the platform service (metadata.emitted_at) to the completion of
+    the detection that covered it: its own job, or its cluster representative's. Returns (latencies, undetected).
+    """
+    from detection.models import DetectionJob
+    done = {}; by_cluster = {}
+    for sc_id, cluster_id, completed in (DetectionJob.objects.filter(scanned_content__scan_job_id__in=scan_job_ids, status='completed')
+                                         .values_list('scanned_content_id', 'scanned_content__cluster_id', 'completed_at')):
+        done[sc_id] = completed
+        if cluster_id:
+            by_cluster[cluster_id] = min(completed, by_cluster.get(cluster_id, completed))
+    latencies, undetected = [], 0
+    for sc_id, cluster_id, meta in ScannedContent.objects.filter(scan_job_id__in=scan_job_ids).values_list('id', 'cluster_id', 'metadata').iterator():
+        completed = done.get(sc_id) or by_cluster.get(cluster_id)
+        if completed is None or not (meta or {}).get('emitted_at'):
+            undetected += 1; continue
+        latencies.append(max(0.0, completed.timestamp() - meta['emitted_at']))
+    return latencies, undetected
+
+
+def cleanup(user=None) -> Dict[str, int]:
+    """Delete everything a load test created (load-test platform rows, replayed webhook items, the load user)."""
+    from django.db.models import Q
+    counts = {'scanned_content': ScannedContent.objects.filter(Q(platform__name=PLATFORM) | Q(platform_content_id__startswith=ID_PREFIX)).delete()[0]}
+    counts['scan_jobs'] = ScanJob.objects.filter(platform__name=PLATFORM).delete()[0]
+    if user is not None:
+        counts['user'] = user.delete()[0]
+    return counts
@@ -0,0 +1,127 @@
+import json, random, tempfile, time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from detection.models import ContentMatch, ProtectedContent
+from scanning.loadtest import (
+    QueryCounter, QueueSampler, cleanup, e2e_latencies, ensure_platform, load_payloads, replay_webhooks, synthetic_payloads,
+)
+from scanning.models import ScanJob, ScannedContent
+from scanning.tasks import dispatch_scan_job, execute_scan_job_task
+from content_protection_platform.celery import app
+from content_protection_platform.common.stats import percentile
+from users.activity import flush_activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline end-to-end load test: replays webhook payloads into the webhook views, then runs scan jobs "
+        "against a fake paged platform through scan -> detect -> match. --mode eager runs every Celery task "
+        "inline in this process; --mode broker dispatches to running workers (start them with "
+        "LOAD_TEST_FAKE_PLATFORM=1). Reports items/s, queue depth over time, queries per item and p50/p99 latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["eager", "broker"], default="eager")
+        parser.add_argument("--webhooks", type=int, default=500, help="Synthetic webhook payloads to replay (ignored with --payloads)")
+        parser.add_argument("--payloads", help='Recorded payloads, JSON lines of {"kind": "telegram"|"whatsapp", "body": {...}}')
+        parser.add_argument("--jobs", type=int, default=4, help="Scan jobs (one keyword each)")
+        parser.add_argument("--pages", type=int, default=settings.LOAD_TEST["PAGES"])
+        parser.add_argument("--page-size", type=int, default=settings.LOAD_TEST["PAGE_SIZE"])
+        parser.add_argument("--latency-ms", type=float, default=settings.LOAD_TEST["LATENCY_MS"], help="Simulated platform API latency per page")
+        parser.add_argument("--catalog", type=int, default=200, help="Protected texts owned by the load-test user")
+        parser.add_argument("--sample-interval", type=float, default=0.5)
+        parser.add_argument("--timeout", type=float, default=600.0, help="Broker mode: give up waiting after this many seconds")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--json", dest="json_path", help="Also write the full report (with queue samples) here")
+        parser.add_argument("--keep", action="store_true", help="Keep the load-test user and rows afterwards")
+
+    def handle(self, *args, **opts):
+        eager = opts["mode"] == "eager"
+        load_cfg = {**settings.LOAD_TEST, "FAKE_PLATFORM": True, "PAGES": opts["pages"], "PAGE_SIZE": opts["page_size"], "LATENCY_MS": opts["latency_ms"]}
+        payload_dir = tempfile.TemporaryDirectory(prefix="loadtest-payloads-")
+        overrides = {
+            "LOAD_TEST": load_cfg,
+            "SCAN_EXECUTION": {**settings.SCAN_EXECUTION, "MAX_PAGES_PER_KEYWORD": max(opts["pages"], settings.SCAN_EXECUTION["MAX_PAGES_PER_KEYWORD"])},
+            # replayed webhook bodies go to a throwaway payload store
+            "PAYLOAD_STORE": {**settings.PAYLOAD_STORE, "ROOT": payload_dir.name},
+        }
+        if eager:
+            # no LLM calls from an offline run
+            overrides.update(CELERY_TASK_ALWAYS_EAGER=True, AI_MODEL_SETTINGS={**settings.AI_MODEL_SETTINGS, "LLM_JUDGE_ENABLED": False})
+        was_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = eager
+        rng = random.Random(opts["seed"]); user = None
+        try:
+            with override_settings(**overrides):
+                user = get_user_model().objects.create_user(f"loadtest-{int(time.time())}", f"loadtest-{time.time_ns()}@loadtest.local", None)
+                vocab = [f"w{i}" for i in range(5000)]
+                for i in range(opts["catalog"]):
+                    ProtectedContent.objects.create(user=user, title=f"Load test asset {i}", content_type="text",
+                                                    text_content=" ".join(rng.choices(vocab, k=rng.randint(15, 60))))
+                report = {"mode": opts["mode"], "webhooks": self._webhooks(opts, rng), "scan": self._scan(user, opts, eager)}
+        finally:
+            app.conf.task_always_eager = was_eager
+            flush_activity()  # buffered "scan_completed" entries reference the user
+            if user is not None and not opts["keep"]:
+                cleanup(user)
+            payload_dir.cleanup()
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, default=str)
+
+    def _webhooks(self, opts, rng):
+        payloads = load_payloads(opts["payloads"]) if opts["payloads"] else list(synthetic_payloads(opts["webhooks"], rng))
+        if not payloads:
+            return None
+        r = replay_webhooks(payloads)
+        self.stdout.write(f"webhooks: {r['requests']} requests ({r['errors']} errors) in {r['wall_s']:.2f}s = {r['per_s']:.0f}/s; "
+                          f"p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms; {r['queries_per_item']:.1f} queries/item")
+        return r
+
+    def _scan(self, user, opts, eager):
+        platform = ensure_platform()
+        jobs = [ScanJob.objects.create(user=user, platform=platform, job_type="manual", keywords=[f"kw{j}"], content_types=["text"])
+                for j in range(opts["jobs"])]
+        ids = [j.id for j in jobs]
+        queues = sorted({r["queue"] for r in settings.CELERY_TASK_ROUTES.values()} | set(settings.DETECTION_QUEUES.values()))
+        sampler = QueueSampler(user, queues, opts["sample_interval"], use_broker=not eager); sampler.start()
+        started = time.perf_counter()
+        try:
+            with QueryCounter() as qc:
+                if eager:
+                    for job in jobs:
+                        execute_scan_job_task.apply((job.id,))
+                else:
+                    for job in jobs:
+                        dispatch_scan_job(job)
+                    self._wait(user, ids, started + opts["timeout"])
+            wall = time.perf_counter() - started
+        finally:
+            sampler.stop()
+        items = ScannedContent.objects.filter(scan_job_id__in=ids).count()
+        matches = ContentMatch.objects.filter(detection_job__user=user).count()
+        latencies, undetected = e2e_latencies(ids)
+        r = {"jobs": len(ids), "items": items, "matches": matches, "wall_s": wall, "items_per_s": items / wall if wall else 0.0,
+             # broker mode only sees this process's queries (dispatch and polling), not the workers'
+             "queries_per_item": qc.count / items if items and eager else None,
+             "e2e_p50_ms": percentile(latencies, .5) * 1000, "e2e_p99_ms": percentile(latencies, .99) * 1000,
+             "undetected": undetected, "max_detection_backlog": max((s["detection_backlog"] for s in sampler.samples), default=0),
+             "queue_samples": sampler.samples}
+        qpi = f"{r['queries_per_item']:.1f} queries/item" if r["queries_per_item"] is not None else "queries/item n/a (broker mode)"
+        self.stdout.write(f"scan->detect: {items} items, {matches} matches from {len(ids)} jobs in {wall:.2f}s = {r['items_per_s']:.0f} items/s; {qpi}")
+        self.stdout.write(f"end-to-end: p50 {r['e2e_p50_ms']:.1f} ms, p99 {r['e2e_p99_ms']:.1f} ms; {undetected} items without a finished detection")
+        self.stdout.write(f"queue depth: max detection backlog {r['max_detection_backlog']} over {len(sampler.samples)} samples")
+        for s in sampler.samples[:: max(1, -(-len(sampler.samples) // 10))]:
+            self.stdout.write(f"  t={s['t']:>7.2f}s backlog={s['detection_backlog']:<6}" + (f" queues={json.dumps(s['queues'])}" if "queues" in s else ""))
+        return r
+
+    def _wait(self, user, ids, deadline):
+        from detection.models import DetectionJob
+        while time.perf_counter() < deadline:
+            jobs_done = not ScanJob.objects.filter(id__in=ids, status__in=["pending", "running"]).exists()
+            if jobs_done and not DetectionJob.objects.filter(user=user, status__in=["pending", "processing"]).exists():
+                return
+            time.sleep(0.5)
+        raise CommandError("timed out waiting for workers; are they running with LOAD_TEST_FAKE_PLATFORM=1 on every queue?")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from scanning.models import ScannedContent
+from content_protection_platform.common.payload_store import PayloadStore, offload_raw_payload
+
+
+class Command(BaseCommand):
+    help = "Move inline ScannedContent.metadata['raw'] payloads into the compressed payload store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many rows")
+        parser.add_argument("--dry-run", action="store_true", help="Count rows that would be moved, write nothing")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]; limit = opts["limit"]; dry_run = opts["dry_run"]
+        store = PayloadStore()
+        qs = ScannedContent.objects.filter(metadata__has_key="raw").only("id", "metadata").order_by("id")
+
+        moved = 0; raw_bytes = 0; stored_bytes = 0; last_id = 0
+        while limit is None or moved < limit:
+            size = batch_size if limit is None else min(batch_size, limit - moved)
+            batch = list(qs.filter(id__gt=last_id)[:size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for obj in batch:
+                if dry_run:
+                    continue
+                obj.metadata = offload_raw_payload(obj.metadata, store=store)
+                raw_bytes += obj.metadata["raw_ref"]["bytes"]
+                stored_bytes += obj.metadata["raw_ref"]["stored_bytes"]
+            if not dry_run:
+                ScannedContent.objects.bulk_update(batch, ["metadata"])
+            moved += len(batch)
+            self.stdout.write(f"... {moved} rows")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"{moved} rows hold inline raw payloads (dry run, nothing moved)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Moved {moved} raw payloads to {store.root} ({store.codec}): "
+                f"{raw_bytes} bytes raw -> {stored_bytes} bytes on disk"
+            ))
@@ -0,0 +1,52 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from scanning.tasks import latency_probe, synthetic_load
+from content_protection_platform.common.stats import percentile as _pct
+
+
+class Command(BaseCommand):
+    help = (
+        "Latency-isolation check against a running broker and workers: floods one queue with "
+        "CPU-bound tasks, then measures enqueue->start latency of probe tasks on every queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flood-queue", default="detect-cpu")
+        parser.add_argument("--flood", type=int, default=500, help="Number of synthetic load tasks")
+        parser.add_argument("--task-seconds", type=float, default=0.05, help="CPU time per load task")
+        parser.add_argument("--probe-queues", default="scan-io,detect-cpu,llm-io,legal")
+        parser.add_argument("--probes", type=int, default=20, help="Probes per queue")
+        parser.add_argument("--timeout", type=float, default=120.0)
+
+    def handle(self, *args, **opts):
+        queues = [q.strip() for q in opts["probe_queues"].split(",") if q.strip()]
+        self.stdout.write(f"Flooding {opts['flood_queue']} with {opts['flood']} x {opts['task_seconds']}s tasks ...")
+        for _ in range(opts["flood"]):
+            synthetic_load.apply_async((opts["task_seconds"],), queue=opts["flood_queue"])
+
+        pending = []
+        for i in range(opts["probes"]):
+            for q in queues:
+                # manual-scan priority so the probe measures queue isolation, not priority ordering
+                pending.append((q, latency_probe.apply_async((time.time(),), queue=q, priority=0)))
+            time.sleep(0.05)
+
+        results = {q: [] for q in queues}
+        deadline = time.time() + opts["timeout"]
+        for q, res in pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                results[q].append(res.get(timeout=remaining))
+            except Exception as e:
+                raise CommandError(f"probe on {q} did not finish ({e}); is a worker consuming that queue?")
+
+        self.stdout.write(f"{'queue':<12}{'n':>5}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for q, vals in results.items():
+            if not vals:
+                self.stdout.write(f"{q:<12}{0:>5}{'-':>10}{'-':>10}{'-':>10}")
+                continue
+            self.stdout.write(
+                f"{q:<12}{len(vals):>5}{_pct(vals, .5) * 1000:>10.1f}{_pct(vals, .99) * 1000:>10.1f}{max(vals) * 1000:>10.1f}"
+            )
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning', '0003_alter_platformcredential_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scannedcontent',
+            name='normalized_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ContentCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_hash', models.CharField(max_length=64, unique=True)),
+                ('member_count', models.IntegerField(default=0)),
+                ('first_seen_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(auto_now=True)),
+                ('representative', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanning.scannedcontent')),
+            ],
+            options={
+                'db_table': 'content_clusters',
+                'ordering': ['-member_count'],
+            },
+        ),
+        migrations.AddField(
+            model_name='scannedcontent',
+            name='cluster',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='scanning.contentcluster'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning', '0004_content_clusters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanschedule',
+            name='content_types',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='scanschedule',
+            name='keywords',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddIndex(
+            model_name='scanschedule',
+            index=models.Index(fields=['is_active', 'next_run_at'], name='scan_schedule_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning', '0005_scan_schedule_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
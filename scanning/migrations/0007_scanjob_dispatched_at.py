@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning', '0006_scan_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -49,6 +49,11 @@ class ScanJob(models.Model):
     completed_at = models.DateTimeField(blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     total_items_scanned = models.IntegerField(default=0)
+    # resume point committed with every page of results: {keyword_index, page_token, pages}
+    checkpoint = models.JSONField(default=dict, blank=True)
+    # scheduled jobs: set once the execute task has been published; still unset after
+    # SCAN_SCHEDULER['REDISPATCH_AFTER_SECONDS'] means it never was (scheduler.redispatch_stranded_jobs)
+    dispatched_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -93,6 +98,12 @@ class ScannedContent(models.Model):
     # keep a fast lookup; we’ll compute automatically if missing
     content_hash = models.CharField(max_length=64, db_index=True)
 
+    # hash of the normalized text (see scanning/dedupe.py); reposts of the same text share a cluster
+    normalized_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    cluster = models.ForeignKey(
+        'ContentCluster', on_delete=models.SET_NULL, null=True, blank=True, related_name='members'
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -106,6 +117,24 @@ class ScannedContent(models.Model):
         return f"{self.platform.display_name} - {self.title or self.platform_content_id}"
 
 
+class ContentCluster(models.Model):
+    """Scanned items (across channels and platforms) whose normalized text is identical."""
+    normalized_hash = models.CharField(max_length=64, unique=True)
+    representative = models.ForeignKey(
+        ScannedContent, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    member_count = models.IntegerField(default=0)
+    first_seen_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'content_clusters'
+        ordering = ['-member_count']
+
+    def __str__(self):
+        return f"Cluster {self.id} ({self.member_count} items)"
+
+
 class ScanSchedule(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_schedules')
     platform = models.ForeignKey(Platform, on_delete=models.CASCADE, related_name='scan_schedules')
@@ -114,6 +143,9 @@ class ScanSchedule(models.Model):
     frequency = models.CharField(
         max_length=20, choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')]
     )
+    # empty -> fall back to the user's ClientConfiguration keywords / monitored content types
+    keywords = models.JSONField(default=list, blank=True)
+    content_types = models.JSONField(default=list, blank=True)
     is_active = models.BooleanField(default=True)
     last_run_at = models.DateTimeField(blank=True, null=True)
     next_run_at = models.DateTimeField(blank=True, null=True)
@@ -123,6 +155,10 @@ class ScanSchedule(models.Model):
     class Meta:
         db_table = 'scan_schedules'
         ordering = ['-created_at']
+        indexes = [
+            # the scheduler polls "active and due" every minute
+            models.Index(fields=['is_active', 'next_run_at'], name='scan_schedule_due_idx'),
+        ]
 
 
 class PlatformCredential(models.Model):
@@ -0,0 +1,115 @@
+import asyncio, time
+from dataclasses import dataclass, field, asdict
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Union
+from content_protection_platform.common.metrics import STAGE_SECONDS, STAGE_ITEMS
+
+
+@dataclass(slots=True)
+class ScanRecord:
+    """One scanned item as produced by a platform service (no ORM objects, no materialised lists)."""
+    platform_content_id: str
+    content_url: str
+    content_type: str
+    title: str = ''
+    description: str = ''
+    author: str = ''
+    author_url: str = ''
+    published_at: Any = None
+    view_count: Optional[int] = None
+    like_count: Optional[int] = None
+    share_count: Optional[int] = None
+    text_content: str = ''
+    media_urls: List[str] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    content_hash: str = ''
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'ScanRecord':
+        return cls(**{k: v for k, v in d.items() if k in cls.__dataclass_fields__})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class PageBoundary:
+    """Yielded by a service after each fetched page; `cursor` resumes right after that page."""
+    cursor: Dict[str, Any]
+
+
+StreamItem = Union[ScanRecord, PageBoundary]
+
+
+# -------- stages (generator -> generator, one item in flight) ------------------
+def hash_stage(items: Iterable[StreamItem], hasher: Callable[[ScanRecord], str]) -> Iterator[StreamItem]:
+    hash_seconds = STAGE_SECONDS.labels('hash')
+    for it in items:
+        if isinstance(it, ScanRecord) and not it.content_hash:
+            started = time.perf_counter(); it.content_hash = hasher(it)
+            hash_seconds.observe(time.perf_counter() - started)
+        yield it
+
+
+def filter_stage(items: Iterable[StreamItem], predicate: Callable[[ScanRecord], bool]) -> Iterator[StreamItem]:
+    for it in items:
+        if isinstance(it, PageBoundary) or predicate(it):
+            yield it
+
+
+def iterate_async(agen: AsyncIterator) -> Iterator:
+    """Drive an async generator from sync code, one item at a time (ORM work happens between steps)."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        try:
+            loop.run_until_complete(agen.aclose())
+        finally:
+            loop.close()
+
+
+class ScanPipeline:
+    """
+    Pulls records through the stages and hands them to `sink` in batches of at most
+    `batch_size`, so peak memory is O(batch) whatever the scan size.
+
+    sink.write(records, cursor) persists a batch and returns how many rows it stored;
+    sink.checkpoint(cursor) records progress when a page produced nothing to write.
+    `cursor` is the last PageBoundary seen before the flush; records after it are
+    re-fetched on resume, so sinks must tolerate (skip) duplicates.
+    """
+    def __init__(self, sink, batch_size: int = 500, stop_check: Optional[Callable[[], bool]] = None):
+        self.sink = sink; self.batch_size = batch_size; self.stop_check = stop_check
+
+    def run(self, items: Iterable[StreamItem]) -> Dict[str, Any]:
+        buffer: List[ScanRecord] = []; cursor = None
+        stats = {'seen': 0, 'stored': 0, 'batches': 0, 'cancelled': False}
+        persist_seconds = STAGE_SECONDS.labels('persist')
+
+        def flush():
+            if buffer:
+                started = time.perf_counter()
+                stats['stored'] += self.sink.write(buffer, cursor); stats['batches'] += 1
+                persist_seconds.observe(time.perf_counter() - started)
+                STAGE_ITEMS.labels('persist').inc(len(buffer))
+                buffer.clear()
+
+        for it in items:
+            if isinstance(it, PageBoundary):
+                cursor = it.cursor
+                if self.stop_check and self.stop_check():
+                    flush(); stats['cancelled'] = True
+                    return stats
+                if not buffer:
+                    self.sink.checkpoint(cursor)
+                continue
+            stats['seen'] += 1
+            buffer.append(it)
+            if len(buffer) >= self.batch_size:
+                flush()
+        flush()
+        return stats
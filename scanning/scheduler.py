@@ -0,0 +1,100 @@
+import hashlib, random
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import ScanJob, ScanSchedule
+from users.models import ClientConfiguration
+
+FREQUENCY_DELTAS = {'daily': timedelta(days=1), 'weekly': timedelta(days=7), 'monthly': timedelta(days=30)}
+
+
+def schedule_offset(schedule_id: int, window_seconds: int) -> timedelta:
+    """Stable pseudo-random offset for a schedule, so schedules spread evenly over the window."""
+    if window_seconds <= 0: return timedelta(0)
+    h = int.from_bytes(hashlib.sha1(str(schedule_id).encode()).digest()[:8], 'big')
+    return timedelta(seconds=h % window_seconds)
+
+
+def next_run_after(schedule: ScanSchedule, now: datetime) -> datetime:
+    """Advance by whole periods from the previous due time (keeps each schedule's phase, skips missed runs)."""
+    delta = FREQUENCY_DELTAS.get(schedule.frequency, FREQUENCY_DELTAS['daily'])
+    base = schedule.next_run_at or now
+    periods = max(1, (now - base) // delta + 1)
+    return base + periods * delta
+
+
+def _job_params(schedule: ScanSchedule, config: Optional[ClientConfiguration]) -> Tuple[list, list]:
+    keywords = schedule.keywords or (config.keywords if config else [])
+    content_types = schedule.content_types
+    if not content_types:
+        content_types = ['text', 'image', 'video'] if config is None else (
+            (['text'] if config.monitor_text else []) + (['image'] if config.monitor_images else []) + (['video'] if config.monitor_videos else [])
+        )
+    return keywords, content_types
+
+
+def seed_unscheduled(now=None) -> int:
+    """Give active schedules without a next_run_at their first (phase-offset) due time."""
+    now = now or timezone.now(); window = settings.SCAN_SCHEDULER['PHASE_WINDOW_SECONDS']
+    pending = list(ScanSchedule.objects.filter(is_active=True, next_run_at__isnull=True).only('id'))
+    for s in pending:
+        s.next_run_at = now + schedule_offset(s.id, window)
+    ScanSchedule.objects.bulk_update(pending, ['next_run_at'], batch_size=500)
+    return len(pending)
+
+
+def claim_due_schedules(now=None, batch_size: Optional[int] = None) -> Tuple[int, List[Tuple[int, float]]]:
+    """
+    Lock a batch of due schedules (SKIP LOCKED, so concurrent schedulers take disjoint
+    batches), create their ScanJobs in bulk and advance next_run_at in the same transaction.
+    Returns (schedules_claimed, [(scan_job_id, dispatch_countdown_seconds)]); jobs are
+    committed by the time this returns, so the caller can dispatch them straight away and
+    then mark_dispatched() them. Jobs lost in between are picked up by redispatch_stranded_jobs.
+    """
+    now = now or timezone.now(); cfg = settings.SCAN_SCHEDULER
+    batch_size = batch_size or cfg['BATCH_SIZE']
+    with transaction.atomic():
+        due = list(
+            ScanSchedule.objects.select_for_update(skip_locked=True)
+            .filter(is_active=True, next_run_at__lte=now)
+            .order_by('next_run_at')[:batch_size]
+        )
+        if not due: return 0, []
+        configs = {c.user_id: c for c in ClientConfiguration.objects.filter(user_id__in={s.user_id for s in due})}
+        jobs = []
+        for s in due:
+            keywords, content_types = _job_params(s, configs.get(s.user_id))
+            if keywords:
+                jobs.append(ScanJob(user_id=s.user_id, platform_id=s.platform_id, job_type='scheduled', status='pending',
+                                    keywords=keywords, content_types=content_types, scan_frequency=s.frequency))
+            s.last_run_at = now
+            s.next_run_at = next_run_after(s, now)
+        ScanJob.objects.bulk_create(jobs, batch_size=500)
+        ScanSchedule.objects.bulk_update(due, ['last_run_at', 'next_run_at'], batch_size=500)
+    jitter = cfg['DISPATCH_JITTER_SECONDS']
+    return len(due), [(j.id, random.uniform(0, jitter) if jitter > 0 else 0) for j in jobs]
+
+
+def mark_dispatched(job_ids: List[int], now=None) -> int:
+    return ScanJob.objects.filter(id__in=job_ids, dispatched_at__isnull=True).update(dispatched_at=now or timezone.now())
+
+
+def redispatch_stranded_jobs(dispatch, now=None, batch_size: Optional[int] = None) -> int:
+    """
+    Publish (via `dispatch(scan_job_id)`) scheduled jobs that were committed but never marked
+    dispatched. Rows are locked SKIP LOCKED and marked in the same transaction, so concurrent
+    schedulers don't publish a job twice; a crash after publishing but before commit can (rarely)
+    run a job twice, which the job's checkpoint and status guards tolerate. Jobs are never lost.
+    """
+    now = now or timezone.now(); cfg = settings.SCAN_SCHEDULER
+    cutoff = now - timedelta(seconds=cfg['REDISPATCH_AFTER_SECONDS'])
+    with transaction.atomic():
+        ids = list(ScanJob.objects.select_for_update(skip_locked=True)
+                   .filter(job_type='scheduled', status='pending', dispatched_at__isnull=True, created_at__lt=cutoff)
+                   .order_by('id').values_list('id', flat=True)[:batch_size or cfg['BATCH_SIZE']])
+        for job_id in ids:
+            dispatch(job_id)
+        mark_dispatched(ids, now)
+    return len(ids)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
-from .models import Platform, ScanJob, ScanSchedule, ScannedContent, PlatformCredential
+from .models import Platform, ScanJob, ScanSchedule, ScannedContent, PlatformCredential, ContentCluster
+from .dedupe import assign_clusters
 import hashlib, json
+from content_protection_platform.common.payload_store import offload_raw_payload, load_raw_payload
 
 class PlatformSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,11 +25,11 @@ class ScanJobSerializer(serializers.ModelSerializer):
         fields = [
             'id','user','platform','platform_name','keywords','content_types','scan_frequency',
             'status','started_at','completed_at','total_items_scanned','error_message',
-            'job_type','created_at'
+            'job_type','checkpoint','created_at'
         ]
         read_only_fields = [
             'id','user','status','started_at','completed_at','total_items_scanned',
-            'error_message','job_type','created_at'
+            'error_message','job_type','checkpoint','created_at'
         ]
 
 class ScanScheduleSerializer(serializers.ModelSerializer):
@@ -40,6 +42,7 @@ class ScannedContentSerializer(serializers.ModelSerializer):
     # Make platform writable so it won't be NULL in DB
     platform = serializers.PrimaryKeyRelatedField(queryset=Platform.objects.all())
     platform_name = serializers.CharField(source='platform.display_name', read_only=True)
+    cluster_size = serializers.IntegerField(source='cluster.member_count', read_only=True, default=None)
 
     class Meta:
         model = ScannedContent
@@ -47,9 +50,9 @@ class ScannedContentSerializer(serializers.ModelSerializer):
             'id','scan_job','platform','platform_name','platform_content_id','content_url',
             'content_type','title','description','author','author_url','published_at',
             'view_count','like_count','share_count','text_content','media_urls','metadata',
-            'content_hash','created_at'
+            'content_hash','cluster','cluster_size','created_at'
         ]
-        read_only_fields = ['id','scan_job','platform_name','created_at']
+        read_only_fields = ['id','scan_job','platform_name','cluster','cluster_size','created_at']
 
     def _auto_hash(self, data: dict) -> str:
         base = "|".join([
@@ -68,6 +71,9 @@ class ScannedContentSerializer(serializers.ModelSerializer):
                 validated_data['metadata'] = json.loads(validated_data['metadata'])
             except Exception:
                 validated_data['metadata'] = {'raw': validated_data['metadata']}
+        # Keep raw payloads out of the hot table
+        if isinstance(validated_data.get('metadata'), dict):
+            validated_data['metadata'] = offload_raw_payload(validated_data['metadata'])
         if isinstance(validated_data.get('media_urls'), str):
             try:
                 validated_data['media_urls'] = json.loads(validated_data['media_urls'])
@@ -84,4 +90,27 @@ class ScannedContentSerializer(serializers.ModelSerializer):
         if not validated_data.get('content_hash'):
             validated_data['content_hash'] = self._auto_hash(validated_data)
 
-        return super().create(validated_data)
+        instance = super().create(validated_data)
+        assign_clusters([instance])
+        return instance
+
+
+class ContentClusterSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ContentCluster
+        fields = ['id','normalized_hash','representative','member_count','first_seen_at','last_seen_at']
+        read_only_fields = fields
+
+
+class ScannedContentDetailSerializer(ScannedContentSerializer):
+    # raw payload lives in the cold payload store; only loaded for single-object views
+    raw_payload = serializers.SerializerMethodField()
+
+    class Meta(ScannedContentSerializer.Meta):
+        fields = ScannedContentSerializer.Meta.fields + ['raw_payload']
+
+    def get_raw_payload(self, obj):
+        try:
+            return load_raw_payload(obj.metadata)
+        except FileNotFoundError:
+            return None
@@ -1,21 +1,61 @@
-import time, hashlib, requests
-from typing import List, Dict, Any, Optional
+import hashlib, logging, requests
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from .models import Platform, ScanJob, ScannedContent, PlatformCredential
+from .dedupe import assign_clusters
+from .pipeline import ScanRecord, PageBoundary, StreamItem, ScanPipeline, hash_stage
+from content_protection_platform.common.ratelimit import get_rate_limiter, credential_key
+from content_protection_platform.common.metrics import timer, DB_WRITE_SECONDS, DB_ROWS_WRITTEN, PLATFORM_FETCH_SECONDS, STAGE_SECONDS
 from users.models import User
 
+logger = logging.getLogger(__name__)
+
 class BasePlatformService:
     def __init__(self, platform_name: str, user: User):
         self.platform_name = platform_name
         self.user = user
         self.platform = Platform.objects.get(name=platform_name)
+        self.keyword_errors: Dict[str, str] = {}  # keywords skipped after a request error, reported on the job
     def _get_credentials(self) -> Optional[PlatformCredential]:
         try: return PlatformCredential.objects.get(user=self.user, platform=self.platform)
         except PlatformCredential.DoesNotExist: return None
+    def _api_secret(self) -> Optional[str]:
+        """The key/token this service actually sends; services using a platform-wide key override this."""
+        cred = self._get_credentials()
+        return cred.access_token if cred else None
+    @property
+    def rate_limiter(self):
+        # shared across workers, one bucket per key actually sent: users on the platform-wide key share its quota
+        if not hasattr(self, '_rate_limiter'):
+            self._rate_limiter = get_rate_limiter(self.platform_name, credential_key(self._api_secret()))
+        return self._rate_limiter
     def _generate_content_hash(self, content: str) -> str:
         return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
-    def scan_content(self, keywords: List[str], content_types: List[str]) -> List[Dict[str, Any]]: raise NotImplementedError
+    def fetch_page(self, keyword: str, content_types: List[str], page_token: Optional[str] = None) -> Tuple[List[ScanRecord], Optional[str]]:
+        """One resumable unit of work: records for `keyword` at `page_token`, plus the next page token (None = last page)."""
+        return [ScanRecord.from_dict(r) for r in self.scan_content([keyword], content_types)], None
+    def iter_content(self, keywords: List[str], content_types: List[str], checkpoint: Optional[Dict[str, Any]] = None) -> Iterator[StreamItem]:
+        """
+        Streaming scan: yields ScanRecords as each page arrives, then a PageBoundary whose cursor
+        ({keyword_index, page_token, pages}) resumes the scan right after that page.
+        Services implement fetch_page() (paged APIs) or scan_content() (everything at once).
+        """
+        cp = checkpoint or {}
+        kw_index = cp.get('keyword_index', 0); page_token = cp.get('page_token'); pages = cp.get('pages', 0)
+        max_pages = settings.SCAN_EXECUTION['MAX_PAGES_PER_KEYWORD']
+        while kw_index < len(keywords):
+            with timer(PLATFORM_FETCH_SECONDS, self.platform_name):
+                records, next_token = self.fetch_page(keywords[kw_index], content_types, page_token)
+            yield from records
+            pages += 1
+            if next_token and pages < max_pages: page_token = next_token
+            else: kw_index += 1; page_token = None; pages = 0
+            yield PageBoundary({'keyword_index':kw_index,'page_token':page_token,'pages':pages})
+    def scan_content(self, keywords: List[str], content_types: List[str]) -> List[Dict[str, Any]]:
+        """Materialising wrapper over iter_content(), for callers that want a plain list."""
+        return [r.as_dict() for r in self.iter_content(keywords, content_types) if isinstance(r, ScanRecord)]
     def report_content(self, content_id: str, reason: str) -> Dict[str, Any]: raise NotImplementedError
 
 class YouTubeService(BasePlatformService):
@@ -23,36 +63,45 @@ class YouTubeService(BasePlatformService):
         super().__init__('youtube', user)
         self.api_key = settings.PLATFORM_APIS.get('YOUTUBE_API_KEY')
         self.base_url = 'https://www.googleapis.com/youtube/v3'
-    def scan_content(self, keywords: List[str], content_types: List[str]) -> List[Dict[str, Any]]:
-        if not self.api_key: return []
-        results = []
-        for keyword in keywords:
-            try:
-                resp = requests.get(f"{self.base_url}/search", params={'part':'snippet','q':keyword,'type':'video','maxResults':10,'key':self.api_key}, timeout=10)
-                resp.raise_for_status(); data = resp.json()
-                for item in data.get('items', []):
-                    results.append({
-                        'platform_content_id': item['id']['videoId'],
-                        'content_url': f"https://www.youtube.com/watch?v={item['id']['videoId']}",
-                        'content_type': 'video',
-                        'title': item['snippet'].get('title',''),
-                        'description': item['snippet'].get('description',''),
-                        'author': item['snippet'].get('channelTitle',''),
-                        'author_url': f"https://www.youtube.com/channel/{item['snippet'].get('channelId','')}",
-                        'published_at': item['snippet'].get('publishedAt'),
-                        'text_content': f"{item['snippet'].get('title','')} {item['snippet'].get('description','')}",
-                        'metadata': {'channel_id': item['snippet'].get('channelId',''), 'thumbnail_url': item['snippet'].get('thumbnails',{}).get('default',{}).get('url',''), 'keyword_matched': keyword}
-                    })
-                time.sleep(0.1)
-            except requests.RequestException:
-                continue
-        return results
+    # quota exhausted or key rejected: every other keyword would fail the same way, so fail the job
+    FATAL_STATUSES = (401, 403, 429)
+    def _api_secret(self) -> Optional[str]: return self.api_key
+    def _search_result(self, item: Dict[str, Any], keyword: str) -> ScanRecord:
+        snippet = item['snippet']
+        return ScanRecord(
+            platform_content_id=item['id']['videoId'],
+            content_url=f"https://www.youtube.com/watch?v={item['id']['videoId']}",
+            content_type='video',
+            title=snippet.get('title',''),
+            description=snippet.get('description',''),
+            author=snippet.get('channelTitle',''),
+            author_url=f"https://www.youtube.com/channel/{snippet.get('channelId','')}",
+            published_at=snippet.get('publishedAt'),
+            text_content=f"{snippet.get('title','')} {snippet.get('description','')}",
+            metadata={'channel_id': snippet.get('channelId',''), 'thumbnail_url': snippet.get('thumbnails',{}).get('default',{}).get('url',''), 'keyword_matched': keyword}
+        )
+    def fetch_page(self, keyword: str, content_types: List[str], page_token: Optional[str] = None) -> Tuple[List[ScanRecord], Optional[str]]:
+        if not self.api_key: return [], None
+        params = {'part':'snippet','q':keyword,'type':'video','maxResults':10,'key':self.api_key}
+        if page_token: params['pageToken'] = page_token
+        self.rate_limiter.acquire()
+        try:
+            resp = requests.get(f"{self.base_url}/search", params=params, timeout=10)
+            resp.raise_for_status(); data = resp.json()
+        except requests.RequestException as e:
+            if getattr(e.response, 'status_code', None) in self.FATAL_STATUSES: raise
+            # one bad keyword/page must not lose the rest of the scan: skip to the next keyword
+            logger.warning("YouTube search for %r failed, skipping keyword: %s", keyword, e)
+            self.keyword_errors[keyword] = str(e)
+            return [], None
+        return [self._search_result(item, keyword) for item in data.get('items', [])], data.get('nextPageToken')
 
 class FacebookService(BasePlatformService):
     def __init__(self, user: User):
         super().__init__('facebook', user)
         self.access_token = settings.PLATFORM_APIS.get('FACEBOOK_ACCESS_TOKEN')
         self.base_url = 'https://graph.facebook.com/v19.0'
+    def _api_secret(self) -> Optional[str]: return self.access_token
     def scan_content(self, keywords: List[str], content_types: List[str]) -> List[Dict[str, Any]]:
         return []  # integrate with Rights Manager or approved endpoints
 
@@ -60,6 +109,7 @@ class InstagramService(BasePlatformService):
     def __init__(self, user: User):
         super().__init__('instagram', user)
         self.access_token = settings.PLATFORM_APIS.get('INSTAGRAM_ACCESS_TOKEN')
+    def _api_secret(self) -> Optional[str]: return self.access_token
     def scan_content(self, keywords: List[str], content_types: List[str]) -> List[Dict[str, Any]]:
         return []
 
@@ -68,30 +118,87 @@ class TelegramService(BasePlatformService):
         super().__init__('telegram', user)
         self.bot_token = settings.PLATFORM_APIS.get('TELEGRAM_BOT_TOKEN')
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}" if self.bot_token else ''
+    def _api_secret(self) -> Optional[str]: return self.bot_token
     def scan_content(self, keywords: List[str], content_types: List[str]) -> List[Dict[str, Any]]:
-        return []
+        return []  # the Bot API cannot search; channel scans go through telegram_mtproto.scan_channel
 
 class PlatformServiceFactory:
     @staticmethod
     def get(platform_name: str, user: User) -> BasePlatformService:
         m={'youtube':YouTubeService,'facebook':FacebookService,'instagram':InstagramService,'telegram':TelegramService}
+        if platform_name=='loadtest' and settings.LOAD_TEST['FAKE_PLATFORM']:
+            from .loadtest import FakePlatformService
+            return FakePlatformService(user)
         if platform_name not in m: raise ValueError(f"Unsupported platform: {platform_name}")
         return m[platform_name](user)
 
+class ScanJobSink:
+    """
+    ScanPipeline sink for a ScanJob: each batch is committed together with the job's
+    checkpoint and running total. Records re-fetched after a resume are skipped.
+    on_batch_committed(ids) is called once each batch is durable (and clustered); a publish lost
+    to a crash after the commit is picked up by the end-of-scan detection sweep.
+    """
+    def __init__(self, scan_job: ScanJob, total: int = 0, on_batch_committed: Optional[Callable[[List[int]], Any]] = None):
+        self.scan_job = scan_job; self.total = total; self.on_batch_committed = on_batch_committed
+    def _object(self, r: ScanRecord) -> ScannedContent:
+        return ScannedContent(scan_job=self.scan_job, platform=self.scan_job.platform, platform_content_id=r.platform_content_id, content_url=r.content_url, content_type=r.content_type, title=r.title, description=r.description, author=r.author, author_url=r.author_url, published_at=r.published_at, view_count=r.view_count, like_count=r.like_count, share_count=r.share_count, text_content=r.text_content, media_urls=r.media_urls, metadata=r.metadata, content_hash=r.content_hash)
+    def write(self, records: List[ScanRecord], cursor: Optional[Dict[str, Any]]) -> int:
+        seen = set(ScannedContent.objects.filter(scan_job=self.scan_job, platform_content_id__in=[r.platform_content_id for r in records]).values_list('platform_content_id', flat=True))
+        objs = []
+        for r in records:
+            if r.platform_content_id in seen: continue
+            seen.add(r.platform_content_id); objs.append(self._object(r))
+        with transaction.atomic():
+            with timer(DB_WRITE_SECONDS, 'scanned_content'):
+                # no ignore_conflicts: the created rows come back with primary keys for clustering
+                if objs: ScannedContent.objects.bulk_create(objs)
+                self.total += len(objs)
+                self.checkpoint(cursor)
+            if objs:
+                # same transaction as the rows and checkpoint: a resumed scan never finds unclustered rows
+                with timer(STAGE_SECONDS, 'cluster'): assign_clusters(objs)
+                if self.on_batch_committed:
+                    ids = [o.pk for o in objs]
+                    transaction.on_commit(lambda: self.on_batch_committed(ids))
+        DB_ROWS_WRITTEN.labels('scanned_content').inc(len(objs))
+        return len(objs)
+    def checkpoint(self, cursor: Optional[Dict[str, Any]]):
+        fields = {'total_items_scanned': self.total, 'updated_at': timezone.now()}
+        if cursor is not None: fields['checkpoint'] = cursor
+        ScanJob.objects.filter(pk=self.scan_job.pk).update(**fields)
+
 class ScanJobManager:
+    """
+    Streams a scan through ScanPipeline: records flow from service.iter_content() through
+    hashing into batched commits, each carrying the job's checkpoint, so memory stays bounded
+    by the batch size and a retried task resumes after the last committed page.
+    Cancellation (status='cancelled') is honoured between pages. `on_batch_committed`
+    receives the ids of every committed batch, so detection can start mid-scan.
+    """
     def __init__(self, user: User): self.user=user
-    def execute_scan_job(self, scan_job: ScanJob):
-        scan_job.status='running'; scan_job.started_at=timezone.now(); scan_job.save(update_fields=['status','started_at'])
+    def _is_cancelled(self, scan_job: ScanJob) -> bool:
+        return ScanJob.objects.filter(pk=scan_job.pk, status='cancelled').exists()
+    def execute_scan_job(self, scan_job: ScanJob, on_batch_committed: Optional[Callable[[List[int]], Any]] = None):
+        scan_job.refresh_from_db(fields=['status','checkpoint','total_items_scanned','started_at'])
+        if scan_job.status in ('completed','cancelled'):
+            return {'status':scan_job.status,'items_found':scan_job.total_items_scanned}
+        sink = ScanJobSink(scan_job, scan_job.total_items_scanned or 0, on_batch_committed)
+        scan_job.status='running'; scan_job.started_at=scan_job.started_at or timezone.now(); scan_job.error_message=None
+        scan_job.save(update_fields=['status','started_at','error_message'])
         try:
             service = PlatformServiceFactory.get(scan_job.platform.name, scan_job.user)
-            results = service.scan_content(scan_job.keywords, scan_job.content_types)
-            objs=[]; 
-            for r in results:
-                content_hash = service._generate_content_hash(r.get('text_content',''))
-                objs.append(ScannedContent(scan_job=scan_job, platform=scan_job.platform, platform_content_id=r['platform_content_id'], content_url=r['content_url'], content_type=r['content_type'], title=r.get('title',''), description=r.get('description',''), author=r.get('author',''), author_url=r.get('author_url',''), published_at=r.get('published_at'), view_count=r.get('view_count'), like_count=r.get('like_count'), share_count=r.get('share_count'), text_content=r.get('text_content',''), media_urls=r.get('media_urls',[]), metadata=r.get('metadata',{}), content_hash=content_hash))
-            if objs: ScannedContent.objects.bulk_create(objs, ignore_conflicts=True)
-            scan_job.status='completed'; scan_job.completed_at=timezone.now(); scan_job.total_items_scanned=len(objs); scan_job.save(update_fields=['status','completed_at','total_items_scanned'])
-            return {'status':'success','items_found':len(objs)}
+            records = service.iter_content(scan_job.keywords or [], scan_job.content_types, scan_job.checkpoint or None)
+            records = hash_stage(records, lambda r: service._generate_content_hash(r.text_content))
+            stats = ScanPipeline(sink, settings.SCAN_EXECUTION['PERSIST_BATCH_SIZE'], lambda: self._is_cancelled(scan_job)).run(records)
+            if stats['cancelled']:
+                return {'status':'cancelled','items_found':sink.total}
+            skipped = '; '.join(f"{k}: {e}" for k, e in service.keyword_errors.items()) or None
+            # don't overwrite a cancellation that arrived during the last page
+            ScanJob.objects.filter(pk=scan_job.pk, status='running').update(status='completed', completed_at=timezone.now(), total_items_scanned=sink.total, error_message=skipped and f"Skipped keywords - {skipped}")
+            scan_job.refresh_from_db(fields=['status','completed_at','total_items_scanned'])
+            return {'status':'success' if scan_job.status=='completed' else scan_job.status,'items_found':sink.total}
         except Exception as e:
-            scan_job.status='failed'; scan_job.error_message=str(e); scan_job.completed_at=timezone.now(); scan_job.save(update_fields=['status','error_message','completed_at'])
-            return {'status':'error','error':str(e)}
+            # keep the checkpoint: a retry resumes from the last committed page
+            ScanJob.objects.filter(pk=scan_job.pk, status='running').update(status='failed', error_message=str(e), completed_at=timezone.now())
+            return {'status':'error','error':str(e),'items_found':sink.total}
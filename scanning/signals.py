@@ -0,0 +1,37 @@
+import threading
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import ContentCluster, ScannedContent
+
+# Cluster sizes follow deletions (retention cleanup, load-test cleanup, cascades). The clusters
+# touched are collected and recounted after commit, one UPDATE per 1000 clusters; recounting
+# (rather than decrementing) keeps a rolled-back delete from skewing the sizes.
+_pending = threading.local()
+
+
+def recount_clusters(cluster_ids):
+    members = (ScannedContent.objects.filter(cluster_id=OuterRef('pk')).order_by()
+               .values('cluster_id').annotate(n=Count('id')).values('n'))
+    ids = list(cluster_ids)
+    for i in range(0, len(ids), 1000):
+        ContentCluster.objects.filter(pk__in=ids[i:i + 1000]).update(
+            member_count=Coalesce(Subquery(members, output_field=IntegerField()), Value(0)))
+
+
+def _flush():
+    ids = getattr(_pending, 'ids', None); _pending.ids = None
+    if ids:
+        recount_clusters(ids)
+
+
+@receiver(post_delete, sender=ScannedContent)
+def scanned_content_deleted(sender, instance, **kwargs):
+    if not instance.cluster_id:
+        return
+    if getattr(_pending, 'ids', None) is None:
+        _pending.ids = set()
+    _pending.ids.add(instance.cluster_id)
+    transaction.on_commit(_flush)  # later callbacks of the same commit find nothing left to do
@@ -4,34 +4,95 @@ from django.core.mail import send_mail
 from django.conf import settings
 from .models import ScanJob, ScanSchedule, ScannedContent
 from .services import ScanJobManager
-from users.models import ActivityLog
+from users.activity import log_activity
+from detection.catalog import catalog_version
 from detection.models import DetectionJob
 from detection.services import ContentDetectionManager
-import logging
+import logging, time
 logger=logging.getLogger(__name__)
 
+def scan_job_priority(job_type):
+    return settings.SCAN_JOB_PRIORITIES.get(job_type, settings.CELERY_TASK_DEFAULT_PRIORITY)
+
+def dispatch_scan_job(scan_job, countdown=None):
+    return execute_scan_job_task.apply_async((scan_job.id,), countdown=countdown, priority=scan_job_priority(scan_job.job_type))
+
+def detection_queue_for(content):
+    return settings.DETECTION_QUEUES.get(content.content_type, 'detect-cpu')
+
 @shared_task(bind=True, max_retries=3)
 def execute_scan_job_task(self, scan_job_id):
     try:
         scan_job=ScanJob.objects.get(id=scan_job_id)
-        manager=ScanJobManager(scan_job.user)
-        result=manager.execute_scan_job(scan_job)
-        if result['status']=='success' and result.get('items_found',0)>0:
-            trigger_content_detection_task.delay(scan_job_id)
-        ActivityLog.objects.create(user=scan_job.user, action='scan_completed', description=f"Scan on {scan_job.platform.display_name} status: {result['status']}")
+        manager=ScanJobManager(scan_job.user); priority=scan_job_priority(scan_job.job_type)
+        # each committed batch is handed to detection straight away instead of after the whole scan
+        publish=lambda ids: detect_scanned_batch_task.apply_async((scan_job_id, ids), priority=priority)
+        result=manager.execute_scan_job(scan_job, on_batch_committed=publish)
+        if result['status'] in ('success','cancelled'):
+            # catches batches whose publish was lost; delayed so the last batch tasks run first
+            trigger_content_detection_task.apply_async((scan_job_id,), countdown=settings.SCAN_EXECUTION['DETECTION_SWEEP_DELAY'], priority=priority)
+        log_activity(scan_job.user, 'scan_completed', f"Scan on {scan_job.platform.display_name} status: {result['status']}")
     except Exception as exc:
         logger.error(f"Error executing scan job {scan_job_id}: {exc}"); raise self.retry(exc=exc, countdown=60)
+    if result['status']=='error':
+        # the job keeps its checkpoint, so the retry resumes after the last committed page
+        logger.error(f"Scan job {scan_job_id} failed: {result.get('error')}")
+        raise self.retry(countdown=60)
+    return result
+
+def dispatch_detection(user, scanned_items, priority=None):
+    """
+    Queue detection for scanned items, once per duplicate cluster.
+    Items of a cluster that was already detected for this user against the current
+    catalog get the existing matches copied over; clusters with a detection in flight
+    are skipped (the representative's job fans out to every member when it finishes).
+    A cluster detected before the user's protected content changed is detected again.
+    """
+    threshold=getattr(getattr(user,'configuration',None),'similarity_threshold',0.8)
+    singles=[]; clusters={}
+    for content in scanned_items:
+        if content.cluster_id: clusters.setdefault(content.cluster_id, []).append(content)
+        else: singles.append(content)
+    # a retried batch or the end-of-scan sweep must not queue an unclustered item twice
+    detected=set(DetectionJob.objects.filter(user=user, scanned_content__in=[c.pk for c in singles], status__in=['pending','processing','completed']).values_list('scanned_content_id', flat=True)) if singles else set()
+    singles=[c for c in singles if c.pk not in detected]
+    existing={}
+    # newest first: a re-detection supersedes the job it replaced
+    for dj in DetectionJob.objects.filter(user=user, scanned_content__cluster_id__in=list(clusters), status__in=['pending','processing','completed']).select_related('scanned_content').order_by('-id'):
+        existing.setdefault(dj.scanned_content.cluster_id, dj)
+    manager=ContentDetectionManager(user); queued=0; current=catalog_version(user.id) if existing else None
+    for cluster_id, members in clusters.items():
+        dj=existing.get(cluster_id)
+        if dj is None or (dj.status=='completed' and dj.catalog_version!=current): singles.append(members[0])
+        elif dj.status=='completed': manager.fan_out_cluster_matches(dj, [m for m in members if m.pk!=dj.scanned_content_id])
+    for content in singles:
+        dj=DetectionJob.objects.create(user=user, scanned_content=content, detection_types=['text','image','video'], similarity_threshold=threshold)
+        execute_detection_job_task.apply_async((dj.id,), queue=detection_queue_for(content), priority=priority); queued+=1
+    return queued
 
 @shared_task(bind=True, max_retries=3)
 def trigger_content_detection_task(self, scan_job_id):
+    """
+    End-of-scan sweep: dispatches the job's scanned items that have no DetectionJob of their own
+    (a batch whose publish was lost to a crash after its commit). Cluster members are passed
+    too; dispatch_detection fans matches out to them or skips them while detection is in flight.
+    """
     try:
-        scan_job=ScanJob.objects.get(id=scan_job_id)
-        scanned_qs=ScannedContent.objects.filter(scan_job=scan_job)
-        for content in scanned_qs:
-            dj=DetectionJob.objects.create(user=scan_job.user, scanned_content=content, detection_types=['text','image','video'], similarity_threshold=getattr(getattr(scan_job.user,'configuration',None),'similarity_threshold',0.8))
-            execute_detection_job_task.delay(dj.id)
+        scan_job=ScanJob.objects.select_related('user').get(id=scan_job_id)
+        scanned_qs=ScannedContent.objects.filter(scan_job=scan_job, detection_jobs__isnull=True).only('id','cluster_id','content_type')
+        return {'queued':dispatch_detection(scan_job.user, scanned_qs, priority=scan_job_priority(scan_job.job_type))}
     except Exception as exc:
-        logger.error(f"Error triggering detection for scan job {scan_job_id}: {exc}")
+        logger.error(f"Error triggering detection for scan job {scan_job_id}: {exc}"); raise self.retry(exc=exc, countdown=60)
+
+@shared_task(bind=True, max_retries=3)
+def detect_scanned_batch_task(self, scan_job_id, scanned_content_ids):
+    """Detection for one committed scan batch (published by execute_scan_job_task while the scan runs)."""
+    try:
+        scan_job=ScanJob.objects.select_related('user').get(id=scan_job_id)
+        scanned_qs=ScannedContent.objects.filter(id__in=scanned_content_ids).only('id','cluster_id','content_type')
+        return {'queued':dispatch_detection(scan_job.user, scanned_qs, priority=scan_job_priority(scan_job.job_type))}
+    except Exception as exc:
+        logger.error(f"Error dispatching detection batch for scan job {scan_job_id}: {exc}"); raise self.retry(exc=exc, countdown=30)
 
 @shared_task(bind=True, max_retries=3)
 def execute_detection_job_task(self, detection_job_id):
@@ -42,14 +103,56 @@ def execute_detection_job_task(self, detection_job_id):
     except Exception as exc:
         logger.error(f"Error executing detection job {detection_job_id}: {exc}"); raise self.retry(exc=exc, countdown=60)
 
+@shared_task
+def dispatch_due_schedules():
+    """Beat-driven: turn due ScanSchedules into ScanJobs. Safe to run on several nodes at once."""
+    from .scheduler import seed_unscheduled, claim_due_schedules, mark_dispatched, redispatch_stranded_jobs
+    priority=scan_job_priority('scheduled')
+    redispatched=redispatch_stranded_jobs(lambda job_id: execute_scan_job_task.apply_async((job_id,), priority=priority))
+    seeded=seed_unscheduled(); claimed_total=0; dispatched=0
+    while True:
+        claimed, jobs=claim_due_schedules()
+        if not claimed: break
+        claimed_total+=claimed
+        for job_id, countdown in jobs:
+            execute_scan_job_task.apply_async((job_id,), countdown=countdown, priority=priority); dispatched+=1
+        mark_dispatched([job_id for job_id, _ in jobs])
+    return {'status':'ok','seeded':seeded,'schedules_run':claimed_total,'dispatched':dispatched,'redispatched':redispatched}
+
 @shared_task
 def cleanup_old_scan_data():
     from datetime import timedelta
     cutoff=timezone.now()-timedelta(days=90)
     ScannedContent.objects.filter(created_at__lt=cutoff).delete()
-    return {'status':'ok','cutoff':cutoff.isoformat()}
+    # payloads are content-addressed and shared between rows: keep every digest still referenced
+    from content_protection_platform.common.payload_store import PayloadStore
+    live=set(ScannedContent.objects.filter(metadata__has_key='raw_ref').values_list('metadata__raw_ref__sha256', flat=True).iterator(chunk_size=5000))
+    payloads=PayloadStore().sweep(live, settings.PAYLOAD_STORE['SWEEP_GRACE_SECONDS'])
+    return {'status':'ok','cutoff':cutoff.isoformat(),'payloads':payloads}
 
 @shared_task
-def generate_weekly_report(): return {'status':'ok'}
+def generate_weekly_report():
+    """Fan the weekly per-user report out in chunks; each chunk aggregates, renders and mails its users."""
+    from reporting.weekly import report_window, recipient_ids
+    from reporting.tasks import send_weekly_reports_task
+    start,end=report_window(); ids=recipient_ids(); size=settings.WEEKLY_REPORT['CHUNK_SIZE']
+    for i in range(0,len(ids),size):
+        send_weekly_reports_task.delay(ids[i:i+size], start.isoformat(), end.isoformat())
+    return {'status':'ok','users':len(ids),'chunks':-(-len(ids)//size)}
+@shared_task
+def health_check():
+    from content_protection_platform.common.ratelimit import limiter_stats
+    return {'status':'healthy','timestamp': timezone.now().isoformat(),'rate_limits':limiter_stats()}
+
+# -------- load-test helpers (see `manage.py queue_latency_probe`) --------------
+@shared_task
+def latency_probe(sent_at):
+    """Returns seconds between enqueue and execution (queue wait + pickup)."""
+    return time.time()-sent_at
+
 @shared_task
-def health_check(): return {'status':'healthy','timestamp': timezone.now().isoformat()}
+def synthetic_load(seconds=0.05):
+    """Burns CPU for `seconds` to simulate a detection backlog."""
+    end=time.perf_counter()+seconds
+    while time.perf_counter()<end: pass
+    return seconds
@@ -1,10 +1,8 @@
-import asyncio
 import hashlib
-import re
-from typing import Iterable, Optional, List, Dict, Union
-from urllib.parse import urlparse
+from typing import AsyncIterator, Iterable, Optional, List, Union
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from telethon import TelegramClient, functions
@@ -12,50 +10,13 @@ from telethon.errors import UserAlreadyParticipantError
 from telethon.tl.types import Message
 
 from .models import Platform, ScannedContent
+from .dedupe import assign_clusters
+from .filters import is_suspicious
+from .pipeline import ScanRecord, ScanPipeline, filter_stage, hash_stage, iterate_async
+from content_protection_platform.common.ratelimit import get_rate_limiter
+from content_protection_platform.common.metrics import timer, DB_WRITE_SECONDS, DB_ROWS_WRITTEN, STAGE_SECONDS
 
-# -------- text/link helpers ---------------------------------------------------
-_LINK_RE = re.compile(r"(https?://\S+|t\.me/\S+|tg://\S+)", re.IGNORECASE)
-
-def _extract_links(text: str) -> List[str]:
-    if not text:
-        return []
-    return _LINK_RE.findall(text)
-
-def _is_suspicious(text: str,
-                   keywords: Optional[Iterable[str]],
-                   allow_domains: Optional[Iterable[str]]) -> bool:
-    if not text:
-        return False
-
-    # If keywords were provided, use them (case-insensitive)
-    if keywords:
-        t = text.lower()
-        return any(str(k).lower() in t for k in keywords)
-
-    # Otherwise: suspicious == contains a link not on the allow-list (or any link if no allow-list)
-    links = _extract_links(text)
-    if not links:
-        return False
-    if not allow_domains:
-        return True
-
-    allow = [d.lower().strip() for d in allow_domains if d]
-    for raw in links:
-        # t.me / tg:// special-cases
-        if raw.lower().startswith(("t.me/", "http://t.me/", "https://t.me/", "tg://")):
-            host = "t.me"
-        else:
-            try:
-                host = urlparse(raw).netloc.lower()
-            except Exception:
-                host = ""
-
-        if not any(host.endswith(ad) for ad in allow):
-            # found a link NOT on the allow-list -> suspicious
-            return True
-
-    return False
-
+# -------- message helpers -----------------------------------------------------
 def _author_from(msg: Message) -> Optional[str]:
     try:
         if msg.sender and getattr(msg.sender, "username", None):
@@ -138,10 +99,8 @@ async def _resolve_entity(client: TelegramClient, channel_ref: Union[str, int],
     return await client.get_entity(channel_ref)
 
 # -------- async fetch (NO ORM here) ------------------------------------------
-async def _collect_messages_async(channel: Union[str, int],
-                                  keywords: Optional[Iterable[str]],
-                                  limit: int,
-                                  allow_domains: Optional[Iterable[str]]) -> List[Dict]:
+async def _iter_messages_async(channel: Union[str, int], limit: int) -> AsyncIterator[ScanRecord]:
+    """Yield every message of `channel` (newest first) as a ScanRecord; filtering is a pipeline stage."""
     cfg = settings.TELEGRAM
     api_id = int(cfg["API_ID"])
     api_hash = cfg["API_HASH"]
@@ -150,6 +109,8 @@ async def _collect_messages_async(channel: Union[str, int],
     prefer_bot = bool(bot_token)  # default to bot if available
 
     client = TelegramClient(session_file, api_id, api_hash)
+    # one quota per Telegram app/session, shared by every worker using it
+    limiter = get_rate_limiter("telegram", f"{api_id}:{'bot' if prefer_bot else 'user'}")
 
     # Start client
     if prefer_bot:
@@ -160,95 +121,107 @@ async def _collect_messages_async(channel: Union[str, int],
         await client.start()
         use_bot = False
 
-    # Parse/resolve
-    ref = _parse_channel_ref(channel)
     try:
-        entity = await _resolve_entity(client, ref, use_bot)
-    except Exception as e:
-        await client.disconnect()
-        if isinstance(ref, str) and ("t.me/+" in ref or "joinchat" in ref) and prefer_bot:
-            raise RuntimeError(
-                "Bots cannot join invite links. Pass the numeric chat id (-100...) "
-                "or @username for channels where the bot is already a member."
-            ) from e
-        raise RuntimeError(f"Could not access channel '{channel}': {e}") from e
-
-    # Iterate
-    items: List[Dict] = []
-    async for msg in client.iter_messages(entity, limit=limit):
-        text = (getattr(msg, "message", "") or "").strip()
-        if not _is_suspicious(text, keywords, allow_domains):
-            continue
-
-        platform_content_id = f"{getattr(entity, 'id', 'unknown')}:{msg.id}"
-        url = _message_url(entity, msg) or "https://t.me"
-        author = _author_from(msg)
-        published_at = msg.date or timezone.now()
-
-        items.append(
-            dict(
+        # Parse/resolve
+        ref = _parse_channel_ref(channel)
+        try:
+            await limiter.aacquire()
+            entity = await _resolve_entity(client, ref, use_bot)
+        except Exception as e:
+            if isinstance(ref, str) and ("t.me/+" in ref or "joinchat" in ref) and prefer_bot:
+                raise RuntimeError(
+                    "Bots cannot join invite links. Pass the numeric chat id (-100...) "
+                    "or @username for channels where the bot is already a member."
+                ) from e
+            raise RuntimeError(f"Could not access channel '{channel}': {e}") from e
+
+        # Iterate
+        seen = 0
+        async for msg in client.iter_messages(entity, limit=limit):
+            # iter_messages fetches history in pages of 100: charge one request per page
+            if seen % 100 == 0:
+                await limiter.aacquire()
+            seen += 1
+            platform_content_id = f"{getattr(entity, 'id', 'unknown')}:{msg.id}"
+            yield ScanRecord(
                 platform_content_id=platform_content_id,
-                content_url=url,
-                author=author,
-                text=text,
-                published_at=published_at,
+                content_url=_message_url(entity, msg) or "https://t.me",
+                content_type="text",
+                title=f"Telegram message {msg.id}",
+                author=_author_from(msg),
+                published_at=msg.date or timezone.now(),
+                text_content=(getattr(msg, "message", "") or "").strip(),
             )
-        )
-
-    await client.disconnect()
-    return items
+    finally:
+        await client.disconnect()
 
-# -------- public sync wrapper (does ORM only) --------------------------------
+# -------- sync persistence (ORM only) -----------------------------------------
+class _UpsertSink:
+    """ScanPipeline sink keyed by (platform, platform_content_id): new messages are inserted, known ones refreshed."""
+    UPDATE_FIELDS = ["content_url", "author", "published_at", "text_content", "metadata", "content_hash"]
+
+    def __init__(self, platform: Platform, metadata: dict):
+        self.platform = platform
+        self.metadata = metadata
+
+    def write(self, records: List[ScanRecord], cursor) -> int:
+        by_id = {r.platform_content_id: r for r in records}  # last one wins within a batch
+        existing = {o.platform_content_id: o for o in ScannedContent.objects.filter(
+            platform=self.platform, platform_content_id__in=list(by_id))}
+        new, changed = [], []
+        for pcid, r in by_id.items():
+            obj = existing.get(pcid)
+            if obj is None:
+                new.append(ScannedContent(
+                    scan_job=None, platform=self.platform, platform_content_id=pcid,
+                    content_url=r.content_url, content_type=r.content_type, title=r.title,
+                    description=None, author=r.author, author_url=None, published_at=r.published_at,
+                    text_content=r.text_content, media_urls=[], metadata=self.metadata,
+                    content_hash=r.content_hash,
+                ))
+                continue
+            obj.content_url = r.content_url; obj.author = r.author; obj.published_at = r.published_at
+            obj.text_content = r.text_content; obj.metadata = self.metadata; obj.content_hash = r.content_hash
+            changed.append(obj)
+        with timer(DB_WRITE_SECONDS, 'scanned_content'), transaction.atomic():
+            if new:
+                ScannedContent.objects.bulk_create(new)
+            if changed:
+                ScannedContent.objects.bulk_update(changed, self.UPDATE_FIELDS)
+        DB_ROWS_WRITTEN.labels('scanned_content').inc(len(new) + len(changed))
+        with timer(STAGE_SECONDS, 'cluster'):
+            assign_clusters(new + changed)
+        return len(new)
+
+    def checkpoint(self, cursor):
+        pass  # channel scans are short and idempotent; nothing to resume
+
+
+def _message_hash(r: ScanRecord) -> str:
+    return hashlib.sha256(f"{r.platform_content_id}|{r.text_content}".encode("utf-8")).hexdigest()
+
+# -------- public sync entry point ---------------------------------------------
 def scan_channel(channel: Union[str, int],
                  keywords: Optional[Iterable[str]] = None,
                  limit: int = 50,
-                 allow_domains: Optional[Iterable[str]] = None) -> int:
+                 allow_domains: Optional[Iterable[str]] = None,
+                 batch_size: int = 200) -> int:
     """
-    Fetch from Telegram (async), then persist to DB (sync).
+    Stream messages from Telegram (async generator driven from sync code) through the
+    suspicious-filter and hashing stages into batched upserts. Returns the number of new rows.
     - keywords: if provided, match by keywords (case-insensitive).
     - allow_domains: if provided (and no keywords), only links NOT on this allow-list are saved.
     """
-    items = asyncio.run(_collect_messages_async(channel, keywords, limit, allow_domains))
+    keywords = list(keywords) if keywords else None
+    allow_domains = list(allow_domains) if allow_domains else None
 
     plat, _ = Platform.objects.get_or_create(
         name="telegram",
         defaults={"display_name": "Telegram", "base_url": "https://t.me", "is_active": True},
     )
 
-    created = 0
-    for it in items:
-        content_hash = hashlib.sha256(
-            f"{it['platform_content_id']}|{it['text']}".encode("utf-8")
-        ).hexdigest()
-
-        defaults = dict(
-            scan_job=None,
-            platform=plat,
-            content_url=it["content_url"],
-            content_type="text",
-            title=f"Telegram message {it['platform_content_id'].split(':')[-1]}",
-            description=None,
-            author=it["author"],
-            author_url=None,
-            published_at=it["published_at"],
-            view_count=None,
-            like_count=None,
-            share_count=None,
-            text_content=it["text"],
-            media_urls=[],
-            metadata={
-                "keywords": list(keywords) if keywords else None,
-                "allow_domains": list(allow_domains) if allow_domains else None,
-            },
-            content_hash=content_hash,
-        )
-
-        _, was_created = ScannedContent.objects.update_or_create(
-            platform=plat,
-            platform_content_id=it["platform_content_id"],
-            defaults=defaults,
-        )
-        if was_created:
-            created += 1
-
-    return created
+    records = iterate_async(_iter_messages_async(channel, limit))
+    records = filter_stage(records, lambda r: is_suspicious(r.text_content, keywords, allow_domains))
+    records = hash_stage(records, _message_hash)
+    sink = _UpsertSink(plat, {"keywords": keywords, "allow_domains": allow_domains})
+    return ScanPipeline(sink, batch_size).run(records)["stored"]
@@ -0,0 +1,254 @@
+import asyncio, json, tempfile, threading
+from datetime import timedelta
+import requests
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from content_protection_platform.common import ratelimit
+from content_protection_platform.common.payload_store import PayloadStore, load_raw_payload, offload_raw_payload
+from content_protection_platform.common.metrics import RATE_LIMIT_ACQUIRED, RATE_LIMIT_REJECTED, RATE_LIMIT_WAIT_SECONDS
+from content_protection_platform.common.ratelimit import RateLimited, RateLimiter, credential_key
+from detection.models import DetectionJob
+from scanning import tasks
+from scanning.models import ContentCluster, Platform, PlatformCredential, ScanJob, ScannedContent
+from scanning.pipeline import PageBoundary, ScanPipeline, ScanRecord, filter_stage, hash_stage
+from scanning.services import ScanJobSink, YouTubeService
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+class RedisRateLimiterTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+
+    def limiter(self, key='ratelimit:test:a', **kw):
+        return RateLimiter(key, rate=1, period=60, burst=3, client=self.redis, backend='redis', scope='test', **kw)
+
+    def test_burst_then_reject(self):
+        limiter = self.limiter()
+        self.assertEqual([limiter.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        retry_after = limiter.try_acquire()
+        self.assertGreater(retry_after, 0); self.assertLessEqual(retry_after, 60)
+        self.assertTrue(self.redis.exists('ratelimit:test:a'))
+
+    def test_bucket_is_shared_between_limiters_on_one_key(self):
+        a, b = self.limiter(), self.limiter()  # two workers, same Redis key
+        for _ in range(3):
+            a.try_acquire()
+        self.assertGreater(b.try_acquire(), 0)
+        self.assertEqual(self.limiter('ratelimit:test:b').try_acquire(), 0.0)
+
+    def test_acquire_exports_metrics(self):
+        acquired = RATE_LIMIT_ACQUIRED.labels('test').value; rejected = RATE_LIMIT_REJECTED.labels('test').value
+        observed = sum(RATE_LIMIT_WAIT_SECONDS.labels('test').sample()[0])
+        limiter = self.limiter()
+        for _ in range(3):
+            limiter.acquire(timeout=0)
+        with self.assertRaises(RateLimited):
+            limiter.acquire(timeout=0)
+        self.assertEqual(RATE_LIMIT_ACQUIRED.labels('test').value - acquired, 3)
+        self.assertEqual(RATE_LIMIT_REJECTED.labels('test').value - rejected, 1)
+        self.assertEqual(sum(RATE_LIMIT_WAIT_SECONDS.labels('test').sample()[0]) - observed, 3)
+        self.assertGreaterEqual(ratelimit.limiter_stats()['ratelimit:test:a']['rejected'], 1)
+
+    def test_aacquire_checks_off_the_event_loop(self):
+        limiter = self.limiter(); threads = []
+        check = limiter.try_acquire
+        limiter.try_acquire = lambda: threads.append(threading.get_ident()) or check()
+        for _ in range(3):
+            asyncio.run(limiter.aacquire(timeout=0))
+        with self.assertRaises(RateLimited):
+            asyncio.run(limiter.aacquire(timeout=0))
+        self.assertEqual(len(threads), 4); self.assertNotIn(threading.get_ident(), threads)
+
+
+class LocalRateLimiterTests(SimpleTestCase):
+    def test_falls_back_to_a_local_bucket_when_redis_is_down(self):
+        broken = mock.Mock(register_script=mock.Mock(side_effect=ConnectionError('refused')))
+        limiter = RateLimiter('ratelimit:test:local', rate=1, period=60, burst=2, client=broken, backend='redis', scope='test')
+        with self.assertLogs('content_protection_platform.common.ratelimit', 'WARNING'):
+            self.assertEqual([limiter.try_acquire(), limiter.try_acquire()], [0.0, 0.0])
+            self.assertGreater(limiter.try_acquire(), 59)
+
+
+@override_settings(PLATFORM_APIS={'YOUTUBE_API_KEY': 'shared-key'})
+class PlatformLimiterKeyTests(TestCase):
+    def setUp(self):
+        ratelimit._limiters.clear(); self.addCleanup(ratelimit._limiters.clear)
+        self.platform = Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})[0]
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+
+    def test_users_on_the_platform_key_share_its_bucket(self):
+        # a stored per-user credential must not split the quota of the key actually sent
+        PlatformCredential.objects.create(user=self.alice, platform=self.platform, access_token='unused')
+        a, b = YouTubeService(self.alice).rate_limiter, YouTubeService(self.bob).rate_limiter
+        self.assertIs(a, b)
+        self.assertEqual(a.key, f"ratelimit:youtube:{credential_key('shared-key')}")
+        self.assertNotIn('shared-key', a.key)
+
+
+@override_settings(PLATFORM_APIS={'YOUTUBE_API_KEY': 'k'})
+class YouTubeKeywordErrorTests(TestCase):
+    def setUp(self):
+        Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})
+        self.service = YouTubeService(get_user_model().objects.create_user(username='dave', email='dave@example.com', password='pw'))
+        self.service._rate_limiter = mock.Mock()
+
+    def response(self, status, items=()):
+        resp = requests.Response(); resp.status_code = status
+        resp._content = json.dumps({'items': [{'id': {'videoId': v}, 'snippet': {'title': v}} for v in items]}).encode()
+        return resp
+
+    def test_failed_keyword_is_recorded_and_skipped(self):
+        with mock.patch('scanning.services.requests.get', side_effect=[requests.ConnectionError('reset'), self.response(200, ['v1'])]), \
+                self.assertLogs('scanning.services', 'WARNING'):
+            records = self.service.scan_content(['bad', 'good'], ['video'])
+        self.assertEqual([r['platform_content_id'] for r in records], ['v1'])
+        self.assertEqual(list(self.service.keyword_errors), ['bad'])
+
+    def test_quota_errors_fail_the_scan(self):
+        with mock.patch('scanning.services.requests.get', return_value=self.response(403)):
+            with self.assertRaises(requests.HTTPError):
+                self.service.scan_content(['a', 'b'], ['video'])
+
+
+class ScanJobCancelTests(TestCase):
+    def setUp(self):
+        self.platform = Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})[0]
+        self.user = get_user_model().objects.create_user(username='carol', email='carol@example.com', password='pw')
+        self.client = APIClient(); self.client.force_authenticate(self.user)
+
+    def job(self, status):
+        return ScanJob.objects.create(user=self.user, platform=self.platform, keywords=['x'], status=status)
+
+    def test_cancel(self):
+        job = self.job('running')
+        self.assertEqual(self.client.post(f'/api/scan-jobs/{job.pk}/cancel/').status_code, 200)
+        job.refresh_from_db(); self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(self.client.post(f'/api/scan-jobs/{self.job("completed").pk}/cancel/').status_code, 400)
+
+    def test_unknown_job_is_404(self):
+        self.assertEqual(self.client.post('/api/scan-jobs/999999/cancel/').status_code, 404)
+
+    def test_other_users_jobs_are_invisible(self):
+        other = get_user_model().objects.create_user(username='cody', email='cody@example.com', password='pw')
+        theirs = ScanJob.objects.create(user=other, platform=self.platform, keywords=['x'], status='running')
+        mine = self.job('running')
+        self.assertEqual(self.client.post(f'/api/scan-jobs/{theirs.pk}/cancel/').status_code, 404)
+        theirs.refresh_from_db(); self.assertEqual(theirs.status, 'running')
+        listed = self.client.get('/api/scan-jobs/').json()
+        self.assertEqual([j['id'] for j in listed.get('results', listed)], [mine.pk])
+
+
+class _ListSink:
+    def __init__(self): self.writes = []; self.checkpoints = []
+    def write(self, records, cursor): self.writes.append(([r.platform_content_id for r in records], cursor)); return len(records)
+    def checkpoint(self, cursor): self.checkpoints.append(cursor)
+
+
+class ScanPipelineTests(SimpleTestCase):
+    def stream(self, *pages):
+        for n, ids in enumerate(pages, 1):
+            yield from (ScanRecord(platform_content_id=i, content_url='', content_type='text', text_content=i) for i in ids)
+            yield PageBoundary({'page': n})
+
+    def test_batches_carry_the_last_page_cursor(self):
+        sink = _ListSink()
+        stats = ScanPipeline(sink, batch_size=2).run(self.stream(['a', 'b', 'c'], ['d'], [], ['e']))
+        self.assertEqual(sink.writes, [(['a', 'b'], None), (['c', 'd'], {'page': 1}), (['e'], {'page': 4})])
+        self.assertEqual(sink.checkpoints, [{'page': 2}, {'page': 3}])  # nothing buffered: progress is still recorded
+        self.assertEqual(stats, {'seen': 5, 'stored': 5, 'batches': 3, 'cancelled': False})
+
+    def test_cancellation_flushes_and_stops_at_a_page_boundary(self):
+        sink = _ListSink(); pages = iter([False, True])
+        stats = ScanPipeline(sink, batch_size=10, stop_check=lambda: next(pages)).run(self.stream(['a'], ['b'], ['c']))
+        self.assertEqual(sink.writes, [(['a', 'b'], {'page': 2})])
+        self.assertTrue(stats['cancelled'])
+
+    def test_stages_hash_and_filter_records(self):
+        items = filter_stage(hash_stage(self.stream(['a', 'bb']), lambda r: r.text_content * 2), lambda r: len(r.text_content) > 1)
+        self.assertEqual([(it.platform_content_id, it.content_hash) if isinstance(it, ScanRecord) else it.cursor for it in items],
+                         [('bb', 'bbbb'), {'page': 1}])
+
+
+class ScanBatchDurabilityTests(TestCase):
+    def setUp(self):
+        self.platform = Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})[0]
+        self.user = get_user_model().objects.create_user(username='dave', email='dave@example.com', password='pw')
+        self.job = ScanJob.objects.create(user=self.user, platform=self.platform, keywords=['x'], status='running')
+
+    def records(self, *ids):
+        return [ScanRecord(platform_content_id=i, content_url=f'https://example.com/{i}', content_type='text', text_content=f'post {i}') for i in ids]
+
+    def test_batch_is_clustered_in_the_same_transaction(self):
+        sink = ScanJobSink(self.job)
+        with mock.patch('scanning.services.assign_clusters', side_effect=RuntimeError('crash')), self.assertRaises(RuntimeError):
+            sink.write(self.records('a', 'b'), {'keyword_index': 1})
+        self.assertFalse(ScannedContent.objects.filter(scan_job=self.job).exists())
+        self.job.refresh_from_db(); self.assertEqual(self.job.checkpoint, {})
+        sink = ScanJobSink(self.job); sink.write(self.records('a', 'b'), {'keyword_index': 1})
+        self.assertFalse(ScannedContent.objects.filter(scan_job=self.job, cluster__isnull=True).exists())
+
+    def test_sweep_dispatches_items_without_detection(self):
+        ScanJobSink(self.job).write(self.records('a', 'b', 'c'), None)
+        done = ScannedContent.objects.get(scan_job=self.job, platform_content_id='a')
+        DetectionJob.objects.create(user=self.user, scanned_content=done, detection_types=['text'])
+        with mock.patch.object(tasks.execute_detection_job_task, 'apply_async') as publish:
+            self.assertEqual(tasks.trigger_content_detection_task.apply(args=(self.job.id,)).get(), {'queued': 2})
+            self.assertEqual(tasks.trigger_content_detection_task.apply(args=(self.job.id,)).get(), {'queued': 0})
+        self.assertEqual(publish.call_count, 2)
+        self.assertEqual(DetectionJob.objects.filter(scanned_content__scan_job=self.job).count(), 3)
+
+
+class ClusterMemberCountTests(TestCase):
+    def setUp(self):
+        self.platform = Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})[0]
+        self.user = get_user_model().objects.create_user(username='lee', email='lee@example.com', password='pw')
+        self.job = ScanJob.objects.create(user=self.user, platform=self.platform, keywords=['x'], status='running')
+
+    def test_deletes_shrink_the_cluster(self):
+        ScanJobSink(self.job).write([ScanRecord(platform_content_id=str(i), content_url=f'https://example.com/{i}', content_type='text',
+                                                text_content='Same  post!' if i % 2 else 'same post') for i in range(4)], None)
+        cluster = ContentCluster.objects.get()
+        self.assertEqual(cluster.member_count, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            ScannedContent.objects.filter(platform_content_id__in=['0', '1']).delete()
+        cluster.refresh_from_db(); self.assertEqual(cluster.member_count, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.platform.delete()  # cascades to the remaining items
+        cluster.refresh_from_db(); self.assertEqual(cluster.member_count, 0)
+
+
+class PayloadSweepTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory(); self.addCleanup(root.cleanup)
+        patcher = override_settings(PAYLOAD_STORE={**settings.PAYLOAD_STORE, 'ROOT': root.name, 'SWEEP_GRACE_SECONDS': 0})
+        patcher.enable(); self.addCleanup(patcher.disable)
+        self.platform = Platform.objects.get_or_create(name='youtube', defaults={'display_name': 'YouTube', 'base_url': 'https://www.youtube.com'})[0]
+
+    def item(self, n, raw, days_old=0):
+        sc = ScannedContent.objects.create(platform=self.platform, platform_content_id=n, content_url=f'https://example.com/{n}',
+                                           content_type='text', metadata=offload_raw_payload({'raw': raw}))
+        ScannedContent.objects.filter(pk=sc.pk).update(created_at=timezone.now() - timedelta(days=days_old))
+        return sc
+
+    def test_cleanup_deletes_only_unreferenced_payloads(self):
+        self.item('old', {'only': 'old'}, days_old=120)
+        self.item('old-shared', {'shared': 1}, days_old=120); kept = self.item('new-shared', {'shared': 1})
+        PayloadStore().put({'never': 'referenced'})
+        report = tasks.cleanup_old_scan_data.apply().get()
+        self.assertEqual(report['payloads']['deleted'], 2)
+        self.assertEqual(load_raw_payload(kept.metadata), {'shared': 1})
+
+    def test_recent_payloads_survive_the_grace_period(self):
+        store = PayloadStore(); store.put({'in': 'flight'})  # its row may not be committed yet
+        self.assertEqual(store.sweep(set(), grace_seconds=3600), {'kept': 1, 'deleted': 0, 'bytes_freed': 0})
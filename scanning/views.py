@@ -1,16 +1,21 @@
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.decorators import action
 from rest_framework import viewsets, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from .models import Platform, ScanJob, ScanSchedule, ScannedContent, PlatformCredential
+from .models import Platform, ScanJob, ScanSchedule, ScannedContent, PlatformCredential, ContentCluster
 from .serializers import (
     PlatformSerializer,
     ScanJobSerializer,
     ScanScheduleSerializer,
     ScannedContentSerializer,
+    ScannedContentDetailSerializer,
     PlatformCredentialSerializer,
+    ContentClusterSerializer,
 )
 
 def _ensure_platform(name: str, display_name: str, base_url: str) -> Platform:
@@ -89,10 +94,47 @@ class ScanJobViewSet(BaseViewSet):
     queryset = ScanJob.objects.all()
     serializer_class = ScanJobSerializer
 
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        from .tasks import dispatch_scan_job
+        scan_job = serializer.save(user=self.request.user, job_type="manual")
+        # manual scans are queued at the highest priority on the scan-io queue
+        transaction.on_commit(lambda: dispatch_scan_job(scan_job))
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        """Running scans stop after the page in progress; results committed so far are kept."""
+        job = self.get_object()  # scoped to the caller's jobs: anyone else's is a 404
+        updated = ScanJob.objects.filter(pk=job.pk, status__in=["pending", "running", "failed"]).update(
+            status="cancelled", completed_at=timezone.now()
+        )
+        if not updated:
+            return Response({"error": "scan job is not cancellable"}, status=400)
+        return Response({"status": "cancelled"})
+
 class ScanScheduleViewSet(BaseViewSet):
     queryset = ScanSchedule.objects.all()
     serializer_class = ScanScheduleSerializer
 
 class ScannedContentViewSet(BaseViewSet):
-    queryset = ScannedContent.objects.all().order_by("-created_at")
+    queryset = ScannedContent.objects.select_related("platform", "cluster").order_by("-created_at")
     serializer_class = ScannedContentSerializer
+
+    def get_serializer_class(self):
+        if self.action == "retrieve":
+            return ScannedContentDetailSerializer
+        return ScannedContentSerializer
+
+
+class ContentClusterViewSet(viewsets.ReadOnlyModelViewSet):
+    """Largest clusters first: the most widely reposted content is the best takedown target."""
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = ContentCluster.objects.all().order_by("-member_count", "-last_seen_at")
+    serializer_class = ContentClusterSerializer
+
+    def get_queryset(self):
+        # clusters span tenants: only those holding at least one of the caller's scanned items
+        owned = ScannedContent.objects.filter(scan_job__user=self.request.user).values("cluster_id")
+        return super().get_queryset().filter(id__in=owned)
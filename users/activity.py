@@ -0,0 +1,84 @@
+import atexit, logging, threading
+from typing import List, Optional
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """
+    In-process buffer of ActivityLog rows, written with one bulk_create when BATCH_SIZE
+    entries are pending or FLUSH_SECONDS after the first pending entry, whichever is first.
+    Pending rows are flushed at interpreter exit and on Celery worker shutdown.
+    Timestamps are taken when the entry is logged, not when it is written.
+    """
+    def __init__(self):
+        self.lock = threading.Lock(); self.pending: List[ActivityLog] = []
+        self.timer: Optional[threading.Timer] = None
+
+    def add(self, entry: ActivityLog):
+        cfg = settings.ACTIVITY_LOG
+        with self.lock:
+            self.pending.append(entry)
+            full = len(self.pending) >= cfg['BATCH_SIZE']
+            if not full and self.timer is None:
+                self.timer = threading.Timer(cfg['FLUSH_SECONDS'], self._timed_flush)
+                self.timer.daemon = True; self.timer.start()
+        if full:
+            self.flush()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()  # the timer thread's own connection
+
+    def flush(self) -> int:
+        with self.lock:
+            batch, self.pending = self.pending, []
+            if self.timer is not None:
+                self.timer.cancel(); self.timer = None
+        if not batch:
+            return 0
+        try:
+            ActivityLog.objects.bulk_create(batch, batch_size=500)
+        except Exception as e:
+            logger.error(f"Could not write {len(batch)} activity log entries: {e}")
+            with self.lock:  # keep them for the next flush, bounded so a dead DB can't grow memory forever
+                self.pending = (batch + self.pending)[-settings.ACTIVITY_LOG['MAX_PENDING']:]
+            return 0
+        return len(batch)
+
+
+_buffer = ActivityBuffer()
+
+
+def log_activity(user, action: str, description: str = '', ip_address: Optional[str] = None, user_agent: Optional[str] = None):
+    """
+    Record an ActivityLog entry without a synchronous insert on the caller's path.
+    Inside atomic() the entry is only buffered once the transaction commits (dropped on rollback).
+    """
+    entry = ActivityLog(user=user, action=action, description=description, ip_address=ip_address,
+                        user_agent=user_agent, timestamp=timezone.now())
+    transaction.on_commit(lambda: _buffer.add(entry))
+
+
+def flush_activity() -> int:
+    """Write all pending entries now (shutdown hooks, tests, management commands)."""
+    return _buffer.flush()
+
+
+atexit.register(flush_activity)
+
+try:
+    from celery.signals import worker_process_shutdown, worker_shutdown
+
+    @worker_process_shutdown.connect(weak=False)
+    @worker_shutdown.connect(weak=False)
+    def _flush_on_worker_shutdown(**kwargs):
+        flush_activity()
+except ImportError:  # web-only deployments
+    pass
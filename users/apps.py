@@ -2,3 +2,5 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field='django.db.models.BigAutoField'
     name='users'
+    def ready(self):
+        from . import signals  # noqa: F401  (API key cache eviction)
@@ -0,0 +1,125 @@
+import hashlib, hmac, secrets, threading, time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Tuple
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+from .models import UserProfile
+
+KEY_PREFIX = 'cpk_'
+_CACHE_KEY = 'apikey:{}'
+_MISS = object()
+
+
+def generate_api_key() -> str:
+    return KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+def api_key_digest(key: str) -> str:
+    """Keyed digest stored in UserProfile.api_key; the plaintext key is never stored."""
+    return hmac.new(settings.API_KEYS['HMAC_KEY'].encode(), key.encode(), hashlib.sha256).hexdigest()
+
+
+def api_key_expires_at(created_at):
+    days = settings.API_KEYS['MAX_AGE_DAYS']
+    return created_at + timedelta(days=days) if days and created_at else None
+
+
+class _LRU:
+    """Small thread-safe in-process LRU with per-entry expiry."""
+    def __init__(self):
+        self.lock = threading.Lock(); self.items: 'OrderedDict[str, Tuple[float, object]]' = OrderedDict()
+
+    def get(self, key: str):
+        with self.lock:
+            hit = self.items.get(key)
+            if hit is None:
+                return _MISS
+            if hit[0] < time.monotonic():
+                del self.items[key]; return _MISS
+            self.items.move_to_end(key)
+            return hit[1]
+
+    def set(self, key: str, value, ttl: float):
+        with self.lock:
+            self.items[key] = (time.monotonic() + ttl, value); self.items.move_to_end(key)
+            while len(self.items) > settings.API_KEYS['LOCAL_MAX_ENTRIES']:
+                self.items.popitem(last=False)
+
+    def discard(self, key: str):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+_local = _LRU()
+
+
+def _resolve(digest: str):
+    """
+    (user_id, created_at) for a digest, or None. In-process LRU -> shared cache -> database.
+    Only ids are cached: the user is loaded per request, so deactivation takes effect at once.
+    """
+    cfg = settings.API_KEYS
+    hit = _local.get(digest)
+    if hit is not _MISS:
+        return hit
+    hit = cache.get(_CACHE_KEY.format(digest), _MISS)
+    if hit is _MISS:
+        hit = UserProfile.objects.filter(api_key=digest).values_list('user_id', 'api_key_created_at').first()
+        # unknown keys are only remembered locally and briefly (a freshly issued key must work at once)
+        if hit is not None:
+            cache.set(_CACHE_KEY.format(digest), hit, cfg['SHARED_TTL'])
+    _local.set(digest, hit, cfg['LOCAL_TTL'] if hit is not None else cfg['NEGATIVE_TTL'])
+    return hit
+
+
+def evict_api_key(digest: str):
+    """Forget a digest here and in the shared cache (other processes drop it after LOCAL_TTL)."""
+    cache.delete(_CACHE_KEY.format(digest)); _local.discard(digest)
+
+
+def rotate_api_key(user) -> Tuple[str, object]:
+    """Issue a new key for `user` (replacing any previous one). Returns (plaintext key, created_at)."""
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    key = generate_api_key()
+    profile.api_key = api_key_digest(key); profile.api_key_created_at = timezone.now()
+    profile.save(update_fields=['api_key', 'api_key_created_at'])  # the old digest is evicted by users.signals
+    return key, profile.api_key_created_at
+
+
+class APIKeyAuthentication(authentication.BaseAuthentication):
+    """
+    `Authorization: Api-Key <key>` (or `X-API-Key: <key>`). One HMAC, a dict lookup and a
+    primary-key read of the user per request once warm, instead of a PBKDF2 password hash (Basic auth).
+    """
+    keyword = 'Api-Key'
+
+    def _key(self, request) -> Optional[str]:
+        header = authentication.get_authorization_header(request).split()
+        if header and header[0].lower() == self.keyword.lower().encode():
+            if len(header) != 2:
+                raise exceptions.AuthenticationFailed('Invalid API key header.')
+            return header[1].decode('latin-1')
+        return request.META.get('HTTP_X_API_KEY') or None
+
+    def authenticate(self, request):
+        key = self._key(request)
+        if key is None:
+            return None
+        hit = _resolve(api_key_digest(key))
+        if hit is None:
+            raise exceptions.AuthenticationFailed('Invalid API key.')
+        user_id, created_at = hit
+        expires = api_key_expires_at(created_at)
+        if expires and expires < timezone.now():
+            raise exceptions.AuthenticationFailed('API key expired; rotate it to get a new one.')
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return user, key
+
+    def authenticate_header(self, request):
+        return self.keyword
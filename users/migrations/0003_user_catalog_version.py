@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_activity_log_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -7,6 +8,8 @@ class User(AbstractUser):
     company_name = models.CharField(max_length=255, blank=True, null=True)
     subscription_plan = models.CharField(max_length=20, choices=[('basic','Basic'),('pro','Pro'),('enterprise','Enterprise')], default='basic')
     is_verified = models.BooleanField(default=False)
+    # bumped whenever the user's protected content changes (detection/catalog.py)
+    catalog_version = models.BigIntegerField(default=0, editable=False)
     class Meta: db_table='users'
     def __str__(self): return self.email or self.username
 
@@ -49,6 +52,10 @@ class ActivityLog(models.Model):
     description = models.TextField()
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     user_agent = models.TextField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    class Meta: db_table='activity_logs'; ordering=['-timestamp']
+    # set when the entry is logged (rows are written in batches by users.activity)
+    timestamp = models.DateTimeField(default=timezone.now)
+    class Meta:
+        db_table='activity_logs'; ordering=['-timestamp']
+        indexes=[models.Index(fields=['-timestamp'], name='activity_log_time_idx'),
+                 models.Index(fields=['user','-timestamp'], name='activity_log_user_time_idx')]
     def __str__(self): return f"{self.user.email} - {self.action} at {self.timestamp}"
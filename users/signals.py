@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import UserProfile
+from .authentication import evict_api_key
+
+# Cached API key lookups are evicted after commit, so a request racing the save can't put the
+# old digest back. QuerySet.update() bypasses these: call evict_api_key() there.
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_api_key(sender, instance, **kwargs):
+    instance._previous_api_key = UserProfile.objects.filter(pk=instance.pk).values_list('api_key', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=UserProfile)
+def evict_replaced_api_key(sender, instance, **kwargs):
+    old = getattr(instance, '_previous_api_key', None)
+    if old and old != instance.api_key:
+        transaction.on_commit(lambda: evict_api_key(old))
+
+
+@receiver(post_delete, sender=UserProfile)
+def evict_deleted_api_key(sender, instance, **kwargs):
+    if instance.api_key:
+        digest = instance.api_key
+        transaction.on_commit(lambda: evict_api_key(digest))
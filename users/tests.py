@@ -0,0 +1,95 @@
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+from users import activity, authentication
+from users.authentication import APIKeyAuthentication, rotate_api_key
+from users.models import ActivityLog, UserProfile
+
+
+class APIKeyAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='gina', email='gina@example.com', password='pw')
+        self.factory = APIRequestFactory()
+        authentication._local.items.clear(); self.addCleanup(authentication._local.items.clear)
+
+    def authenticate(self, key):
+        return APIKeyAuthentication().authenticate(self.factory.get('/', HTTP_AUTHORIZATION=f'Api-Key {key}'))
+
+    def assertRejected(self, key, message):
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, message):
+            self.authenticate(key)
+
+    def test_rotation_revokes_the_old_key(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            old, _ = rotate_api_key(self.user)
+        self.assertEqual(self.authenticate(old)[0], self.user)  # cached from here on
+        with self.captureOnCommitCallbacks(execute=True):
+            new, _ = rotate_api_key(self.user)
+        self.assertRejected(old, 'Invalid API key.')
+        self.assertEqual(self.authenticate(new)[0], self.user)
+
+    def test_deleted_profile_revokes_the_key(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            key, _ = rotate_api_key(self.user)
+        self.authenticate(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserProfile.objects.get(user=self.user).delete()
+        self.assertRejected(key, 'Invalid API key.')
+
+    @override_settings(API_KEYS={**settings.API_KEYS, 'MAX_AGE_DAYS': 30})
+    def test_expired_key_is_rejected(self):
+        key, _ = rotate_api_key(self.user)
+        self.assertEqual(self.authenticate(key)[0], self.user)
+        UserProfile.objects.filter(user=self.user).update(api_key_created_at=timezone.now() - timedelta(days=31))
+        authentication.evict_api_key(authentication.api_key_digest(key))  # update() bypasses the signals
+        self.assertRejected(key, 'API key expired')
+
+    def test_deactivation_applies_while_the_key_is_cached(self):
+        key, _ = rotate_api_key(self.user)
+        self.authenticate(key)
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertRejected(key, 'User inactive or deleted.')
+
+
+class ActivityLogBufferTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hal', email='hal@example.com', password='pw')
+        self.addCleanup(activity.flush_activity)
+
+    def test_entries_logged_in_a_rolled_back_transaction_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    activity.log_activity(self.user, 'scan_completed', 'rolled back')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            activity.log_activity(self.user, 'scan_completed', 'kept')
+        activity.flush_activity()
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ['kept'])
+
+    @override_settings(ACTIVITY_LOG={**settings.ACTIVITY_LOG, 'BATCH_SIZE': 3, 'FLUSH_SECONDS': 60})
+    def test_a_full_batch_is_written_with_one_insert(self):
+        buffer = activity.ActivityBuffer(); self.addCleanup(buffer.flush)
+        buffer.add(ActivityLog(user=self.user, action='a')); buffer.add(ActivityLog(user=self.user, action='b'))
+        self.assertFalse(ActivityLog.objects.exists())
+        with self.assertNumQueries(1):
+            buffer.add(ActivityLog(user=self.user, action='c'))
+        self.assertEqual(ActivityLog.objects.count(), 3)
+        self.assertIsNone(buffer.timer)
+
+    @override_settings(ACTIVITY_LOG={**settings.ACTIVITY_LOG, 'FLUSH_SECONDS': 60, 'MAX_PENDING': 2})
+    def test_failed_writes_are_kept_for_the_next_flush_up_to_max_pending(self):
+        buffer = activity.ActivityBuffer()
+        for action in ('a', 'b', 'c'):
+            buffer.add(ActivityLog(user=self.user, action=action))
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=RuntimeError('db down')), self.assertLogs('users.activity', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(sorted(ActivityLog.objects.values_list('action', flat=True)), ['b', 'c'])
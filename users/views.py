@@ -1,4 +1,6 @@
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from .models import User, ClientConfiguration, ActivityLog
 from .serializers import UserSerializer, ClientConfigurationSerializer, ActivityLogSerializer
 
@@ -7,6 +9,12 @@ class BaseViewSet(viewsets.ModelViewSet):
 
 class UserViewSet(BaseViewSet):
     queryset=User.objects.all(); serializer_class=UserSerializer
+    @action(detail=False, methods=['post'], url_path='rotate-api-key')
+    def rotate_api_key(self, request):
+        """Issue a new API key for the caller; the previous key stops working. The key is only shown once."""
+        from .authentication import rotate_api_key, api_key_expires_at
+        key, created_at=rotate_api_key(request.user)
+        return Response({'api_key':key,'created_at':created_at,'expires_at':api_key_expires_at(created_at)}, status=status.HTTP_201_CREATED)
 
 class ClientConfigurationViewSet(BaseViewSet):
     queryset=ClientConfiguration.objects.all(); serializer_class=ClientConfigurationSerializer